@@ -0,0 +1,72 @@
+# compare the partition_into_clusters engines (recipe_network.clustering) on synthetic recipe graphs:
+# runtime, peak RSS growth (covers igraph's C allocations), optionally the tracemalloc peak, and modularity Q
+# every run happens in a fresh worker process so the memory numbers don't leak between engines
+# Q is scored with the directed modularity partition_into_clusters optimizes, whatever the engine optimized
+#
+# usage: python benchmarks/clustering_benchmark.py [recipe counts...] [--backends ...] [--slow-limit N] [--resolution R] [--traced]
+#   e.g. python benchmarks/clustering_benchmark.py 1000 10000 100000 --slow-limit 10000
+
+# import the shared paths from config.py
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argparse
+import importlib
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from recipe_network.clustering import CLUSTERING_BACKENDS, cluster, modularity
+from utils.instrumentation import _memory_kb
+from utils.recipe_table import RecipeTable
+
+from synthetic_recipes import generate_recipes
+
+SLOW_BACKENDS = ("networkx", "cnm")
+
+def measure(backend: str, n_nodes: int, sources: np.ndarray, targets: np.ndarray, weights: np.ndarray, resolution: float, traced: bool) -> tuple[float, float, float, float, int]:
+    # (seconds, peak RSS growth MB, peak traced MB or nan, Q, communities), runs in a fresh worker process
+    # tracemalloc slows every python allocation down, so the traced peak comes from a second, untimed run
+    # igraph takes most of a second to import, load it before the clock starts
+    if backend not in SLOW_BACKENDS:
+        importlib.import_module("igraph")
+    rss_before = _memory_kb()[1]
+    start = time.perf_counter()
+    labels = cluster(n_nodes, sources, targets, weights, backend=backend, resolution=resolution)
+    elapsed = time.perf_counter() - start
+    rss_growth = (_memory_kb()[1] - rss_before) / 1024
+
+    traced_peak = float("nan")
+    if traced:
+        tracemalloc.start()
+        cluster(n_nodes, sources, targets, weights, backend=backend, resolution=resolution)
+        traced_peak = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+    return elapsed, rss_growth, traced_peak, modularity(labels, sources, targets, weights, resolution), int(labels.max()) + 1
+
+def run(recipe_counts: list[int], backends: list[str], slow_limit: int, resolution: float, traced: bool) -> None:
+    print(f"{'nodes':>9} {'edges':>9} {'backend':>9} | {'time s':>8} {'rss MB':>8} {'traced MB':>10} {'Q':>7} {'comms':>6}")
+    for n_recipes in recipe_counts:
+        table = RecipeTable.from_records(generate_recipes(n_recipes))
+        sources, targets, weights = table.unique_edges()
+        for backend in backends:
+            line = f"{table.n_items:>9} {len(sources):>9} {backend:>9} |"
+            if backend in SLOW_BACKENDS and table.n_items > slow_limit:
+                print(f"{line} {'skipped':>8}", flush=True)
+                continue
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                elapsed, rss, traced_peak, q, communities = executor.submit(measure, backend, table.n_items, sources, targets, weights, resolution, traced).result()
+            print(f"{line} {elapsed:>8.3f} {rss:>8.1f} {traced_peak:>10.1f} {q:>7.4f} {communities:>6}", flush=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="community detection engine benchmark")
+    parser.add_argument("recipes", nargs="*", type=int, default=[1_000, 10_000, 100_000])
+    parser.add_argument("--backends", nargs="+", choices=CLUSTERING_BACKENDS, default=list(CLUSTERING_BACKENDS))
+    parser.add_argument("--slow-limit", type=int, default=20_000, help="largest graph (nodes) the pure python engines run on")
+    parser.add_argument("--resolution", type=float, default=2.0)
+    parser.add_argument("--traced", action="store_true", help="also report the tracemalloc peak (python heap only) from a second run")
+    args = parser.parse_args()
+    run(args.recipes, args.backends, args.slow_limit, args.resolution, args.traced)
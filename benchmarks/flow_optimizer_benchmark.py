@@ -0,0 +1,48 @@
+# time the production flow LP (recipe_network.flow_optimizer) on tiered synthetic recipe sets, districts from Leiden,
+# targets at the top tier, from game sized recipe sets up to large mod packs
+#
+# usage: python benchmarks/flow_optimizer_benchmark.py [recipe counts...] [--targets N] [--rate R] [--traffic-cost C] [--alternates]
+
+# import the shared paths from config.py
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argparse
+import time
+
+from recipe_network.clustering import cluster
+from recipe_network.flow_optimizer import TRAFFIC_COST, FlowOptimizer
+
+from synthetic_recipes import generate_tiered_arrays
+
+def run(recipe_counts: list[int], n_targets: int, rate: float, traffic_cost: float, alternates: bool) -> None:
+    print(f"{'recipes':>9} {'variables':>10} {'nonzeros':>10} {'districts':>9} | {'build s':>8} {'solve s':>8} | {'buildings':>12} {'traffic/min':>12} {'belts':>6}")
+    for n_recipes in recipe_counts:
+        table = generate_tiered_arrays(n_recipes)
+        sources, targets, weights = table.unique_edges()
+        groups = cluster(table.n_items, sources, targets, weights, backend="leiden", resolution=2.0)
+        # the last recipes are the highest tier
+        target_rates = {table.names[product_id]: rate for product_id in table.recipe_products[-n_targets:].tolist()}
+
+        start = time.perf_counter()
+        optimizer = FlowOptimizer(table, groups, alternate_recipes=alternates)
+        build_time = time.perf_counter() - start
+        start = time.perf_counter()
+        solution = optimizer.solve(target_rates, traffic_cost=traffic_cost)
+        solve_time = time.perf_counter() - start
+        print(
+            f"{n_recipes:>9} {optimizer.n_variables:>10} {optimizer.A.nnz:>10} {optimizer.n_districts:>9} | {build_time:>8.3f} {solve_time:>8.3f} | "
+            f"{solution.total_buildings:>12.4g} {solution.total_traffic:>12.4g} {solution.traffic.nnz:>6}",
+            flush=True,
+        )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="production flow LP benchmark")
+    parser.add_argument("recipes", nargs="*", type=int, default=[1_000, 10_000, 100_000])
+    parser.add_argument("--targets", type=int, default=20, help="number of top tier products with a target rate")
+    parser.add_argument("--rate", type=float, default=60.0, help="target units/min of every target product")
+    parser.add_argument("--traffic-cost", type=float, default=TRAFFIC_COST)
+    parser.add_argument("--alternates", action="store_true", help="let the LP choose between alternate recipes")
+    args = parser.parse_args()
+    run(args.recipes, args.targets, args.rate, args.traffic_cost, args.alternates)
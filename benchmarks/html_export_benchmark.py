@@ -0,0 +1,55 @@
+# time the precomputed-layout html export on synthetic recipe graphs, time and file size should grow linearly
+#
+# usage: python benchmarks/html_export_benchmark.py [recipe counts...] [--iterations N]
+
+# import the shared paths from config.py
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from recipe_network.html_export import force_layout, write_html
+from utils.recipe_table import RecipeTable
+
+from synthetic_recipes import generate_recipes
+
+def run(recipe_counts: list[int], iterations: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        print(f"{'nodes':>9} {'edges':>9} | {'layout s':>9} {'write s':>8} {'MB':>7} {'us/node':>8} | {'edge/random':>11}")
+        for n_recipes in recipe_counts:
+            table = RecipeTable.from_records(generate_recipes(n_recipes))
+            sources = table.edge_sources()
+            targets = table.ingredients
+
+            start = time.perf_counter()
+            positions = force_layout(table.n_items, sources, targets, iterations=iterations)
+            layout_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            size = write_html(Path(tmp_dir) / "graph.html", table.names, positions, sources, targets, table.quantities)
+            write_time = time.perf_counter() - start
+
+            # mean edge length against the mean distance of random node pairs, lower means connected items sit closer
+            rng = np.random.default_rng(0)
+            pairs = rng.integers(0, table.n_items, (2, 10_000))
+            edge_length = np.linalg.norm(positions[sources] - positions[targets], axis=1).mean()
+            random_length = np.linalg.norm(positions[pairs[0]] - positions[pairs[1]], axis=1).mean()
+
+            total = layout_time + write_time
+            print(
+                f"{table.n_items:>9} {table.n_edges:>9} | {layout_time:>9.3f} {write_time:>8.3f} {size / 1e6:>7.2f} "
+                f"{1e6 * total / table.n_items:>8.2f} | {edge_length / random_length:>11.3f}",
+                flush=True,
+            )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="precomputed-layout html export benchmark")
+    parser.add_argument("recipes", nargs="*", type=int, default=[1_000, 10_000, 100_000])
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+    run(args.recipes, args.iterations)
@@ -0,0 +1,48 @@
+# time RecipeNetwork graph construction on synthetic recipe sets from 10k to 1M edges
+#
+# usage: python benchmarks/igraph_build_benchmark.py [edge counts...]
+
+# import the shared paths from config.py
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argparse
+import json
+import tempfile
+import time
+
+from recipe_network.network_builder import RecipeNetwork
+from utils.logging import Logger, LogLevel
+
+from synthetic_recipes import generate_recipes
+
+AVG_INGREDIENTS = 3.0
+
+def run(edge_counts: list[int]) -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        logger = Logger(tmp_dir, "igraph_build_benchmark.log", LogLevel.bitmask(LogLevel.ERROR))
+        print(f"{'edges':>9} {'vertices':>9} | {'build s':>8} {'load+build s':>13} {'us/edge':>8}")
+        for target_edges in edge_counts:
+            recipes = generate_recipes(int(target_edges / AVG_INGREDIENTS), AVG_INGREDIENTS)
+            with open(f"{tmp_dir}/recipes.json", "w") as recipe_file:
+                json.dump(recipes, recipe_file)
+
+            network = RecipeNetwork(tmp_dir, logger=logger)
+            start = time.perf_counter()
+            network._build_network(recipes)
+            build_time = time.perf_counter() - start
+
+            network = RecipeNetwork(tmp_dir, logger=logger)
+            start = time.perf_counter()
+            network.import_network_from_json("recipes.json")
+            total_time = time.perf_counter() - start
+
+            edges = network.network.ecount()
+            print(f"{edges:>9} {network.network.vcount():>9} | {build_time:>8.3f} {total_time:>13.3f} {1e6 * build_time / edges:>8.2f}", flush=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="RecipeNetwork igraph construction benchmark")
+    parser.add_argument("edges", nargs="*", type=int, default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+    run(args.edges)
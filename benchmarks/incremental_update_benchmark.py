@@ -0,0 +1,76 @@
+# time GraphBuilder incremental updates for single-recipe edits against a full rebuild, on growing synthetic recipe sets
+# communities are seeded with contiguous blocks of items instead of running the (slow) full clustering,
+# which only affects how many local moves happen, not how much of the graph an update touches
+#
+# usage: python benchmarks/incremental_update_benchmark.py [recipe counts...] [--edits N]
+
+# import the shared paths from config.py
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argparse
+import copy
+import random
+import tempfile
+import time
+
+from recipe_network.graph_builder import GraphBuilder
+from utils.logging import Logger, LogLevel
+from utils.recipe_table import RecipeTable
+
+from synthetic_recipes import generate_recipes
+
+COMMUNITY_SIZE = 64
+
+def run(recipe_counts: list[int], edits: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        logger = Logger(tmp_dir, "incremental_update_benchmark.log", LogLevel.bitmask(LogLevel.ERROR))
+        print(f"{'recipes':>9} {'nodes':>9} | {'rebuild s':>10} {'update ms':>10} {'max ms':>8} {'with snapshot ms':>17}")
+        for n_recipes in recipe_counts:
+            records = generate_recipes(n_recipes)
+            rng = random.Random(0)
+
+            builder = GraphBuilder(tmp_dir, Path(tmp_dir), "benchmark", logger)
+            start = time.perf_counter()
+            builder._build_graph_from_table(RecipeTable.from_records(records))
+            rebuild_time = time.perf_counter() - start
+
+            builder.communities = [set() for _ in range(builder.nx_graph.number_of_nodes() // COMMUNITY_SIZE + 1)]
+            for i, node in enumerate(builder.nx_graph.nodes):
+                builder.nx_graph.nodes[node]["group"] = i // COMMUNITY_SIZE
+                builder.communities[i // COMMUNITY_SIZE].add(node)
+            builder.ingredient_index.compute_overlap()
+
+            timings = []
+            for cache_dir in (None, Path(tmp_dir) / "cache"):
+                builder._cache = None if cache_dir is None else builder.__class__(tmp_dir, Path(tmp_dir), "benchmark", logger, cache_dir)._cache
+                update_times = []
+                for _ in range(edits):
+                    # change one quantity of one recipe
+                    records = copy.copy(records)
+                    position = rng.randrange(len(records))
+                    recipe = copy.deepcopy(records[position])
+                    ingredient = rng.choice(list(recipe["ingredients"]))
+                    recipe["ingredients"][ingredient] += 1
+                    records[position] = recipe
+                    table = RecipeTable.from_records(records)
+
+                    start = time.perf_counter()
+                    builder._update_network(table, render=False)
+                    update_times.append(time.perf_counter() - start)
+                timings.append(update_times)
+
+            update_times, snapshot_times = timings
+            print(
+                f"{n_recipes:>9} {builder.nx_graph.number_of_nodes():>9} | {rebuild_time:>10.3f} "
+                f"{1e3 * sum(update_times) / edits:>10.1f} {1e3 * max(update_times):>8.1f} {1e3 * sum(snapshot_times) / edits:>17.1f}",
+                flush=True,
+            )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="incremental graph update benchmark")
+    parser.add_argument("recipes", nargs="*", type=int, default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--edits", type=int, default=5)
+    args = parser.parse_args()
+    run(args.recipes, args.edits)
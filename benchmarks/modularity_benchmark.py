@@ -0,0 +1,68 @@
+# benchmark the in-repo CNM engine (recipe_network.modularity.GraphModularization) against
+# nx.community.greedy_modularity_communities, which partition_into_clusters uses today
+#
+# usage: python benchmarks/modularity_benchmark.py [node counts...] [--nx-limit N] [--resolution R]
+#   e.g. python benchmarks/modularity_benchmark.py 1000 10000 100000 --nx-limit 10000
+
+# import the shared paths from config.py
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argparse
+import time
+
+import networkx as nx
+import numpy as np
+
+from recipe_network.modularity import GraphModularization
+
+def planted_partition_graph(n: int, avg_degree: int = 8, community_size: int = 50, p_in: float = 0.8, seed: int = 0) -> nx.Graph:
+    # sparse weighted graph with planted communities, most edges stay inside a node's community
+    # quantities are drawn like recipe quantities, small integers
+    rng = np.random.default_rng(seed)
+    n_edges = n * avg_degree // 2
+    communities = np.arange(n) // community_size
+
+    src = rng.integers(0, n, n_edges)
+    internal = rng.random(n_edges) < p_in
+    block_start = communities[src] * community_size
+    block_size = np.minimum(community_size, n - block_start)
+    dst = np.where(internal, block_start + rng.integers(0, 1 << 30, n_edges) % block_size, rng.integers(0, n, n_edges))
+    quantity = rng.integers(1, 11, n_edges)
+
+    G = nx.Graph()
+    G.add_nodes_from(range(n))
+    G.add_weighted_edges_from(zip(src.tolist(), dst.tolist(), quantity.tolist()), weight="quantity")
+    G.remove_edges_from(nx.selfloop_edges(G))
+    return G
+
+def run(node_counts: list[int], nx_limit: int, resolution: float) -> None:
+    print(f"{'nodes':>8} {'edges':>9} | {'cnm s':>8} {'cnm Q':>7} {'comms':>6} | {'nx s':>8} {'nx Q':>7} {'comms':>6}")
+    for n in node_counts:
+        G = planted_partition_graph(n)
+
+        start = time.perf_counter()
+        engine = GraphModularization(G, weight="quantity", resolution=resolution)
+        communities = engine.modularity_maximization(full_dendrogram=False)
+        cnm_time = time.perf_counter() - start
+        cnm_q = nx.community.modularity(G, communities, weight="quantity", resolution=resolution)
+        line = f"{n:>8} {G.number_of_edges():>9} | {cnm_time:>8.2f} {cnm_q:>7.4f} {len(communities):>6} |"
+
+        if n <= nx_limit:
+            start = time.perf_counter()
+            nx_communities = nx.community.greedy_modularity_communities(G, weight="quantity", resolution=resolution)
+            nx_time = time.perf_counter() - start
+            nx_q = nx.community.modularity(G, nx_communities, weight="quantity", resolution=resolution)
+            line += f" {nx_time:>8.2f} {nx_q:>7.4f} {len(nx_communities):>6}"
+        else:
+            line += f" {'skipped':>8}"
+        print(line, flush=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CNM engine vs networkx greedy modularity benchmark")
+    parser.add_argument("nodes", nargs="*", type=int, default=[1_000, 10_000, 100_000])
+    parser.add_argument("--nx-limit", type=int, default=20_000, help="largest graph networkx is run on")
+    parser.add_argument("--resolution", type=float, default=1.0)
+    args = parser.parse_args()
+    run(args.nodes, args.nx_limit, args.resolution)
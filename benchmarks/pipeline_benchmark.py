@@ -0,0 +1,202 @@
+# end to end benchmark of the pipeline on tiered synthetic recipe sets (synthetic_recipes.generate_tiered_arrays),
+# from the processed csv through data_transformation, both import_network_from_json paths (networkx and igraph),
+# the cached import, find_products_with_common_ingredients, partition_into_clusters (networkx and leiden)
+# and both export paths (pyvis and the precomputed layout html)
+# every recipe count runs in a fresh worker process, every step is timed with its peak RSS (utils.instrumentation)
+# results are appended to a history file (one json line per run) and checked for regressions:
+#   - slower or bigger than the median of the last runs on the same machine, by more than the thresholds below
+#   - scaling worse than expected, from one recipe count to the next, for steps that take long enough to tell
+# the exit status is 1 when there is a regression, so nightly runs can fail on it
+#
+# usage: python benchmarks/pipeline_benchmark.py [recipe counts...] [--history FILE] [--steps ...] [--with-logging] [--no-fail]
+#   e.g. python benchmarks/pipeline_benchmark.py 100 1000 10000 100000 1000000
+
+# import the shared paths from config.py
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from config import LOG_LEVELS
+from data_manipulation.program import data_transformation
+from recipe_network.graph_builder import GraphBuilder
+from recipe_network.network_builder import RecipeNetwork
+from utils import instrumentation
+from utils.logging import Logger, LogLevel
+
+from synthetic_recipes import generate_tiered_arrays, write_recipe_csv
+
+DEFAULT_HISTORY = Path(__file__).parent / "pipeline_history.jsonl"
+
+# step -> (largest recipe count it runs at, expected scaling exponent, time ~ recipes ** exponent)
+# the quadratic steps are capped: the common ingredient pairs of the most used items grow with the square,
+# and pyvis checks every edge it adds against the edges it already has
+STEPS = {
+    "transform": (10 ** 6, 1.0),
+    "transform streaming": (10 ** 6, 1.0),
+    "import json": (10 ** 6, 1.0),
+    "import json igraph": (10 ** 6, 1.0),
+    "import cached": (10 ** 6, 1.0),
+    "common ingredients": (10 ** 4, 2.0),
+    "cluster networkx": (10 ** 4, 2.0),
+    "cluster leiden": (10 ** 6, 1.2),
+    "export pyvis": (10 ** 4, 2.0),
+    "export precomputed": (10 ** 6, 1.0),
+}
+
+# regression thresholds
+HISTORY_WINDOW = 5  # baseline is the median of this many previous runs on the same machine
+SLOWDOWN = 0.5  # more than 50% slower than the baseline
+MIN_SLOWDOWN_S = 0.1  # and at least this much, so millisecond steps don't flag on noise
+MEMORY_GROWTH = 0.5  # peak RSS more than 50% above the baseline
+MIN_MEMORY_GROWTH_MB = 50.0
+SCALING_TOLERANCE = 0.3  # measured exponent may exceed the expected one by this much
+MIN_SCALING_S = 0.2  # both timings need to be this long for the exponent to mean anything
+
+def run_pipeline(n_recipes: int, steps: list[str], with_logging: bool) -> dict[str, dict[str, float]]:
+    # every step at one recipe count, runs in a fresh worker process, returns {step: {"seconds", "peak_rss_mb"}}
+    recorder = instrumentation.enable()
+    log_levels = LOG_LEVELS if with_logging else LogLevel.bitmask(LogLevel.ERROR)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = Path(tmp_dir)
+        processed, final, logs, graphs, cache = (tmp_dir / name for name in ("processed", "final", "logs", "graphs", "cache"))
+        for directory in (processed, final, logs, graphs):
+            directory.mkdir()
+        # pyvis writes its lib/ folder into the working directory
+        os.chdir(tmp_dir)
+
+        # items and buildings like the game's data, the buildings being the last third of the recipes
+        table = generate_tiered_arrays(n_recipes)
+        split = table.n_recipes * 2 // 3
+        write_recipe_csv(processed / "items.csv", table, slice(None, split))
+        write_recipe_csv(processed / "buildings.csv", table, slice(split, None))
+        del table
+
+        def step(name: str, function, required: bool = False) -> None:
+            # required steps feed later ones, they still run (untimed) when they are not benchmarked
+            if name not in steps or n_recipes > STEPS[name][0]:
+                if required:
+                    function()
+                return
+            with instrumentation.span(name, recipes=n_recipes):
+                function()
+            event = recorder.events[-1]
+            results[name] = {"seconds": event["dur"] / 1e6, "peak_rss_mb": event["args"]["peak_rss_mb"]}
+
+        directories = dict(input_dir=processed, output_dir=final, log_dir=logs, log_levels=log_levels)
+        step("transform streaming", lambda: data_transformation(streaming=True, output_format="ndjson", **directories))
+        step("transform", lambda: data_transformation(**directories), required=True)
+
+        logger = Logger(logs, "pipeline_benchmark.log", log_levels)
+        builder = GraphBuilder(final, graphs, "benchmark", logger)
+        step("import json", lambda: builder.import_network_from_json("items.json", "buildings.json"), required=True)
+        step("import json igraph", lambda: RecipeNetwork(final, logger).import_network_from_json("items.json", "buildings.json"))
+        if "import cached" in steps:
+            GraphBuilder(final, graphs, "benchmark", logger, cache).import_network_from_json("items.json", "buildings.json")
+            step("import cached", lambda: GraphBuilder(final, graphs, "benchmark", logger, cache).import_network_from_json("items.json", "buildings.json"))
+
+        step("common ingredients", builder.find_products_with_common_ingredients)
+        step("cluster networkx", builder.partition_into_clusters)
+        step("cluster leiden", lambda: builder.partition_into_clusters(backend="leiden"))
+        step("export precomputed", lambda: builder.build_pyviz_graph(precomputed_layout=True))
+        step("export pyvis", builder.build_pyviz_graph)
+        logger.flush()
+    instrumentation.disable()
+    return results
+
+def load_history(path: Path) -> list[dict]:
+    if not path.exists():
+        return []
+    with open(path, "r", encoding="utf-8") as history_file:
+        return [json.loads(line) for line in history_file if line.strip()]
+
+def find_regressions(results: dict[str, dict[int, dict[str, float]]], history: list[dict], machine: str) -> list[str]:
+    regressions = []
+    previous = [entry["results"] for entry in history if entry["machine"] == machine][-HISTORY_WINDOW:]
+    for name, by_size in results.items():
+        for n_recipes, result in by_size.items():
+            baseline = [entry[name][str(n_recipes)] for entry in previous if str(n_recipes) in entry.get(name, {})]
+            if not baseline:
+                continue
+            seconds = float(np.median([run["seconds"] for run in baseline]))
+            if result["seconds"] > seconds * (1 + SLOWDOWN) and result["seconds"] - seconds > MIN_SLOWDOWN_S:
+                regressions.append(f"{name} at {n_recipes} recipes: {result['seconds']:.3f}s against {seconds:.3f}s")
+            peak = float(np.median([run["peak_rss_mb"] for run in baseline]))
+            if result["peak_rss_mb"] > peak * (1 + MEMORY_GROWTH) and result["peak_rss_mb"] - peak > MIN_MEMORY_GROWTH_MB:
+                regressions.append(f"{name} at {n_recipes} recipes: peak RSS {result['peak_rss_mb']:.0f}MB against {peak:.0f}MB")
+
+        sizes = sorted(by_size)
+        for smaller, larger in zip(sizes, sizes[1:]):
+            small_time, large_time = by_size[smaller]["seconds"], by_size[larger]["seconds"]
+            if min(small_time, large_time) < MIN_SCALING_S:
+                continue
+            exponent = np.log(large_time / small_time) / np.log(larger / smaller)
+            if exponent > STEPS[name][1] + SCALING_TOLERANCE:
+                regressions.append(f"{name} scales as recipes^{exponent:.2f} from {smaller} to {larger} recipes, expected ^{STEPS[name][1]:.1f}")
+    return regressions
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True, cwd=Path(__file__).parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(recipe_counts: list[int], steps: list[str], history_path: Path, with_logging: bool, fail: bool) -> None:
+    results = {name: {} for name in steps}
+    for n_recipes in recipe_counts:
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            by_step = executor.submit(run_pipeline, n_recipes, steps, with_logging).result()
+        for name, result in by_step.items():
+            results[name][n_recipes] = result
+        print(f"{n_recipes} recipes: " + ", ".join(f"{name} {result['seconds']:.3f}s" for name, result in by_step.items()), flush=True)
+
+    print()
+    print(f"{'step':>20} | " + " ".join(f"{n_recipes:>16}" for n_recipes in recipe_counts))
+    for name in steps:
+        cells = [
+            f"{results[name][n_recipes]['seconds']:>8.3f}s {results[name][n_recipes]['peak_rss_mb']:>5.0f}MB" if n_recipes in results[name] else f"{'-':>16}"
+            for n_recipes in recipe_counts
+        ]
+        print(f"{name:>20} | " + " ".join(cells))
+
+    machine = f"{platform.node()} ({os.cpu_count()} cpus)"
+    regressions = find_regressions(results, load_history(history_path), machine)
+    entry = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": git_commit(),
+        "machine": machine,
+        "python": platform.python_version(),
+        "with_logging": with_logging,
+        "results": {name: {str(n_recipes): result for n_recipes, result in by_size.items()} for name, by_size in results.items()},
+        "regressions": regressions,
+    }
+    with open(history_path, "a", encoding="utf-8") as history_file:
+        history_file.write(json.dumps(entry) + "\n")
+
+    print()
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    print(f"{len(regressions)} regressions, results appended to {history_path}")
+    if regressions and fail:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="end to end pipeline benchmark")
+    parser.add_argument("recipes", nargs="*", type=int, default=[10 ** 2, 10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6])
+    parser.add_argument("--steps", nargs="+", choices=list(STEPS), default=list(STEPS))
+    parser.add_argument("--history", type=Path, default=DEFAULT_HISTORY)
+    parser.add_argument("--with-logging", action="store_true", help="log at the levels in config.py instead of errors only")
+    parser.add_argument("--no-fail", dest="fail", action="store_false", help="exit 0 even when there are regressions")
+    args = parser.parse_args()
+    run(sorted(args.recipes), args.steps, args.history, args.with_logging, args.fail)
@@ -0,0 +1,85 @@
+# round trip latency of the recipe query server (recipe_network/query_server.py) on tiered synthetic recipe sets,
+# the first (cold) answer of every query against repeating it (warm, from the server's cache), over a Unix socket
+#
+# usage: python benchmarks/query_server_benchmark.py [recipe counts...] [--queries N]
+
+# import the shared paths from config.py
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argparse
+import asyncio
+import random
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from recipe_network.graph_builder import GraphBuilder
+from recipe_network.query_client import QueryClient
+from recipe_network.query_server import RecipeQueryService, serve
+from utils.logging import Logger, LogLevel
+
+from synthetic_recipes import generate_tiered_arrays
+
+QUERIES = {
+    "ingredients": {},
+    "products_using": {},
+    "neighborhood": {"hops": 2},
+    "shared_ingredients": {"min_common": 2},
+    "community": {},
+    "requirements": {"rate": 60.0},
+}
+
+def run(recipe_counts: list[int], n_queries: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        logger = Logger(tmp_dir, "query_server_benchmark.log", LogLevel.bitmask(LogLevel.ERROR))
+        socket_path = Path(tmp_dir) / "query.sock"
+        print(f"{'recipes':>9} {'startup s':>10} | " + " ".join(f"{name:>26}" for name in QUERIES))
+        print(f"{'':>9} {'':>10} | " + " ".join(f"{'cold ms':>12} {'warm ms':>13}" for _ in QUERIES))
+        for n_recipes in recipe_counts:
+            start = time.perf_counter()
+            builder = GraphBuilder(tmp_dir, Path(tmp_dir), "benchmark", logger)
+            builder._build_graph_from_table(generate_tiered_arrays(n_recipes))
+            builder.partition_into_clusters(backend="leiden")
+            service = RecipeQueryService(builder)
+            startup_time = time.perf_counter() - start
+
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, daemon=True)
+            thread.start()
+            server = asyncio.run_coroutine_threadsafe(serve(service, socket_path=socket_path), loop)
+            while not socket_path.exists():
+                time.sleep(0.01)
+
+            # products, since most queries are about them
+            products = builder.recipe_table.names
+            items = [products[i] for i in np.unique(builder.recipe_table.recipe_products).tolist()]
+            sample = random.Random(0).sample(items, min(n_queries, len(items)))
+            cells = []
+            with QueryClient(socket_path=socket_path) as client:
+                for name, fields in QUERIES.items():
+                    timings = []
+                    for _ in range(2):
+                        start = time.perf_counter()
+                        for item in sample:
+                            client.query(name, item=item, **fields)
+                        timings.append((time.perf_counter() - start) / len(sample) * 1e3)
+                    cells.append(f"{timings[0]:>12.3f} {timings[1]:>13.3f}")
+            print(f"{n_recipes:>9} {startup_time:>10.3f} | " + " ".join(cells), flush=True)
+
+            # let the cancelled server close its socket before the loop goes
+            server.cancel()
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.run_until_complete(asyncio.gather(*asyncio.all_tasks(loop), return_exceptions=True))
+            loop.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="query server latency benchmark")
+    parser.add_argument("recipes", nargs="*", type=int, default=[1_000, 10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=200, help="distinct items queried per query type")
+    args = parser.parse_args()
+    run(args.recipes, args.queries)
@@ -0,0 +1,76 @@
+# memory and query latency of the memory mapped recipe store (recipe_network.recipe_store) against loading the
+# recipe table and building nx_graph, on tiered synthetic recipe sets
+# every measurement runs in a fresh worker process, RSS is the growth over the worker's baseline
+# (the store's pages stay in the page cache between workers, like workers sharing one store would see them)
+#
+# usage: python benchmarks/recipe_store_benchmark.py [recipe counts...] [--queries N]
+
+# import the shared paths from config.py
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argparse
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from recipe_network.recipe_store import RecipeStore
+from utils.instrumentation import _memory_kb
+
+from synthetic_recipes import generate_tiered_arrays
+
+def measure_store(path: Path, queries: int) -> dict[str, float]:
+    rss_start = _memory_kb()[0]
+    start = time.perf_counter()
+    with RecipeStore(path) as store:
+        open_time = time.perf_counter() - start
+
+        rng = np.random.default_rng(0)
+        names = store.names(rng.integers(0, store.n_items, queries))
+        start = time.perf_counter()
+        for name in names:
+            store.ingredients(name)
+            store.products_using(name)
+        lookup_time = (time.perf_counter() - start) / (2 * queries)
+        start = time.perf_counter()
+        for name in names:
+            store.upstream([name], hops=3)
+        closure_time = (time.perf_counter() - start) / queries
+        rss = (_memory_kb()[0] - rss_start) / 1024
+    return {"open_s": open_time, "lookup_us": lookup_time * 1e6, "closure_us": closure_time * 1e6, "rss_mb": rss}
+
+def measure_graph(path: Path) -> dict[str, float]:
+    rss_start = _memory_kb()[0]
+    start = time.perf_counter()
+    with RecipeStore(path) as store:
+        table = store.to_table()
+    graph = table.to_networkx()
+    load_time = time.perf_counter() - start
+    rss = (_memory_kb()[0] - rss_start) / 1024
+    del graph
+    return {"load_s": load_time, "rss_mb": rss}
+
+def run(recipe_counts: list[int], queries: int) -> None:
+    print(f"{'recipes':>9} {'MB':>7} | {'open ms':>8} {'lookup us':>10} {'3-hop us':>9} {'RSS MB':>7} | {'graph load s':>12} {'graph RSS MB':>12}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for n_recipes in recipe_counts:
+            path = RecipeStore.write(Path(tmp_dir) / f"recipes_{n_recipes}.store", generate_tiered_arrays(n_recipes))
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                store = executor.submit(measure_store, path, queries).result()
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                graph = executor.submit(measure_graph, path).result()
+            print(
+                f"{n_recipes:>9} {path.stat().st_size / 1e6:>7.1f} | {store['open_s'] * 1e3:>8.3f} {store['lookup_us']:>10.1f} {store['closure_us']:>9.1f} "
+                f"{store['rss_mb']:>7.1f} | {graph['load_s']:>12.3f} {graph['rss_mb']:>12.1f}",
+                flush=True,
+            )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="recipe store benchmark")
+    parser.add_argument("recipes", nargs="*", type=int, default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=1000)
+    args = parser.parse_args()
+    run(args.recipes, args.queries)
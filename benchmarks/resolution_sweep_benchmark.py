@@ -0,0 +1,60 @@
+# time a resolution sweep (recipe_network.resolution_sweep) against single clustering runs on synthetic recipe graphs
+# and report how much modularity the collapsed levels give up against clustering every resolution from scratch
+#
+# usage: python benchmarks/resolution_sweep_benchmark.py [recipe counts...] [--points N] [--workers N] [--backend B] [--no-check]
+
+# import the shared paths from config.py
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argparse
+import time
+
+import numpy as np
+
+from recipe_network.clustering import cluster, modularity
+from recipe_network.resolution_sweep import SWEEP_BACKENDS, sweep_resolutions
+from utils.recipe_table import RecipeTable
+
+from synthetic_recipes import generate_recipes
+
+def run(recipe_counts: list[int], points: int, workers: int | None, backend: str, check: bool) -> None:
+    resolutions = np.geomspace(0.25, 16.0, points)
+    print(f"{'nodes':>9} {'edges':>9} | {'single s':>9} {'sweep s':>8} {'x single':>9} {'Q loss mean':>12} {'Q loss max':>11} {'mean NMI':>9}")
+    for n_recipes in recipe_counts:
+        table = RecipeTable.from_records(generate_recipes(n_recipes))
+        sources, targets, weights = table.unique_edges()
+
+        start = time.perf_counter()
+        cluster(table.n_items, sources, targets, weights, backend=backend, resolution=2.0)
+        single_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        hierarchy = sweep_resolutions(table.n_items, sources, targets, weights, resolutions=resolutions, backend=backend, max_workers=workers)
+        sweep_time = time.perf_counter() - start
+
+        # relative modularity lost to collapsing, against one clustering from scratch per resolution
+        loss_mean = loss_max = float("nan")
+        if check:
+            scratch = np.array([
+                modularity(cluster(table.n_items, sources, targets, weights, backend=backend, resolution=resolution), sources, targets, weights, resolution)
+                for resolution in hierarchy.resolutions
+            ])
+            loss = 1 - hierarchy.modularity / scratch
+            loss_mean, loss_max = loss.mean(), loss.max()
+        print(
+            f"{table.n_items:>9} {len(sources):>9} | {single_time:>9.3f} {sweep_time:>8.3f} {sweep_time / single_time:>9.1f} "
+            f"{loss_mean:>12.2%} {loss_max:>11.2%} {np.nanmean(hierarchy.stability):>9.3f}",
+            flush=True,
+        )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="resolution sweep benchmark")
+    parser.add_argument("recipes", nargs="*", type=int, default=[1_000, 10_000, 100_000])
+    parser.add_argument("--points", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--backend", choices=SWEEP_BACKENDS, default="leiden")
+    parser.add_argument("--no-check", dest="check", action="store_false", help="skip clustering every resolution from scratch")
+    args = parser.parse_args()
+    run(args.recipes, args.points, args.workers, args.backend, args.check)
@@ -0,0 +1,57 @@
+# time the recipe set summary (recipe_network.summary_report) on tiered synthetic recipe sets, against the
+# per pair common ingredient map print_items_summary used to log while that still fits in memory
+#
+# usage: python benchmarks/summary_report_benchmark.py [recipe counts...] [--top-k K] [--max-work W] [--pairs-up-to N]
+
+# import the shared paths from config.py
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argparse
+import tempfile
+import time
+
+from recipe_network.ingredient_index import IngredientIndex
+from recipe_network.summary_report import MAX_OVERLAP_WORK, SUMMARY_TOP_K, summary_report, write_summary_report
+
+from synthetic_recipes import generate_tiered_arrays
+
+def run(recipe_counts: list[int], top_k: int, max_work: int, pairs_up_to: int) -> None:
+    print(f"{'recipes':>9} {'pair work':>12} | {'report s':>9} {'write ms':>9} {'KB':>6} {'exact':>12} | {'pair map s':>10}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for n_recipes in recipe_counts:
+            table = generate_tiered_arrays(n_recipes)
+            index = IngredientIndex.from_table(table)
+
+            start = time.perf_counter()
+            report = summary_report(table, index, top_k=top_k, max_work=max_work)
+            report_time = time.perf_counter() - start
+            start = time.perf_counter()
+            path = write_summary_report(report, Path(tmp_dir) / f"summary_{n_recipes}.json")
+            write_time = time.perf_counter() - start
+
+            # what the old summary went through, one tuple per pair sharing an ingredient
+            pair_map_time = float("nan")
+            if n_recipes <= pairs_up_to:
+                start = time.perf_counter()
+                first_ids, second_ids, _ = IngredientIndex.from_table(table).common_pairs()
+                for product_id, other_product_id in zip(first_ids.tolist(), second_ids.tolist()):
+                    index.common_ingredients(product_id, other_product_id)
+                pair_map_time = time.perf_counter() - start
+
+            totals = report["totals"]
+            exact = f"{'pairs' if totals['shared_pairs_exact'] else '-'}/{'overlap' if totals['overlap_exact'] else '~'}"
+            print(
+                f"{n_recipes:>9} {totals['pair_work']:>12} | {report_time:>9.3f} {write_time * 1e3:>9.2f} {path.stat().st_size / 1024:>6.1f} {exact:>12} | {pair_map_time:>10.3f}",
+                flush=True,
+            )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="summary report benchmark")
+    parser.add_argument("recipes", nargs="*", type=int, default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--top-k", type=int, default=SUMMARY_TOP_K)
+    parser.add_argument("--max-work", type=int, default=MAX_OVERLAP_WORK)
+    parser.add_argument("--pairs-up-to", type=int, default=10_000, help="largest recipe count to also time the per pair map on")
+    args = parser.parse_args()
+    run(args.recipes, args.top_k, args.max_work, args.pairs_up_to)
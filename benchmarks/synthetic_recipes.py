@@ -0,0 +1,123 @@
+from pathlib import Path
+
+import numpy as np
+
+from utils.recipe_table import RecipeTable
+
+def generate_recipes(n_recipes: int, avg_ingredients: float = 3.0, n_raw: int | None = None, seed: int = 0) -> list[dict]:
+    # synthetic recipe set in the same shape the data_manipulation program writes:
+    # [{"product": str, "ingredients": {str: int}}, ...]
+    # recipe i only uses raw materials and recipes with a lower index, so the recipe graph is a DAG,
+    # ingredient choice is skewed towards low indices so a few items are used everywhere (like Iron Ingot)
+    rng = np.random.default_rng(seed)
+    if n_raw is None:
+        n_raw = max(10, int(np.sqrt(n_recipes)))
+
+    names = [f"Raw {i}" for i in range(n_raw)] + [f"Item {i}" for i in range(n_recipes)]
+    counts = np.clip(rng.poisson(avg_ingredients - 1, n_recipes) + 1, 1, None)
+
+    recipes = []
+    for i in range(n_recipes):
+        available = n_raw + i
+        picks = np.unique((available * rng.random(counts[i]) ** 2).astype(np.int64))
+        quantities = rng.integers(1, 11, len(picks))
+        recipes.append({
+            "product": names[n_raw + i],
+            "ingredients": {names[p]: int(q) for p, q in zip(picks, quantities)},
+        })
+    return recipes
+
+# tiered generator calibrated on the game's own recipes (data/final): fan-in 1-6 ingredients, 2.7 on average,
+# growing with the tier, a heavy tailed fan-out (the most used item shows up in about a fifth of the recipes,
+# the median item in two), a recipe depth of about 9 and quantities with a median of 3
+DEFAULT_TIERS = 8
+# share of the recipes in tier t is proportional to TIER_DECAY ** t, so there are fewer high tier products
+TIER_DECAY = 0.8
+MAX_INGREDIENTS = 6
+# popularity of the items of one tier falls off as 1 / (rank + 1) ** ZIPF_EXPONENT
+ZIPF_EXPONENT = 1.0
+# ingredients other than the first come from lower tiers, each tier further down half as likely (per item)
+LOWER_TIER_DECAY = 0.5
+
+def generate_tiered_arrays(n_recipes: int, n_tiers: int = DEFAULT_TIERS, n_raw: int | None = None, zipf_exponent: float = ZIPF_EXPONENT, seed: int = 0) -> RecipeTable:
+    # synthetic recipe set with a DSP-like structure, built in numpy so 10⁶ recipes take seconds:
+    # raw materials, then n_tiers tiers of products, every recipe of tier t uses at least one item of tier t - 1
+    # (the raw materials for tier 0), so the longest chain has n_tiers recipes, the other ingredients come from
+    # any lower tier, and within a tier a few items are used everywhere (like Iron Ingot) and most rarely
+    rng = np.random.default_rng(seed)
+    if n_raw is None:
+        n_raw = max(10, round(2 * np.sqrt(n_recipes)))
+
+    # recipes per tier, the rounding remainder goes to the first tier
+    tier_sizes = np.floor(n_recipes * TIER_DECAY ** np.arange(n_tiers) / (TIER_DECAY ** np.arange(n_tiers)).sum()).astype(np.int64)
+    tier_sizes[0] += n_recipes - tier_sizes.sum()
+    # group 0 is the raw materials, group t + 1 is tier t
+    group_sizes = np.concatenate(([n_raw], tier_sizes))
+    group_starts = np.concatenate(([0], np.cumsum(group_sizes)[:-1]))
+
+    names = [f"Raw {i}" for i in range(n_raw)]
+    for tier, size in enumerate(tier_sizes.tolist()):
+        names.extend(f"Tier {tier} Item {i}" for i in range(size))
+
+    tiers = np.repeat(np.arange(n_tiers), tier_sizes)
+    fan_in = np.clip(1 + rng.poisson(np.minimum(1.0 + 0.25 * tiers, 2.8)), 1, MAX_INGREDIENTS)
+
+    def zipf_cdf(size: int) -> np.ndarray:
+        weights = 1.0 / np.arange(1, size + 1) ** zipf_exponent
+        return np.cumsum(weights) / weights.sum()
+
+    cdfs = [zipf_cdf(size) for size in group_sizes.tolist()]
+    picks = []
+    recipe_of_pick = []
+    recipe_start = 0
+    for tier, size in enumerate(tier_sizes.tolist()):
+        recipes = np.arange(recipe_start, recipe_start + size)
+        recipe_start += size
+        if size == 0:
+            continue
+
+        # first ingredient from the tier right below
+        below = tier
+        first = group_starts[below] + np.minimum(np.searchsorted(cdfs[below], rng.random(size)), group_sizes[below] - 1)
+
+        # the others from any lower group, picked per item weight so bigger tiers get more picks
+        extra = fan_in[recipes] - 1
+        n_extra = int(extra.sum())
+        group_weights = group_sizes[:tier + 1] * LOWER_TIER_DECAY ** np.arange(tier, -1, -1)
+        groups = np.searchsorted(np.cumsum(group_weights) / group_weights.sum(), rng.random(n_extra))
+        groups = np.minimum(groups, tier)
+        ranks = np.empty(n_extra, dtype=np.int64)
+        for group in np.unique(groups).tolist():
+            in_group = groups == group
+            ranks[in_group] = np.minimum(np.searchsorted(cdfs[group], rng.random(int(in_group.sum()))), group_sizes[group] - 1)
+        others = group_starts[groups] + ranks
+
+        picks.extend((first, others))
+        recipe_of_pick.extend((recipes, np.repeat(recipes, extra)))
+
+    picks = np.concatenate(picks) if picks else np.empty(0, dtype=np.int64)
+    recipe_of_pick = np.concatenate(recipe_of_pick) if recipe_of_pick else np.empty(0, dtype=np.int64)
+
+    # an item picked twice for the same recipe counts once
+    order = np.lexsort((picks, recipe_of_pick))
+    picks, recipe_of_pick = picks[order], recipe_of_pick[order]
+    keep = np.r_[True, (picks[1:] != picks[:-1]) | (recipe_of_pick[1:] != recipe_of_pick[:-1])]
+    picks, recipe_of_pick = picks[keep], recipe_of_pick[keep]
+
+    indptr = np.zeros(n_recipes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(recipe_of_pick, minlength=n_recipes), out=indptr[1:])
+    quantities = np.clip(np.rint(np.exp(rng.normal(1.0, 0.9, len(picks)))), 1, 100).astype(np.int32)
+    return RecipeTable(names, (n_raw + np.arange(n_recipes)).astype(np.int32), indptr, picks.astype(np.int32), quantities)
+
+def generate_tiered_recipes(n_recipes: int, n_tiers: int = DEFAULT_TIERS, n_raw: int | None = None, zipf_exponent: float = ZIPF_EXPONENT, seed: int = 0) -> list[dict]:
+    # generate_tiered_arrays as records, the shape the data_manipulation program writes
+    return generate_tiered_arrays(n_recipes, n_tiers, n_raw, zipf_exponent, seed).to_records()
+
+def write_recipe_csv(path: str | Path, table: RecipeTable, recipes: slice = slice(None)) -> None:
+    # recipes in the processed csv format the data_manipulation program reads: Product,"1- Ingredient,2- Ingredient"
+    names = table.names
+    indptr, ingredients, quantities = table.indptr, table.ingredients.tolist(), table.quantities.tolist()
+    with open(path, "w", encoding="utf-8") as csv_file:
+        for recipe in range(*recipes.indices(table.n_recipes)):
+            entries = ",".join(f"{quantities[i]}- {names[ingredients[i]]}" for i in range(indptr[recipe], indptr[recipe + 1]))
+            csv_file.write(f'{names[table.recipe_products[recipe]]},"{entries}"\n')
@@ -0,0 +1,171 @@
+# dsp-network, one command for the programs in data_manipulation/program.py and recipe_network/program.py
+#   dsp-network transform [--streaming [--format ndjson]] [--merged SOURCE]
+#   dsp-network build [--igraph]
+#   dsp-network cluster [--backend leiden] [--resolution R]
+#   dsp-network export [--precomputed] [--collapse] [--common-ingredients]
+#   dsp-network summary [--format csv] [--top-k K]
+#   dsp-network serve / dsp-network query ...   (recipe_network/query_server.py, query_client.py)
+# --report, --profile and --trace-allocations before the subcommand write profiles/<subcommand>_trace.json
+# (see utils/instrumentation.py)
+# only argparse and config.py are imported up front, every subcommand imports what it needs when it runs,
+# so --help costs nothing and e.g. summary never loads pyvis, igraph or pandas
+# installed with pip install -e . (pyproject.toml), or run as python cli.py from the repository root
+
+import argparse
+import sys
+from pathlib import Path
+
+from config import CLUSTER_RESOLUTION, CLUSTERING_BACKENDS, PROFILING_DIR, QUERY_HOST, QUERY_PORT, SUMMARY_FORMATS, SUMMARY_TOP_K
+
+def transform(args: argparse.Namespace) -> None:
+    from data_manipulation.program import data_transformation, merged_data_transformation
+
+    if args.merged is not None:
+        merged_data_transformation(args.merged, args.output, args.workers)
+    else:
+        data_transformation(streaming=args.streaming, output_format=args.format or "json")
+
+def build(args: argparse.Namespace) -> None:
+    from recipe_network.program import build_igraph_network, build_pyviz_network, update_pyviz_network
+
+    if args.igraph:
+        build_igraph_network()
+    elif args.update:
+        update_pyviz_network()
+    else:
+        build_pyviz_network()
+
+def _load_graph(graph_builder, snapshot: bool) -> None:
+    # from the last build's snapshot when asked for and the json hasn't changed since, otherwise from the json (or its cache)
+    from utils.recipes import recipe_filenames
+
+    filenames = recipe_filenames(graph_builder.data_dir)
+    if not (snapshot and graph_builder.load_snapshot(*filenames)):
+        graph_builder.import_network_from_json(*filenames)
+
+def cluster(args: argparse.Namespace) -> None:
+    from recipe_network.program import pyviz_graph_builder
+
+    graph_builder = pyviz_graph_builder()
+    _load_graph(graph_builder, snapshot=False)
+    graph_builder.partition_into_clusters(backend=args.backend, resolution=args.resolution)
+    graph_builder.save_snapshot()
+    sizes = sorted((len(community) for community in graph_builder.communities), reverse=True)
+    print(f"{len(sizes)} communities of {graph_builder.nx_graph.number_of_nodes()} items, largest {sizes[:10]}")
+
+def export(args: argparse.Namespace) -> None:
+    # renders the communities of the last cluster (or build) run, clustering first when there are none
+    from recipe_network.program import pyviz_graph_builder
+
+    graph_builder = pyviz_graph_builder()
+    _load_graph(graph_builder, snapshot=True)
+    if not graph_builder.communities:
+        graph_builder.partition_into_clusters(backend=args.backend)
+    graph_builder.build_pyviz_graph(precomputed_layout=args.precomputed, collapse_communities=args.collapse, drill_down=args.drill_down)
+    if args.common_ingredients:
+        graph_builder.partition_into_common_ingredient_clusters()
+    print(f"Exported {graph_builder.graph_name} to {graph_builder.output_path}")
+
+def summary(args: argparse.Namespace) -> int:
+    from recipe_network.program import pyviz_graph_builder
+    from recipe_network.summary_report import check_summary_format
+
+    # before loading the graph, a missing parquet engine should not cost a whole run
+    try:
+        check_summary_format(args.format)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    graph_builder = pyviz_graph_builder()
+    _load_graph(graph_builder, snapshot=False)
+    path = graph_builder.print_items_summary(output_format=args.format, top_k=args.top_k)
+    print(f"{len(graph_builder.products)} products, {len(graph_builder.ingredients)} ingredients, summary written to {path}")
+    return 0
+
+def serve(args: argparse.Namespace) -> None:
+    from recipe_network.query_server import run_server
+
+    run_server(args.host, args.port, Path(args.socket) if args.socket else None, args.backend, args.recluster)
+
+def query(args: argparse.Namespace) -> int:
+    from recipe_network.query_client import main
+
+    return main(args.arguments, prog="dsp-network query")
+
+def _positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"expected a positive integer, got {value}")
+    return number
+
+def parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="dsp-network", description="Dyson Sphere Program recipe network analysis")
+    parser.add_argument("--report", action="store_true", help="write per-stage timings and memory to profiles/<command>_trace.json")
+    parser.add_argument("--profile", action="store_true", help="add a cProfile dump next to the report")
+    parser.add_argument("--trace-allocations", action="store_true", help="add the tracemalloc peak of every stage to the report")
+    commands = parser.add_subparsers(dest="command", required=True, metavar="command")
+
+    command = commands.add_parser("transform", help="parse the recipe csv files into json")
+    command.add_argument("--streaming", action="store_true", help="parse and write the csv in chunks")
+    command.add_argument("--format", choices=["json", "ndjson"], default=None, help="output format, only with --streaming (default json)")
+    command.add_argument("--merged", metavar="SOURCE", default=None, help="parse every recipe file under SOURCE (directory or glob) into one json")
+    command.add_argument("--output", default="recipes.json", help="file name of the merged json, written to data/merged/")
+    command.add_argument("--workers", type=int, default=None)
+    command.set_defaults(handler=transform)
+
+    command = commands.add_parser("build", help="build, cluster and render the whole recipe network")
+    command.add_argument("--igraph", action="store_true", help="plot the igraph network with matplotlib instead")
+    command.add_argument("--update", action="store_true", help="apply the changes since the last build instead of rebuilding")
+    command.set_defaults(handler=build)
+
+    command = commands.add_parser("cluster", help="partition the recipe network into communities and save them")
+    command.add_argument("--backend", choices=CLUSTERING_BACKENDS, default="networkx")
+    command.add_argument("--resolution", type=float, default=CLUSTER_RESOLUTION)
+    command.set_defaults(handler=cluster)
+
+    command = commands.add_parser("export", help="render the recipe network html with the saved communities")
+    command.add_argument("--precomputed", action="store_true", help="precomputed layout instead of pyvis physics")
+    command.add_argument("--collapse", action="store_true", help="show every community as one node (with --precomputed)")
+    command.add_argument("--no-drill-down", dest="drill_down", action="store_false", help="collapsed communities don't expand on click")
+    command.add_argument("--common-ingredients", action="store_true", help="also render the common ingredient graphs")
+    command.add_argument("--backend", choices=CLUSTERING_BACKENDS, default="networkx", help="clustering backend when there are no saved communities")
+    command.set_defaults(handler=export)
+
+    command = commands.add_parser("summary", help="write the degree, ingredient usage and common ingredient report")
+    command.add_argument("--format", choices=SUMMARY_FORMATS, default="json", help="parquet needs pyarrow or fastparquet")
+    command.add_argument("--top-k", type=_positive_int, default=SUMMARY_TOP_K, help="most used ingredients and most shared product pairs to report")
+    command.set_defaults(handler=summary)
+
+    command = commands.add_parser("serve", help="run the recipe query server")
+    command.add_argument("--host", default=QUERY_HOST)
+    command.add_argument("--port", type=int, default=QUERY_PORT)
+    command.add_argument("--socket", default=None, help="serve on this Unix socket instead of TCP")
+    command.add_argument("--backend", default="leiden", help="clustering backend when there is no snapshot to load")
+    command.add_argument("--recluster", action="store_true", help="import and cluster the json instead of loading the last snapshot")
+    command.set_defaults(handler=serve)
+
+    # everything after query goes to the client's own parser, --help included
+    command = commands.add_parser("query", help="ask the query server, see dsp-network query --help", add_help=False)
+    command.set_defaults(handler=query)
+    return parser
+
+def main(argv: list[str] | None = None) -> int:
+    command_parser = parser()
+    args, arguments = command_parser.parse_known_args(argv)
+    if arguments and args.command != "query":
+        command_parser.error(f"unrecognized arguments: {' '.join(arguments)}")
+    if args.command == "transform" and args.format is not None and not args.streaming:
+        command_parser.error("transform: --format only applies with --streaming")
+    args.arguments = arguments
+    if not (args.report or args.profile or args.trace_allocations):
+        return args.handler(args) or 0
+
+    from utils.instrumentation import recording
+
+    with recording(PROFILING_DIR / f"{args.command}_trace.json", profile=args.profile, trace_allocations=args.trace_allocations):
+        status = args.handler(args) or 0
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,10 +7,38 @@ PROJECT_ROOT = Path(__file__).parent
 DATA_DIR = PROJECT_ROOT / "data/" 
 PROCESSED_DATA_DIR = DATA_DIR / "processed/" 
 FINAL_DATA_DIR = DATA_DIR / "final/"
+# merged output of data_manipulation.program.merged_data_transformation, kept out of final/ since
+# scanning final/ for recipe files would pick it up next to the items and buildings json it was merged from
+MERGED_DATA_DIR = DATA_DIR / "merged/"
 
 # logging configuration
-LOG_LEVELS = LogLevel
+# drop TRACE/DEBUG here to keep the per-ingredient messages out of the log files
+LOG_LEVELS = LogLevel.bitmask(
+    LogLevel.TRACE,
+    LogLevel.DEBUG,
+    LogLevel.INFO,
+    LogLevel.WARNING,
+    LogLevel.ERROR
+)
 LOGGING_DIR = PROJECT_ROOT / "logs/"
 
+# cache of parsed recipe graphs, keyed on the contents of the json files
+CACHE_DIR = PROJECT_ROOT / "cache/"
+
+# stage timing reports (Chrome trace json) and cProfile dumps, see utils/instrumentation.py
+PROFILING_DIR = PROJECT_ROOT / "profiles/"
+
 # graphing configuration
-GRAPH_OUTPUT_DIR = PROJECT_ROOT / "graphs/"
\ No newline at end of file
+GRAPH_OUTPUT_DIR = PROJECT_ROOT / "graphs/"
+
+# community detection engines and the default resolution, see recipe_network/clustering.py
+CLUSTERING_BACKENDS = ("networkx", "igraph", "leiden", "cnm")
+CLUSTER_RESOLUTION = 2.0
+
+# recipe set summary formats and default report size, see recipe_network/summary_report.py
+SUMMARY_FORMATS = ("json", "csv", "parquet")
+SUMMARY_TOP_K = 20
+
+# local recipe query server, see recipe_network/query_server.py
+QUERY_HOST = "127.0.0.1"
+QUERY_PORT = 8765
@@ -1,8 +1,34 @@
 import json
 from pathlib import Path
 
+import numpy as np
+import pandas as pd
+
+from utils import instrumentation
 from utils.logging import Logger, LogLevel
 
+# "N- Ingredient" entries of a recipe cell, the same split _parse_line does with split('- ')
+INGREDIENT_PATTERN = r"^\s*(\d+)- (.*)$"
+
+STREAM_FORMATS = ("json", "ndjson")
+
+def parse_recipe_chunk(chunk: pd.DataFrame) -> tuple[np.ndarray, list[str], list[int]]:
+    # vectorized parse of a chunk of (product, recipe) rows into long format
+    # returns (bounds, ingredient names, ingredient weights) where the ingredients of row r
+    # are names[bounds[r]:bounds[r + 1]], ValueError for entries that don't match "N- Ingredient"
+    # (parse_file fails on them too), empty entries of an empty recipe cell are skipped
+    entries = chunk["recipe"].str.split(",").explode()
+    parsed = entries.str.extract(INGREDIENT_PATTERN)
+    invalid = parsed[0].isna() & (entries.str.strip() != "")
+    if invalid.any():
+        rows = [f"{chunk['product'].iat[row]}: {entry!r}" for row, entry in entries[invalid].head(5).items()]
+        raise ValueError(f"{int(invalid.sum())} ingredient entries don't match 'N- Ingredient', e.g. {'; '.join(rows)}")
+    parsed = parsed.dropna()
+
+    rows = parsed.index.to_numpy()
+    bounds = np.searchsorted(rows, np.arange(len(chunk) + 1))
+    return bounds, parsed[1].tolist(), parsed[0].astype(np.int64).tolist()
+
 class FuckassDSPDataTransformer:
     def __init__(self, raw_data_path: Path, transformed_data_path: Path, logger: Logger) -> None:
         self.raw_data_path = raw_data_path
@@ -21,12 +47,12 @@ class FuckassDSPDataTransformer:
         #       "ingredient_name_2": weight_2,
         #       ...
         #   },
-        self._logger(LogLevel.DEBUG, f"Parsing line: {line}")
+        self._logger(LogLevel.DEBUG, "Parsing line: %s", line)
 
         tokens = line.split(',"')
         key = tokens[0]
         weighted_valuemap = tokens[1].replace('"', '').split(',') # remove quotes and tokenize based on commas
-        self._logger(LogLevel.TRACE, f"weighted_valuemap: {weighted_valuemap}")
+        self._logger(LogLevel.TRACE, "weighted_valuemap: %s", weighted_valuemap)
 
         # split the #- ingredient weight pairs into something usable
         # example [1- Plasma Capsule, 2- Iron Ingot] -> {'Plasma Capsule': 1, 'Iron Ingot': 2}
@@ -35,7 +61,7 @@ class FuckassDSPDataTransformer:
             ingredient_weight, ingredient_name = ingredient.split('- ')
             ingredient_weight = int(ingredient_weight)
 
-            self._logger(LogLevel.TRACE, f"Ingredient parsed - Name: {ingredient_name}, Weight: {ingredient_weight}")
+            self._logger(LogLevel.TRACE, "Ingredient parsed - Name: %s, Weight: %s", ingredient_name, ingredient_weight)
 
             ingredients[ingredient_name] = ingredient_weight
 
@@ -45,10 +71,12 @@ class FuckassDSPDataTransformer:
             "ingredients": ingredients
         })
 
+    @instrumentation.stage("csv parse")
     def parse_file(self, filename: str) -> None:
         self._logger(LogLevel.INFO, "=" * 100, reset=True)
         self._logger(LogLevel.INFO, f"Starting to parse file: {filename}")
 
+        parsed_before = len(self.transformed_data)
         try:
             with open(self.raw_data_path / filename, "r") as raw_file:
                 for line in raw_file:
@@ -57,8 +85,71 @@ class FuckassDSPDataTransformer:
             self._logger(LogLevel.ERROR, f"Failed to parse file: {filename}. Error: {e}")
             return
 
+        instrumentation.count("recipes parsed", len(self.transformed_data) - parsed_before)
         self._logger(LogLevel.INFO, f"Finished parsing file: {filename}")
         
+    @instrumentation.stage("csv stream")
+    def stream_file(self, filename: str, output_filename: str, output_format: str = "json", chunksize: int = 100_000) -> None:
+        # streaming alternative to parse_file + save_transformed_data for very large recipe dumps
+        # the csv is read in chunks with pandas and every chunk is parsed with vectorized string ops,
+        # then written out straight away, so memory stays bounded by the chunk size
+        # output formats:
+        #   "json"   - compact json array, same records parse_file produces, readable by recipe_network
+        #   "ndjson" - one compact record per line
+        if output_format not in STREAM_FORMATS:
+            raise ValueError(f"Unknown output format {output_format}, expected one of {STREAM_FORMATS}")
+
+        self._logger(LogLevel.INFO, "=" * 100, reset=True)
+        self._logger(LogLevel.INFO, f"Starting to stream file: {filename} -> {output_filename} ({output_format})")
+
+        records_written = 0
+        try:
+            with open(self.transformed_data_path / output_filename, "w") as output_file:
+                if output_format == "json":
+                    output_file.write("[")
+
+                chunks = pd.read_csv(
+                    self.raw_data_path / filename,
+                    header=None,
+                    names=["product", "recipe"],
+                    usecols=[0, 1],
+                    dtype=str,
+                    keep_default_na=False,
+                    chunksize=chunksize,
+                )
+                for chunk in chunks:
+                    chunk = chunk.reset_index(drop=True)
+                    bounds, names, weights = parse_recipe_chunk(chunk)
+                    self._logger(LogLevel.DEBUG, "Parsed chunk of %s recipes with %s ingredients", len(chunk), len(names))
+
+                    lines = []
+                    for row, product in enumerate(chunk["product"].tolist()):
+                        start, end = bounds[row], bounds[row + 1]
+                        record = {
+                            "product": product,
+                            "ingredients": dict(zip(names[start:end], weights[start:end])),
+                        }
+                        lines.append(json.dumps(record, separators=(",", ":")))
+
+                    if not lines:
+                        continue
+                    if output_format == "json":
+                        output_file.write(("," if records_written else "") + ",".join(lines))
+                    else:
+                        output_file.write("\n".join(lines) + "\n")
+                    records_written += len(lines)
+
+                if output_format == "json":
+                    output_file.write("]")
+        except Exception as e:
+            self._logger(LogLevel.ERROR, f"Failed to stream file: {filename}. Error: {e}")
+            return
+
+        instrumentation.count("recipes parsed", records_written)
+        self._logger(LogLevel.INFO, f"Streamed {records_written} records to: {output_filename}")
+        self._logger(LogLevel.INFO, "=" * 100)
+
+    @instrumentation.stage("json write")
     def save_transformed_data(self, output_filename: str) -> None:
         try:
             with open(self.transformed_data_path / output_filename, "w") as output_file:
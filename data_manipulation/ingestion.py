@@ -0,0 +1,100 @@
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from data_manipulation.data_manipulator import parse_recipe_chunk
+from utils import instrumentation
+from utils.logging import Logger, LogLevel
+from utils.recipe_table import RecipeTable
+from utils.recipes import load_recipes
+
+RECIPE_SUFFIXES = (".csv", ".json", ".ndjson", ".jsonl")
+
+def find_recipe_files(source: str | Path) -> list[Path]:
+    # a directory (every recipe file in it), a glob pattern or a single file,
+    # always sorted so the merge order does not depend on the filesystem
+    source = str(source)
+    if os.path.isdir(source):
+        paths = [path for path in Path(source).iterdir() if path.suffix in RECIPE_SUFFIXES]
+    elif glob.has_magic(source):
+        paths = [Path(path) for path in glob.glob(source, recursive=True)]
+    else:
+        paths = [Path(source)]
+    return sorted(path for path in paths if path.is_file())
+
+def _csv_to_table(path: Path, chunksize: int) -> RecipeTable:
+    # processed csv rows (Product,"N- Ingredient,...") straight to a RecipeTable,
+    # names are interned per file in first-seen order (product, then its ingredients)
+    product_chunks = []
+    name_chunks = []
+    weight_chunks = []
+    count_chunks = []
+    chunks = pd.read_csv(path, header=None, names=["product", "recipe"], usecols=[0, 1], dtype=str, keep_default_na=False, chunksize=chunksize)
+    for chunk in chunks:
+        chunk = chunk.reset_index(drop=True)
+        bounds, names, weights = parse_recipe_chunk(chunk)
+        product_chunks.append(chunk["product"].to_numpy(dtype=object))
+        name_chunks.append(np.asarray(names, dtype=object))
+        weight_chunks.append(np.asarray(weights, dtype=np.int32))
+        count_chunks.append(np.diff(bounds))
+
+    products = np.concatenate(product_chunks) if product_chunks else np.empty(0, dtype=object)
+    ingredients = np.concatenate(name_chunks) if name_chunks else np.empty(0, dtype=object)
+    counts = np.concatenate(count_chunks) if count_chunks else np.empty(0, dtype=np.int64)
+
+    # interleave every product with its ingredients so factorize assigns ids in first-seen order
+    indptr = np.zeros(len(products) + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+    product_positions = indptr[:-1] + np.arange(len(products))
+    is_ingredient = np.ones(len(products) + len(ingredients), dtype=bool)
+    is_ingredient[product_positions] = False
+    sequence = np.empty(len(is_ingredient), dtype=object)
+    sequence[product_positions] = products
+    sequence[is_ingredient] = ingredients
+    codes, uniques = pd.factorize(sequence)
+
+    return RecipeTable(
+        uniques.tolist(),
+        codes[product_positions],
+        indptr,
+        codes[is_ingredient],
+        np.concatenate(weight_chunks) if weight_chunks else np.empty(0, dtype=np.int32),
+    )
+
+def parse_recipe_file(path: str | Path, chunksize: int = 100_000) -> RecipeTable:
+    # worker entry point, RecipeTable pickles as its flat numpy arrays so results cross the
+    # process boundary as a handful of buffers instead of pickled dicts of dicts
+    path = Path(path)
+    if path.suffix == ".csv":
+        return _csv_to_table(path, chunksize)
+    return RecipeTable.from_records(load_recipes(path))
+
+@instrumentation.stage("recipe ingest")
+def ingest_recipe_files(paths: list[Path], logger: Logger, max_workers: int | None = None) -> RecipeTable:
+    # parse recipe files (base game plus mod packs) concurrently in a process pool and
+    # merge them in path order, so the result is the same whatever order workers finish in
+    # every recipe is kept, so a product defined in several files keeps all of its recipes
+    # and later files win wherever the builders keep a single recipe per product
+    logger(LogLevel.INFO, f"Ingesting {len(paths)} recipe files")
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, len(paths)))
+
+    if max_workers == 1:
+        parts = [parse_recipe_file(path) for path in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            chunksize = max(1, len(paths) // (4 * max_workers))
+            parts = list(executor.map(parse_recipe_file, [str(path) for path in paths], chunksize=chunksize))
+
+    for path, part in zip(paths, parts):
+        logger(LogLevel.DEBUG, "Parsed %s: %s recipes, %s ingredients", path, part.n_recipes, part.n_edges)
+
+    merged = RecipeTable.concat(parts)
+    instrumentation.count("recipes parsed", merged.n_recipes)
+    logger(LogLevel.INFO, f"Merged {merged.n_recipes} recipes from {len(paths)} files using {max_workers} workers")
+    return merged
@@ -1,24 +1,67 @@
-# import the shared paths from config.py
 import sys
 from pathlib import Path
-sys.path.insert(0, str(Path(__file__).parent.parent))
-from config import PROCESSED_DATA_DIR, FINAL_DATA_DIR, LOGGING_DIR, LOG_LEVELS
-from utils.logging import Logger
+if __package__ in (None, ""):
+    # run as a script instead of through the dsp-network command (cli.py), import the shared paths from config.py
+    sys.path.insert(0, str(Path(__file__).parent.parent))
+import json
 
-from data_manipulator import FuckassDSPDataTransformer
+from config import PROCESSED_DATA_DIR, FINAL_DATA_DIR, MERGED_DATA_DIR, LOGGING_DIR, LOG_LEVELS, PROFILING_DIR
+from utils.instrumentation import recording
+from utils.logging import Logger, LogLevel
+from utils.recipes import RECIPE_FILE_SUFFIXES, RECIPE_NAMES
+
+# the parsers (pandas) are imported by the functions using them
 
 # data from https://docs.google.com/spreadsheets/d/1UdwWUkZhCOrNBidocL2-Oueyl-dfo1P-/edit?gid=665114638#gid=665114638
 
-def data_transformation():
-    # transform item data
-    item_transformer = FuckassDSPDataTransformer(PROCESSED_DATA_DIR, FINAL_DATA_DIR, logger=Logger(LOGGING_DIR, "items.log", LOG_LEVELS))
-    item_transformer.parse_file("items.csv")
-    item_transformer.save_transformed_data("items.json")
-    
-    # transform building data
-    building_transformer = FuckassDSPDataTransformer(PROCESSED_DATA_DIR, FINAL_DATA_DIR, logger=Logger(LOGGING_DIR, "buildings.log", LOG_LEVELS))
-    building_transformer.parse_file("buildings.csv")
-    building_transformer.save_transformed_data("buildings.json")
+def data_transformation(streaming: bool = False, output_format: str = "json", report: bool = False, profile: bool = False,
+                        input_dir: Path = PROCESSED_DATA_DIR, output_dir: Path = FINAL_DATA_DIR, log_dir: Path = LOGGING_DIR, log_levels: int = LOG_LEVELS):
+    # streaming=True reads the csv in chunks and writes records as they are parsed (see stream_file),
+    # output_format "ndjson" writes items.ndjson/buildings.ndjson instead of the json arrays (streaming only),
+    # the copy in the other format is removed so output_dir never holds the same recipes twice
+    # report writes the per-stage timings to profiles/data_transformation_trace.json, profile adds a cProfile dump
+    # the directories default to the ones in config.py, the benchmarks point them at generated data
+    from data_manipulation.data_manipulator import FuckassDSPDataTransformer
+
+    if output_format != "json" and not streaming:
+        raise ValueError(f"Output format {output_format} needs streaming, parse_file only writes json")
+
+    with recording(PROFILING_DIR / "data_transformation_trace.json" if report or profile else None, profile=profile):
+        for name in RECIPE_NAMES:
+            transformer = FuckassDSPDataTransformer(Path(input_dir), Path(output_dir), logger=Logger(log_dir, f"{name}.log", log_levels))
+            if streaming:
+                transformer.stream_file(f"{name}.csv", f"{name}.{output_format}", output_format=output_format)
+            else:
+                transformer.parse_file(f"{name}.csv")
+                transformer.save_transformed_data(f"{name}.json")
+            for suffix in RECIPE_FILE_SUFFIXES:
+                if suffix != f".{output_format}":
+                    (Path(output_dir) / f"{name}{suffix}").unlink(missing_ok=True)
     
+def merged_data_transformation(source=PROCESSED_DATA_DIR, output_filename: str = "recipes.json", max_workers: int | None = None, output_dir: Path = MERGED_DATA_DIR):
+    # parse every recipe file under source (a directory or glob, e.g. base game plus mod packs)
+    # in parallel and write them out as one merged recipe json in output_dir
+    from data_manipulation.ingestion import find_recipe_files, ingest_recipe_files
+
+    logger = Logger(LOGGING_DIR, "ingestion.log", LOG_LEVELS)
+    logger(LogLevel.INFO, "=" * 100, reset=True)
+
+    paths = find_recipe_files(source)
+    if not paths:
+        logger(LogLevel.ERROR, f"No recipe files found for: {source}")
+        return
+
+    recipes = ingest_recipe_files(paths, logger, max_workers).to_records()
+    try:
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+        with open(Path(output_dir) / output_filename, "w") as output_file:
+            json.dump(recipes, output_file, separators=(",", ":"))
+    except Exception as e:
+        logger(LogLevel.ERROR, f"Failed to save merged recipes to: {output_filename}. Error: {e}")
+        return
+
+    logger(LogLevel.INFO, f"Saved {len(recipes)} merged recipes to: {output_filename}")
+    logger(LogLevel.INFO, "=" * 100)
+
 if __name__ == "__main__":
     data_transformation()
\ No newline at end of file
@@ -0,0 +1,211 @@
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+
+from utils.recipe_table import RecipeTable
+
+
+class RequirementSolver:
+    # raw material requirements of every item in the recipe DAG
+    # Q is the items x items quantity matrix (Q[p, i] = units of i per unit of p) and
+    # R = (I - Q)⁻¹ E is the raw material matrix, E selecting the raw columns (items without a recipe)
+    # instead of inverting, R is propagated level by level in topological order:
+    #   R[raw] = E[raw], R[level] = Q[level] @ R
+    # which touches every nonzero of Q once, all products are solved at once with sparse @ sparse products
+    # recipes have no output counts in the data, so every craft is assumed to make one unit
+    # R is sparse (items x raw materials), a product only needs the raw materials below it, items on or
+    # behind a recipe cycle (levels < 0) have empty rows
+    def __init__(self, table: RecipeTable) -> None:
+        self.names = list(table.names)
+        self.name_ids = dict(table.name_ids)
+        self.Q = table.to_sparse().astype(np.float64)
+        self.raw_ids = np.flatnonzero(np.diff(self.Q.indptr) == 0)
+        self.raw_columns = {item_id: column for column, item_id in enumerate(self.raw_ids.tolist())}
+        self._cycles = None
+        self._solve()
+
+    def _solve(self) -> None:
+        n = self.Q.shape[0]
+        self.Qt = self.Q.T.tocsr()
+        self.levels = np.full(n, -1, dtype=np.int64)
+
+        # Kahn's algorithm, one vectorized step per level of the DAG
+        remaining = np.diff(self.Q.indptr)
+        frontier = np.flatnonzero(remaining == 0)
+        level = 0
+        while frontier.size:
+            self.levels[frontier] = level
+            users = self.Qt[frontier].indices
+            remaining = remaining - np.bincount(users, minlength=n)
+            users = np.unique(users)
+            frontier = users[remaining[users] == 0]
+            level += 1
+
+        # whatever never reached in-degree zero sits on or behind a cycle (e.g. byproduct loops)
+        self.unsolvable = np.flatnonzero(self.levels < 0)
+
+        order = np.argsort(self.levels, kind="stable")
+        bounds = np.searchsorted(self.levels[order], np.arange(1, level + 1))
+        groups = [order[start:end] for start, end in zip(bounds[:-1].tolist(), bounds[1:].tolist())]
+        self.R = _propagate(self.Q, self._raw_rows(np.arange(n)), groups)
+
+    def _raw_rows(self, item_ids: np.ndarray) -> sp.csr_matrix:
+        # rows of E for item_ids, a 1 in the raw column of every item among them that has no recipe
+        # (a raw material that got a recipe keeps its column, but its row comes from the recipe)
+        shape = (len(item_ids), len(self.raw_ids))
+        if not len(self.raw_ids):
+            return sp.csr_matrix(shape)
+        # raw_ids is sorted, new raw materials get the next item id
+        columns = np.minimum(np.searchsorted(self.raw_ids, item_ids), len(self.raw_ids) - 1)
+        rows = np.flatnonzero((self.raw_ids[columns] == item_ids) & (np.diff(self.Q.indptr)[item_ids] == 0))
+        return sp.csr_matrix((np.ones(len(rows)), (rows, columns[rows])), shape=shape)
+
+    @property
+    def cycles(self) -> list[list[str]]:
+        # recomputed on first use after every update, an edited recipe can break a cycle
+        if self._cycles is None:
+            self._cycles = self._find_cycles()
+        return self._cycles
+
+    def _find_cycles(self) -> list[list[str]]:
+        # strongly connected components with more than one item, plus items that use themselves
+        if self.unsolvable.size == 0:
+            return []
+        _, labels = connected_components(self.Q, directed=True, connection="strong")
+        sizes = np.bincount(labels)
+        self_loops = np.flatnonzero(self.Q.diagonal() != 0)
+        cycles = [np.flatnonzero(labels == label) for label in np.flatnonzero(sizes > 1)]
+        cycles += [np.array([item_id]) for item_id in self_loops.tolist() if sizes[labels[item_id]] == 1]
+        return [[self.names[i] for i in cycle.tolist()] for cycle in cycles]
+
+    def requirements(self, product: str, rate: float = 1.0) -> dict[str, float]:
+        # raw material amounts needed to make `rate` units of product, e.g. rate=60 for 60/min gives per-minute amounts
+        product_id = self.name_ids[product]
+        if self.levels[product_id] < 0:
+            raise ValueError(f"Cannot compute requirements for {product}: it depends on a recipe cycle")
+        start, end = self.R.indptr[product_id], self.R.indptr[product_id + 1]
+        columns, amounts = self.R.indices[start:end], self.R.data[start:end]
+        return {self.names[self.raw_ids[column]]: float(rate * amount) for column, amount in zip(columns.tolist(), amounts.tolist()) if amount}
+
+    def requirement_matrix(self, rate: float = 1.0) -> tuple[sp.csr_matrix, list[str]]:
+        # (sparse items x raw materials matrix, raw material names) for every product at once
+        return rate * self.R, [self.names[i] for i in self.raw_ids.tolist()]
+
+    def update_recipe(self, product: str, ingredients: dict[str, int]) -> None:
+        # replace (or add) the recipe of one product and recompute only the rows that depend on it:
+        # the product itself and everything upstream of it, in topological order
+        # unknown ingredients are added as new raw materials, a recipe that would close a cycle is rejected
+        if not ingredients:
+            raise ValueError(f"Recipe for {product} needs at least one ingredient")
+        for name in [product, *ingredients]:
+            if name not in self.name_ids:
+                self._add_raw_item(name)
+
+        product_id = self.name_ids[product]
+        ingredient_ids = np.array([self.name_ids[name] for name in ingredients], dtype=np.int64)
+        if product_id in self._downstream(ingredient_ids):
+            raise ValueError(f"Recipe for {product} would create a cycle")
+
+        # swap the product's row in Q
+        Q = self.Q
+        start, end = Q.indptr[product_id], Q.indptr[product_id + 1]
+        order = np.argsort(ingredient_ids)
+        new_indices = ingredient_ids[order].astype(Q.indices.dtype)
+        new_data = np.array(list(ingredients.values()), dtype=np.float64)[order]
+        indptr = Q.indptr.copy()
+        indptr[product_id + 1:] += len(new_indices) - (end - start)
+        self.Q = sp.csr_matrix(
+            (np.concatenate((Q.data[:start], new_data, Q.data[end:])), np.concatenate((Q.indices[:start], new_indices, Q.indices[end:])), indptr),
+            shape=Q.shape,
+        )
+        self.Qt = self.Q.T.tocsr()
+
+        # a raw material that gets a recipe keeps its (now empty) raw column
+        affected = self._upstream(np.array([product_id]))
+        self._resolve(affected)
+
+    def _add_raw_item(self, name: str) -> None:
+        item_id = len(self.names)
+        self.names.append(name)
+        self.name_ids[name] = item_id
+        self.Q.resize((item_id + 1, item_id + 1))
+
+        self.raw_columns[item_id] = len(self.raw_ids)
+        self.raw_ids = np.append(self.raw_ids, item_id)
+        self.R.resize((item_id + 1, len(self.raw_ids)))
+        self.R = self.R + sp.csr_matrix(([1.0], ([item_id], [len(self.raw_ids) - 1])), shape=self.R.shape)
+        self.levels = np.append(self.levels, 0)
+
+    def _closure(self, adjacency: sp.csr_matrix, start_ids: np.ndarray) -> np.ndarray:
+        seen = np.zeros(adjacency.shape[0], dtype=bool)
+        frontier = np.unique(start_ids)
+        seen[frontier] = True
+        while frontier.size:
+            neighbours = np.unique(adjacency[frontier].indices)
+            frontier = neighbours[~seen[neighbours]]
+            seen[frontier] = True
+        return np.flatnonzero(seen)
+
+    def _downstream(self, item_ids: np.ndarray) -> np.ndarray:
+        # the items and everything they are (transitively) made from
+        return self._closure(self.Q, item_ids)
+
+    def _upstream(self, item_ids: np.ndarray) -> np.ndarray:
+        # the items and everything that (transitively) uses them
+        return self._closure(self.Qt, item_ids)
+
+    def _resolve(self, affected: np.ndarray) -> None:
+        # recompute levels and R rows of the affected items only, everything else is unchanged
+        sub = self.Q[affected][:, affected]
+        sub_t = sub.T.tocsr()
+        remaining = np.diff(sub.indptr)
+        frontier = np.flatnonzero(remaining == 0)
+        solved = np.zeros(len(affected), dtype=bool)
+        groups = []
+        while frontier.size:
+            solved[frontier] = True
+            for item_id in affected[frontier].tolist():
+                ingredient_levels = self.levels[self.Q.indices[self.Q.indptr[item_id]:self.Q.indptr[item_id + 1]]]
+                if ingredient_levels.size == 0:
+                    self.levels[item_id] = 0
+                elif (ingredient_levels < 0).any():
+                    self.levels[item_id] = -1
+                else:
+                    self.levels[item_id] = ingredient_levels.max() + 1
+            groups.append(frontier[self.levels[affected[frontier]] > 0])
+
+            users = sub_t[frontier].indices
+            remaining = remaining - np.bincount(users, minlength=len(affected))
+            users = np.unique(users)
+            frontier = users[remaining[users] == 0]
+
+        # anything left over or built on an unsolvable item stays unsolvable
+        self.levels[affected[~solved]] = -1
+        self.unsolvable = np.flatnonzero(self.levels < 0)
+        self._cycles = None
+
+        # the affected rows start from what their ingredients outside the affected set need, then go through sub
+        outside = np.ones(self.Q.shape[0], dtype=bool)
+        outside[affected] = False
+        base = self.Q[affected][:, outside] @ self.R[outside] + self._raw_rows(affected)
+        rows = _propagate(sub, base, groups)
+        rows = sp.diags((self.levels[affected] >= 0).astype(np.float64)) @ rows
+        self.R = sp.diags(outside.astype(np.float64)) @ self.R + _scatter_rows(rows, affected, self.Q.shape[0])
+        self.R.eliminate_zeros()
+
+def _scatter_rows(rows: sp.csr_matrix, item_ids: np.ndarray, n: int) -> sp.csr_matrix:
+    # n x columns matrix with rows[k] at row item_ids[k], zero elsewhere
+    order = np.argsort(item_ids)
+    rows = rows[order]
+    counts = np.zeros(n + 1, dtype=np.int64)
+    counts[item_ids[order] + 1] = np.diff(rows.indptr)
+    return sp.csr_matrix((rows.data, rows.indices, np.cumsum(counts)), shape=(n, rows.shape[1]))
+
+def _propagate(Q: sp.csr_matrix, base: sp.csr_matrix, groups: list[np.ndarray]) -> sp.csr_matrix:
+    # R = base, then R[group] += Q[group] @ R for each group in topological order
+    # every ingredient of a group is in an earlier group or never changes, its rows of base are final
+    R = base.tocsr()
+    for group in groups:
+        if group.size:
+            R = R + _scatter_rows((Q[group] @ R).tocsr(), group, R.shape[0])
+    return R
@@ -0,0 +1,128 @@
+import random
+
+import networkx as nx
+import numpy as np
+
+from config import CLUSTERING_BACKENDS
+from recipe_network.modularity import GraphModularization
+
+# community detection engines behind GraphBuilder.partition_into_clusters, all fed the same integer edge arrays
+# (RecipeTable.unique_edges) so switching engines never copies the graph into another graph library first
+# - networkx: greedy CNM on the directed graph, pure python, what partition_into_clusters always used
+# - igraph: Louvain (community_multilevel), C, undirected
+# - leiden: Leiden (community_leiden with the modularity objective), C, undirected, refines Louvain's communities
+# - cnm: the in-repo CNM (recipe_network.modularity), python with heaps, undirected
+# the undirected engines treat product -> ingredient edges as undirected, see modularity() for comparing them
+# the engine names are CLUSTERING_BACKENDS in config.py
+# igraph's default, iterating until nothing moves (-1) costs about 10x the time for well under 1% more Q
+LEIDEN_ITERATIONS = 2
+
+def cluster(n_nodes: int, sources: np.ndarray, targets: np.ndarray, weights: np.ndarray | None = None,
+            backend: str = "igraph", resolution: float = 1.0, seed: int | None = 0) -> np.ndarray:
+    # community label of every node 0..n_nodes-1, labels numbered by community size, largest first
+    if backend not in CLUSTERING_BACKENDS:
+        raise ValueError(f"Unknown clustering backend {backend}, expected one of {', '.join(CLUSTERING_BACKENDS)}")
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    weights = np.ones(len(sources)) if weights is None else np.asarray(weights, dtype=np.float64)
+    if len(sources) == 0:
+        return np.arange(n_nodes)
+
+    if backend == "networkx":
+        graph = nx.DiGraph()
+        graph.add_nodes_from(range(n_nodes))
+        graph.add_weighted_edges_from(zip(sources.tolist(), targets.tolist(), weights.tolist()))
+        return communities_to_labels(nx.community.greedy_modularity_communities(graph, weight="weight", resolution=resolution), n_nodes)
+
+    if backend == "cnm":
+        engine = GraphModularization.from_edges(n_nodes, sources, targets, weights, resolution=resolution)
+        return communities_to_labels(engine.modularity_maximization(full_dendrogram=False), n_nodes)
+
+    import igraph
+
+    graph = igraph.Graph(n=n_nodes, edges=np.column_stack((sources, targets)), directed=False)
+    return relabel_by_size(igraph_membership(graph, backend, weights.tolist(), resolution, seed=seed))
+
+def igraph_membership(graph, backend: str, weights: list[float], resolution: float, node_weights: list[float] | None = None,
+                      initial_membership: list[int] | None = None, seed: int | None = 0) -> np.ndarray:
+    # raw community labels of an undirected igraph graph with the igraph (Louvain) or leiden engine
+    # graphs with self-loops (collapsed communities) need node_weights, the weighted degrees counting loops twice:
+    # the ones igraph's Leiden derives itself leave the loops out and it then merges far too eagerly
+    # igraph draws from python's random module, seeded for the call and put back after it so the
+    # interpreter-wide random state is the same as if clustering never ran
+    state = random.getstate()
+    if seed is not None:
+        random.seed(seed)
+    try:
+        if backend == "igraph":
+            membership = graph.community_multilevel(weights=weights, resolution=resolution).membership
+        else:
+            membership = graph.community_leiden(objective_function="modularity", weights=weights, resolution=resolution, n_iterations=LEIDEN_ITERATIONS,
+                                                  node_weights=node_weights, initial_membership=initial_membership).membership
+    finally:
+        random.setstate(state)
+    return np.asarray(membership, dtype=np.int64)
+
+def relabel_by_size(labels: np.ndarray) -> np.ndarray:
+    # 0 for the largest community, 1 for the next, ... ties broken by the first member
+    _, first, inverse, sizes = np.unique(labels, return_index=True, return_inverse=True, return_counts=True)
+    order = np.lexsort((first, -sizes))
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    return rank[inverse]
+
+def communities_to_labels(communities: list, n_nodes: int) -> np.ndarray:
+    labels = np.empty(n_nodes, dtype=np.int64)
+    for label, community in enumerate(communities):
+        labels[list(community)] = label
+    return labels
+
+def labels_to_communities(labels: np.ndarray, names: list[str]) -> list[frozenset]:
+    # the shape nx.community.greedy_modularity_communities returns, frozensets of names, largest first
+    order = np.argsort(labels, kind="stable")
+    bounds = np.flatnonzero(np.diff(labels[order])) + 1
+    communities = [frozenset(names[i] for i in members.tolist()) for members in np.split(order, bounds)] if len(order) else []
+    return sorted(communities, key=len, reverse=True)
+
+def modularity(labels: np.ndarray, sources: np.ndarray, targets: np.ndarray, weights: np.ndarray | None = None,
+               resolution: float = 1.0, directed: bool = True) -> float:
+    # modularity of a labelling, vectorized, the same value nx.community.modularity gives on the graph of these edges
+    #   directed:   Q = ∑c [ Lc/m - resolution * outc * inc / m² ]
+    #   undirected: Q = ∑c [ Lc/m - resolution * (degc / 2m)² ]
+    # so every engine can be scored against the one objective partition_into_clusters optimizes
+    labels = np.asarray(labels, dtype=np.int64)
+    weights = np.ones(len(sources)) if weights is None else np.asarray(weights, dtype=np.float64)
+    m = weights.sum()
+    if m == 0:
+        return 0.0
+    n_labels = int(labels.max()) + 1
+    source_labels = labels[sources]
+    target_labels = labels[targets]
+    internal = np.bincount(source_labels[source_labels == target_labels], weights=weights[source_labels == target_labels], minlength=n_labels)
+    out_totals = np.bincount(source_labels, weights=weights, minlength=n_labels)
+    in_totals = np.bincount(target_labels, weights=weights, minlength=n_labels)
+    if directed:
+        return float((internal / m - resolution * out_totals * in_totals / m ** 2).sum())
+    return float((internal / m - resolution * ((out_totals + in_totals) / (2 * m)) ** 2).sum())
+
+def normalized_mutual_information(labels: np.ndarray, other_labels: np.ndarray) -> float:
+    # NMI of two labellings of the same nodes, 2 I(a, b) / (H(a) + H(b)), 1.0 for identical partitions up to renaming
+    # and for two partitions that are both a single community, computed from the sparse contingency counts
+    labels = np.asarray(labels, dtype=np.int64)
+    other_labels = np.asarray(other_labels, dtype=np.int64)
+    n = len(labels)
+    if n == 0:
+        return 1.0
+    _, counts = np.unique(labels * (int(other_labels.max()) + 1) + other_labels, return_counts=True)
+    _, sizes = np.unique(labels, return_counts=True)
+    _, other_sizes = np.unique(other_labels, return_counts=True)
+
+    def entropy(sizes: np.ndarray) -> float:
+        p = sizes / n
+        return float(-(p * np.log(p)).sum())
+
+    entropies = entropy(sizes) + entropy(other_sizes)
+    if entropies == 0:
+        return 1.0
+    # I(a, b) = H(a) + H(b) - H(a, b)
+    return max(0.0, 2 * (entropies - entropy(counts)) / entropies)
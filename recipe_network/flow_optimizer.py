@@ -0,0 +1,169 @@
+import numpy as np
+import scipy.sparse as sp
+
+from utils.recipe_table import RecipeTable
+
+# objective weights, per building, per raw item/min mined and per item/min crossing a district boundary
+# buildings dominate by default, the belt traffic breaks ties between alternate recipes and costs less than
+# a building per ~100 items/min, set TRAFFIC_COST higher to trade buildings for less traffic between districts
+BUILDING_COST = 1.0
+RAW_COST = 0.0
+TRAFFIC_COST = 0.01
+# crafts per minute of one building, the data has no crafting times so every recipe runs at the same speed
+CRAFT_RATE = 1.0
+# rates below this are solver noise and reported as zero
+RATE_TOLERANCE = 1e-9
+
+class FlowSolution:
+    # the optimal production plan for a set of target rates
+    # - recipe_rates[k] is the crafts/min of recipes[k] (a recipe index of the table), buildings[k] how many
+    #   buildings that takes, fractional, round up per recipe for whole buildings
+    # - raw_rates[k] is the supply/min of the raw material raw_ids[k]
+    # - traffic is the districts x districts matrix of items/min moving from the district making an item
+    #   (traffic[d, e]: made in d, used in e) to the district using it, the diagonal is left out
+    def __init__(self, optimizer: "FlowOptimizer", recipe_rates: np.ndarray, raw_rates: np.ndarray, traffic: sp.csr_matrix, objective: float) -> None:
+        self.names = optimizer.names
+        self.recipes = optimizer.recipes
+        self.products = optimizer.products
+        self.raw_ids = optimizer.raw_ids
+        self.groups = optimizer.groups
+        self.recipe_rates = recipe_rates
+        self.buildings = recipe_rates / optimizer.craft_rates
+        self.raw_rates = raw_rates
+        self.traffic = traffic
+        self.objective = objective
+
+    @property
+    def total_buildings(self) -> float:
+        return float(self.buildings.sum())
+
+    @property
+    def total_traffic(self) -> float:
+        return float(self.traffic.sum())
+
+    def building_counts(self) -> dict[str, float]:
+        # product name -> buildings of every recipe in use, alternate recipes of one product add up
+        used = np.flatnonzero(self.buildings > 0)
+        counts = np.bincount(self.products[used], weights=self.buildings[used], minlength=len(self.names))
+        return {self.names[i]: float(counts[i]) for i in np.flatnonzero(counts).tolist()}
+
+    def raw_supply(self) -> dict[str, float]:
+        return {self.names[self.raw_ids[k]]: float(self.raw_rates[k]) for k in np.flatnonzero(self.raw_rates).tolist()}
+
+    def district_buildings(self) -> np.ndarray:
+        # buildings per district
+        return np.bincount(self.groups[self.products], weights=self.buildings, minlength=self.traffic.shape[0])
+
+    def district_traffic(self) -> list[tuple[int, int, float]]:
+        # (from district, to district, items/min) of every belt between two districts, busiest first
+        traffic = self.traffic.tocoo()
+        order = np.argsort(-traffic.data, kind="stable")
+        return list(zip(traffic.row[order].tolist(), traffic.col[order].tolist(), traffic.data[order].tolist()))
+
+class FlowOptimizer:
+    # production rates of every recipe for target output rates, as one sparse LP solved by HiGHS
+    #   variables:  x ≥ 0 crafts/min of every recipe, s ≥ 0 supply/min of every raw material
+    #   items:      (P - Qᵀ) x + E s ≥ target, P[i, r] = 1 where recipe r makes item i,
+    #               Q[r, i] = units of i per craft of r, E selecting the raw materials
+    #   minimize:   BUILDING_COST * x / craft_rate + RAW_COST * s + TRAFFIC_COST * cross-district items/min
+    # the optional per district building limit adds one row per district, Σ x / craft_rate ≤ limit
+    # every item is made in (and raw materials are mined in) the district of its node, so an ingredient used by a
+    # recipe of another district crosses a boundary, which makes the traffic a fixed linear function of x:
+    # Σ Q[r, i] x[r] over the recipe ingredients whose district differs from the recipe's product's
+    # like RequirementSolver every craft makes one unit, the matrices are built straight from the table's arrays
+    def __init__(self, table: RecipeTable, groups: np.ndarray | None = None, alternate_recipes: bool = False,
+                 craft_rates: np.ndarray | float = CRAFT_RATE) -> None:
+        # groups is the district of every item (the community labels of partition_into_clusters), None puts
+        # everything in one district, alternate_recipes lets the LP choose between all recipes of a product
+        # instead of using the last one like nx_graph does
+        self.names = list(table.names)
+        self.name_ids = dict(table.name_ids)
+        n_items = table.n_items
+        if groups is None:
+            groups = np.zeros(n_items, dtype=np.int64)
+        self.groups = np.asarray(groups, dtype=np.int64)
+        if len(self.groups) != n_items or (n_items and self.groups.min() < 0):
+            raise ValueError(f"Expected a district of every one of the {n_items} items")
+        self.n_districts = int(self.groups.max()) + 1 if n_items else 0
+
+        if alternate_recipes:
+            self.recipes = np.arange(table.n_recipes, dtype=np.int64)
+        else:
+            chosen = table.product_recipes()
+            self.recipes = np.sort(chosen[chosen >= 0]).astype(np.int64)
+        self.products = table.recipe_products[self.recipes].astype(np.int64)
+        self.craft_rates = np.broadcast_to(np.asarray(craft_rates, dtype=np.float64), (table.n_recipes,))[self.recipes]
+        if (self.craft_rates <= 0).any():
+            raise ValueError("Craft rates must be positive")
+        self.raw_ids = np.flatnonzero(np.bincount(self.products, minlength=n_items) == 0)
+
+        # the ingredient entries of the chosen recipes, gathered from the CSR rows in one go
+        starts = table.indptr[self.recipes].astype(np.int64)
+        lengths = table.indptr[self.recipes + 1].astype(np.int64) - starts
+        columns = np.repeat(np.arange(len(self.recipes)), lengths)
+        entries = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(int(lengths.sum()))
+        ingredients = table.ingredients[entries].astype(np.int64)
+        quantities = table.quantities[entries].astype(np.float64)
+        self.ingredient_columns = columns
+        self.ingredient_ids = ingredients
+        self.ingredient_quantities = quantities
+
+        n_recipes, n_raw = len(self.recipes), len(self.raw_ids)
+        # items x (recipes + raw materials), duplicate entries (an ingredient listed twice) are summed
+        self.A = sp.csr_matrix(
+            (
+                np.concatenate((np.ones(n_recipes), -quantities, np.ones(n_raw))),
+                (np.concatenate((self.products, ingredients, self.raw_ids)), np.concatenate((np.arange(n_recipes), columns, n_recipes + np.arange(n_raw)))),
+            ),
+            shape=(n_items, n_recipes + n_raw),
+        )
+        # items/min crossing a district boundary per craft of every recipe
+        self.crossing = self.groups[ingredients] != self.groups[self.products[columns]]
+        self.traffic_per_craft = np.bincount(columns[self.crossing], weights=quantities[self.crossing], minlength=n_recipes)
+
+    @property
+    def n_variables(self) -> int:
+        return self.A.shape[1]
+
+    def solve(self, targets: dict[str, float], traffic_cost: float = TRAFFIC_COST, building_cost: float = BUILDING_COST,
+              raw_cost: float = RAW_COST, max_buildings_per_district: float | None = None) -> FlowSolution:
+        # cheapest plan making at least targets (product name -> units/min), raises ValueError when there is none
+        unknown = [name for name in targets if name not in self.name_ids]
+        if unknown:
+            raise ValueError(f"Unknown products: {', '.join(unknown)}")
+        if any(rate < 0 for rate in targets.values()):
+            raise ValueError("Target rates must not be negative")
+        demand = np.zeros(len(self.names))
+        demand[[self.name_ids[name] for name in targets]] = list(targets.values())
+
+        n_recipes = len(self.recipes)
+        cost = np.concatenate((building_cost / self.craft_rates + traffic_cost * self.traffic_per_craft, np.full(len(self.raw_ids), raw_cost)))
+        # linprog wants A_ub x ≤ b_ub
+        A_ub, b_ub = -self.A, -demand
+        if max_buildings_per_district is not None:
+            limits = sp.csr_matrix(
+                (1 / self.craft_rates, (self.groups[self.products], np.arange(n_recipes))),
+                shape=(self.n_districts, self.n_variables),
+            )
+            A_ub = sp.vstack((A_ub, limits), format="csr")
+            b_ub = np.concatenate((b_ub, np.full(self.n_districts, float(max_buildings_per_district))))
+
+        # scipy.optimize takes a noticeable part of a second to import, only solving needs it
+        from scipy.optimize import linprog
+
+        result = linprog(cost, A_ub=A_ub, b_ub=b_ub, bounds=(0, None), method="highs")
+        if result.status != 0:
+            raise ValueError(f"No production plan for these targets: {result.message}")
+
+        rates = np.where(result.x > RATE_TOLERANCE, result.x, 0.0)
+        recipe_rates = rates[:n_recipes]
+        crossing_columns = self.ingredient_columns[self.crossing]
+        traffic = sp.csr_matrix(
+            (
+                self.ingredient_quantities[self.crossing] * recipe_rates[crossing_columns],
+                (self.groups[self.ingredient_ids[self.crossing]], self.groups[self.products[crossing_columns]]),
+            ),
+            shape=(self.n_districts, self.n_districts),
+        )
+        traffic.eliminate_zeros()
+        return FlowSolution(self, recipe_rates, rates[n_recipes:], traffic, float(result.fun))
@@ -1,24 +1,70 @@
-import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-from pyvis.network import Network
+import numpy as np
 import networkx as nx
 
+from config import CLUSTER_RESOLUTION, SUMMARY_TOP_K
+from recipe_network.bill_of_materials import RequirementSolver
+from recipe_network.clustering import cluster, labels_to_communities
+from recipe_network.flow_optimizer import TRAFFIC_COST, FlowOptimizer, FlowSolution
+from recipe_network.graph_cache import GraphCache
+from recipe_network.html_export import export_graph_html
+from recipe_network.incremental import LocalMoveRefiner, changed_products, product_recipes
+from recipe_network.ingredient_index import IngredientIndex
+from recipe_network.recipe_store import RecipeStore
+from recipe_network.resolution_sweep import SWEEP_RESOLUTIONS, PartitionHierarchy, sweep_resolutions
+from recipe_network.summary_report import check_summary_format, summary_report, write_summary_report
+from utils import instrumentation
 from utils.logging import Logger, LogLevel
+from utils.recipe_table import RecipeTable
+from utils.recipes import load_recipes
+
+# pyvis (which imports IPython) and the csv ingestion (pandas) take most of the import time,
+# they are imported where they are used so that commands that never render or parse csv start fast
+if TYPE_CHECKING:
+    from pyvis.network import Network
+
+MAX_LAYER_PAIRS = 50_000
+
+def _render_common_ingredient_layer(output_path: str, products: list[str], first_ids: np.ndarray, second_ids: np.ndarray, common_count: int) -> str:
+    # process pool worker, renders one common ingredient layer to html and returns its path
+    # the pairs arrive as two id arrays plus the product names, which pickle far smaller than a graph
+    from pyvis.network import Network
+
+    graph = nx.Graph()
+    graph.add_edges_from((products[first], products[second], {"weight": common_count}) for first, second in zip(first_ids.tolist(), second_ids.tolist()))
+    pyviz_graph = Network(directed=False, height="1000px", width="100%")
+    pyviz_graph.from_nx(graph)
+    with open(output_path, "w", encoding="utf-8") as html_file:
+        html_file.write(pyviz_graph.generate_html())
+    return output_path
 
 class GraphBuilder:
-    def __init__(self, data_dir: Path, output_path: Path, graph_name: str, logger: Logger) -> None:
+    def __init__(self, data_dir: Path, output_path: Path, graph_name: str, logger: Logger, cache_dir: Path | None = None) -> None:
         self._logger = logger
         self.data_dir = data_dir
         self.graph_name = graph_name
         self.output_path = output_path
         self.nx_graph = nx.DiGraph()
-        self.pyvis_graph = Network(directed=True)
+        self.pyvis_graph = None
+        self._cache = GraphCache(cache_dir, logger) if cache_dir is not None else None
+        self.recipe_table = None
+        # cache key of the recipe files the graph was imported from, saved with the snapshot
+        self.source_key = None
+        self.communities = []
+        self._refiner = None
+        # the store save_recipe_store opened last, closed before the file is written again
+        self._recipe_store = None
 
     def _add_edge(self, from_node: str, to_node: str, **attributes) -> None:
         self.nx_graph.add_edge(from_node, to_node, **attributes)
 
-    def _save_graph(self, graph: Network, output_path: Path) -> None:
+    @instrumentation.stage("html write")
+    def _save_graph(self, graph: "Network", output_path: Path) -> None:
         from pathlib import Path
         #output_path = Path(output_dir) / f"{self.graph_name}.html"
 
@@ -47,152 +93,549 @@ class GraphBuilder:
         
     def _build_graph_data(self) -> None:
         network_data = []
-        self.products = set()
-        self.ingredients = dict()
-        self.dependencies = dict()
         for data in self.file_data:
-            self._logger(LogLevel.TRACE, f"Processing data chunk with {len(data)} entries")
+            self._logger(LogLevel.TRACE, "Processing data chunk with %s entries", len(data))
             network_data.extend(data)
             
-        self._logger(LogLevel.INFO, f"Converting json data into networkx network")
+        self._logger(LogLevel.INFO, "Converting json data into recipe table")
+        self._build_graph_from_table(RecipeTable.from_records(network_data))
 
-        # build the networkx graph from the parsed json data
+    @instrumentation.stage("graph build")
+    def _build_graph_from_table(self, table: RecipeTable) -> None:
+        # build the networkx graph from the recipe table
         # each product is a source node,
         # each ingredient is a destination node
         # ingredient quantities are edge weights
         # final graph is directed from product =[weights]=> ingredients
-        for data in network_data:
-            name = data.get("product")
-            
-            # add the source node to graph
-            self.nx_graph.add_node(name, label=name)
-            self.products.add(name)
-            self._logger(LogLevel.TRACE, f"Added node: {name} to graph")
-
-            # get all destination nodes and add edges
-            dependencies = data.get("ingredients")
-            self._logger(LogLevel.TRACE, f"Processing dependencies for product: {name}")
-            for ingredient, quantity in dependencies.items():
-                self._logger(LogLevel.TRACE, f"Processing ingredient: {ingredient} with quantity: {quantity}")
-                
-                # add destination node if it doesn't exist
-                self.nx_graph.add_node(ingredient)
-                self.ingredients[ingredient] = self.ingredients.get(ingredient, 0) + 1
-                self._logger(LogLevel.TRACE, f"Added node: {ingredient} to graph")
-
-                # add weighted edge from product to ingredient
-                self.nx_graph.add_edge(name, ingredient, quantity=quantity)
-                self._logger(LogLevel.TRACE, f"Adding edge from {name} to {ingredient} with quantity {quantity}")
-            
-            self.dependencies[name] = list(dependencies.keys())
-        
-        self._logger(LogLevel.INFO, f"Finished building networkx graph")
+        self._logger(LogLevel.INFO, "Converting recipe table into networkx network")
+        self.recipe_table = table
+        self.nx_graph = table.to_networkx()
+
+        names = table.names
+        self.products = {names[i] for i in table.product_ids().tolist()}
+
+        # ingredient usage counts, keyed in first-use order
+        counts = table.ingredient_counts()
+        used, first_use = np.unique(table.ingredients, return_index=True)
+        self.ingredients = {names[i]: int(counts[i]) for i in used[np.argsort(first_use)].tolist()}
+
+        self.dependencies = table.dependencies()
+
+        # inverted ingredient -> products index used for the common ingredient searches
+        self.ingredient_index = IngredientIndex.from_table(table)
+        self._common_ingredients_map = None
+        self._requirement_solver = None
+        self._refiner = None
+
+        instrumentation.count("recipes", table.n_recipes)
+        instrumentation.count("graph edges", self.nx_graph.number_of_edges())
+        self._logger(LogLevel.INFO, f"Finished building networkx graph with {self.nx_graph.number_of_nodes()} nodes and {self.nx_graph.number_of_edges()} edges")
         self._logger(LogLevel.INFO, "=" * 100)
     
+    def community_labels(self) -> np.ndarray | None:
+        # community of every item of the recipe table, None without communities or when they miss items
+        if not self.communities:
+            return None
+        table = self.recipe_table
+        groups = np.full(table.n_items, -1, dtype=np.int64)
+        for i, community in enumerate(self.communities):
+            groups[[table.name_ids[node] for node in community if node in table.name_ids]] = i
+        if (groups < 0).any():
+            return None
+        return groups
+
+    @instrumentation.stage("flow optimization")
+    def optimize_flow(self, targets: dict[str, float], traffic_cost: float = TRAFFIC_COST, max_buildings_per_district: float | None = None,
+                      alternate_recipes: bool = False) -> FlowSolution:
+        # building counts for target rates (product -> units/min) with the communities as factory districts,
+        # see recipe_network.flow_optimizer, run partition_into_clusters first to get the traffic between districts
+        # e.g. graph_builder.optimize_flow({"Processor": 60, "Computer": 10})
+        groups = self.community_labels()
+        if groups is None:
+            self._logger(LogLevel.WARNING, "No communities to use as districts, run partition_into_clusters first, optimizing as one district")
+        start = time.perf_counter()
+        optimizer = FlowOptimizer(self.recipe_table, groups, alternate_recipes=alternate_recipes)
+        solution = optimizer.solve(targets, traffic_cost=traffic_cost, max_buildings_per_district=max_buildings_per_district)
+        self._logger(LogLevel.INFO, f"Optimized {len(targets)} target rates over {optimizer.n_variables} variables in {time.perf_counter() - start:.3f}s: "
+                                    f"{solution.total_buildings:.1f} buildings, {solution.total_traffic:.1f} items/min between districts")
+        for source, target, rate in solution.district_traffic():
+            self._logger(LogLevel.DEBUG, f"District {source} -> district {target}: {rate:.2f} items/min")
+        return solution
+
+    @instrumentation.stage("common-ingredient pairing")
     def find_products_with_common_ingredients(self):
         # create a dictionary that maps number of common ingredients to list of products and the ingredients
-        # idea is to look through products and dependencies and find which products have 1, 2, 3,... common ingredients
-        
-        dependencies = self.dependencies
+        # pairs come from the sparse overlap matrix of the ingredient index, so only unordered pairs of
+        # products that actually share an ingredient are visited, each once, in product order
+        # the result is cached on the builder until the graph data is rebuilt
+        if self._common_ingredients_map is not None:
+            return self._common_ingredients_map
+
+        index = self.ingredient_index
+        products = index.products
         common_ingredients_map = dict()
-        for product, ingredients in dependencies.items():
-            for next_product, next_ingredients in dependencies.items():
-                if product == next_product:
-                    continue
-                
-                # grab common ingredients between the sets based on the intersection
-                common_ingredients = set(ingredients).intersection(set(next_ingredients))
-                common_count = len(common_ingredients)
-                
-                if common_count == 0:
-                    continue
-                
-                # add the products and their common ingredients to the map
-                common_ingredients_map[common_count] = common_ingredients_map.get(common_count, [])
-                
-                # check for existing links, such as A-B and B-A
-                reverse_exists = False
-                for entry in common_ingredients_map[common_count]:
-                    if (entry[0] == next_product and entry[1] == product):
-                        reverse_exists = True
-                        break
-                
-                if reverse_exists:
-                    continue
-                common_ingredients_map[common_count].append((product, next_product, common_ingredients))     
+        first_ids, second_ids, common_counts = index.common_pairs()
+        for product_id, next_product_id, common_count in zip(first_ids.tolist(), second_ids.tolist(), common_counts.tolist()):
+            common_ingredients = index.common_ingredients(product_id, next_product_id)
+            common_ingredients_map.setdefault(common_count, []).append((products[product_id], products[next_product_id], common_ingredients))
 
+        self._common_ingredients_map = common_ingredients_map
+        instrumentation.count("common ingredient pairs", len(first_ids))
         return common_ingredients_map
 
-    def print_items_summary(self) -> None:
-        self._logger(LogLevel.INFO, f"Total unique products: {len(self.products)}")
-        self._logger(LogLevel.INFO, f"Total unique ingredients: {len(self.ingredients)}")
-
-        # print all products and ingredients with counts
-        # self._logger(LogLevel.DEBUG, "Products:")
-        # for product in sorted(self.products):
-        #     self._logger(LogLevel.DEBUG, f" - {product}")
-        self._logger(LogLevel.DEBUG, "Ingredients:")
-        for ingredient, count in sorted(self.ingredients.items()):
-            self._logger(LogLevel.DEBUG, f" - {ingredient}: used in {count} products")
-            
-        self._logger(LogLevel.INFO, "=" * 100)
-            
-        # print products with increasing number of common dependencies
-        common_ingredient_map = self.find_products_with_common_ingredients()
-        for common_count in sorted(common_ingredient_map.keys()):
-            self._logger(LogLevel.INFO, f"Products with {common_count} common ingredients:")
-            for product1, product2, common_ingredients in common_ingredient_map[common_count]:
-                self._logger(LogLevel.INFO, f" - {product1} and {product2}: common ingredients: {', '.join(common_ingredients)}")
-            self._logger(LogLevel.INFO, "=" * 100)
+    @instrumentation.stage("requirement solve")
+    def requirement_solver(self) -> RequirementSolver:
+        # raw material requirements of every product, solved once per graph and cached
+        # e.g. graph_builder.requirement_solver().requirements("Processor", rate=60) for 60/min
+        if self._requirement_solver is None:
+            self._requirement_solver = RequirementSolver(self.recipe_table)
+            for cycle in self._requirement_solver.cycles:
+                self._logger(LogLevel.WARNING, f"Recipe cycle, requirements of these products are undefined: {', '.join(cycle)}")
+        return self._requirement_solver
+
+    @instrumentation.stage("summary")
+    def print_items_summary(self, output_format: str = "json", top_k: int = SUMMARY_TOP_K) -> Path:
+        # writes the recipe set summary (see summary_report.py) to <graph name>_summary.<format> in the output
+        # directory and logs its headline numbers, the report size depends on top_k, not on the recipe count
+        check_summary_format(output_format)
+        report = summary_report(self.recipe_table, self.ingredient_index, top_k=top_k)
+        path = write_summary_report(report, Path(self.output_path) / f"{self.graph_name}_summary.{output_format}", output_format)
+
+        totals = report["totals"]
+        self._logger(LogLevel.INFO, f"Total unique products: {totals['products']}")
+        self._logger(LogLevel.INFO, f"Total unique ingredients: {totals['ingredients']}")
+        sharing = "" if totals["overlap_exact"] else "~"
+        self._logger(LogLevel.INFO, f"Product pairs sharing ingredients: {sharing}{totals['sharing_pairs']:.0f}")
+        if report["shared_pairs"]:
+            most_shared = report["shared_pairs"][0]
+            self._logger(LogLevel.INFO, f"Most shared: {most_shared['product']} and {most_shared['other_product']}, {most_shared['common']} common ingredients")
+        self._logger(LogLevel.INFO, f"Summary written to {path}")
+        return path
 
     def import_network_from_json(self, *filenames: str) -> None:
         # read json for recipes generated from data_manipulation module
         # converts json into graph structure using igraph module
-        # this graph can then be saved into a .gml file to skip the json parsing step later
+        # the parsed recipe table is cached as compact arrays keyed on the json contents,
+        # so later runs with unchanged json skip the parsing step entirely
         self._logger(LogLevel.INFO, "=" * 100, reset=True)        
+        start = time.perf_counter()
+
+        cache_key, table = self._cache.lookup([Path(self.data_dir) / filename for filename in filenames]) if self._cache is not None else (None, None)
+        self.source_key = cache_key
+        if table is not None:
+            self._build_graph_from_table(table)
+            self._logger(LogLevel.INFO, f"Graph loaded from cache in {time.perf_counter() - start:.3f}s")
+            return
         
         self.file_data = []
-        for filename in filenames:
-            self._logger(LogLevel.INFO, f"Starting to parse json from file: {filename}")
-            try:
-                with open(f"{self.data_dir}/{filename}", "r") as network_file:
-                    self.file_data.append(json.load(network_file))
+        with instrumentation.span("json load", files=list(filenames)):
+            for filename in filenames:
+                self._logger(LogLevel.INFO, f"Starting to parse json from file: {filename}")
+                try:
+                    self.file_data.append(load_recipes(f"{self.data_dir}/{filename}"))
                     assert self.file_data[-1] is not None
-            except Exception as e:
-                self._logger(LogLevel.ERROR, f"Failed to parse json from file: {filename}. Error: {e}")
-                return
-            self._logger(LogLevel.INFO, f"Finished parsing json from file: {filename}")
+                except Exception as e:
+                    self._logger(LogLevel.ERROR, f"Failed to parse json from file: {filename}. Error: {e}")
+                    return
+                self._logger(LogLevel.INFO, f"Finished parsing json from file: {filename}")
         
         # build the networkx graph data from the imported json
         self._build_graph_data()
-    
-    def partition_into_clusters(self) -> None:
-        # use the Clauset-Newman-Moore greedy modularity maximization method to
-        # partition the graph into modular communities
+        self._logger(LogLevel.INFO, f"Graph built from json in {time.perf_counter() - start:.3f}s")
+
+        if cache_key is not None:
+            self._cache.save(cache_key, self.recipe_table)
+
+    def import_network_from_files(self, source: str | Path, max_workers: int | None = None) -> None:
+        # parallel alternative to import_network_from_json for many recipe files (base game plus mod packs)
+        # source is a directory, glob pattern or single file of .csv/.json/.ndjson recipes, the files are
+        # parsed concurrently in a process pool and merged in sorted path order
+        from data_manipulation.ingestion import find_recipe_files, ingest_recipe_files
+
+        self._logger(LogLevel.INFO, "=" * 100, reset=True)
+        start = time.perf_counter()
+
+        paths = find_recipe_files(source)
+        if not paths:
+            self._logger(LogLevel.ERROR, f"No recipe files found for: {source}")
+            return
+
+        cache_key, table = self._cache.lookup(paths) if self._cache is not None else (None, None)
+        self.source_key = cache_key
+        if table is not None:
+            self._build_graph_from_table(table)
+            self._logger(LogLevel.INFO, f"Graph loaded from cache in {time.perf_counter() - start:.3f}s")
+            return
+
+        try:
+            table = ingest_recipe_files(paths, self._logger, max_workers)
+        except Exception as e:
+            self._logger(LogLevel.ERROR, f"Failed to ingest recipe files from: {source}. Error: {e}")
+            return
+
+        self._build_graph_from_table(table)
+        self._logger(LogLevel.INFO, f"Graph built from {len(paths)} files in {time.perf_counter() - start:.3f}s")
+
+        if cache_key is not None:
+            self._cache.save(cache_key, table)
+
+    def update_network_from_json(self, *filenames: str, render: bool = True) -> list[str]:
+        # incremental alternative to rebuilding after an edit to the recipe json, see _update_network
+        self._logger(LogLevel.INFO, "=" * 100, reset=True)
+        records = []
+        with instrumentation.span("json load", files=list(filenames)):
+            for filename in filenames:
+                try:
+                    records.extend(load_recipes(f"{self.data_dir}/{filename}"))
+                except Exception as e:
+                    self._logger(LogLevel.ERROR, f"Failed to parse json from file: {filename}. Error: {e}")
+                    return []
+        source_key = self._cache.source_key([Path(self.data_dir) / filename for filename in filenames]) if self._cache is not None else None
+        return self._update_network(RecipeTable.from_records(records), render, source_key)
 
-        self.communities = nx.community.greedy_modularity_communities(self.nx_graph, weight='quantity', resolution=2.0)
+    def update_network_from_files(self, source: str | Path, max_workers: int | None = None, render: bool = True) -> list[str]:
+        # incremental alternative to import_network_from_files, see _update_network
+        from data_manipulation.ingestion import find_recipe_files, ingest_recipe_files
+
+        self._logger(LogLevel.INFO, "=" * 100, reset=True)
+        paths = find_recipe_files(source)
+        if not paths:
+            self._logger(LogLevel.ERROR, f"No recipe files found for: {source}")
+            return []
+        try:
+            table = ingest_recipe_files(paths, self._logger, max_workers)
+        except Exception as e:
+            self._logger(LogLevel.ERROR, f"Failed to ingest recipe files from: {source}. Error: {e}")
+            return []
+        return self._update_network(table, render, self._cache.source_key(paths) if self._cache is not None else None)
+
+    @instrumentation.stage("incremental update")
+    def _update_network(self, table: RecipeTable, render: bool, source_key: str | None = None) -> list[str]:
+        # diff the new recipe set against the current graph (or the saved snapshot of the last run) and apply
+        # only the changed products: their edges in nx_graph, ingredient counts, dependencies, the ingredient
+        # index overlap and the requirement solver, then let the touched nodes move between the existing
+        # communities (local moving from the previous partition instead of reclustering)
+        # with render, the main graph and only the common ingredient layers whose pairs changed are re-rendered
+        # returns the names of the changed products, without a graph or snapshot everything is built from scratch
+        # source_key is the cache key of the files table was read from, saved with the updated snapshot
+        start = time.perf_counter()
+        if self.recipe_table is None and not self.load_snapshot():
+            self._logger(LogLevel.INFO, "No graph or snapshot to update, building from scratch")
+            self._build_graph_from_table(table)
+            self.source_key = source_key
+            self.partition_into_clusters()
+            if render:
+                self.build_pyviz_graph()
+                self.partition_into_common_ingredient_clusters()
+            self.save_snapshot()
+            return sorted(self.products)
+
+        changed = changed_products(self.recipe_table, table)
+        if not changed:
+            self._logger(LogLevel.INFO, "No recipe changes")
+            if source_key != self.source_key:
+                # same recipes from different files, the snapshot belongs to the new ones now
+                self.source_key = source_key
+                self.save_snapshot()
+            return []
+        self._logger(LogLevel.INFO, f"{len(changed)} products changed: {', '.join(changed[:20])}{' ...' if len(changed) > 20 else ''}")
+
+        if render:
+            # computed before the edit, so the layers that changed can be told apart from the rest
+            self.ingredient_index.compute_overlap()
+        refiner = self._community_refiner()
+
+        graph = self.nx_graph
+        old_recipes = product_recipes(self.recipe_table, changed)
+        new_recipes = product_recipes(table, changed)
+        removed_edges = []
+        added_edges = []
+        added_nodes = []
+        removed_nodes = []
+        index_recipes = {}
+        for product in changed:
+            # one edge per ingredient with the quantity of the last recipe using it, like RecipeTable.to_networkx
+            new_edges = {}
+            for recipe in new_recipes[product]:
+                new_edges.update(recipe)
+            old_edges = {ingredient: data["quantity"] for ingredient, data in graph[product].items()} if product in graph else {}
+
+            for ingredient, quantity in old_edges.items():
+                if new_edges.get(ingredient) != quantity:
+                    graph.remove_edge(product, ingredient)
+                    removed_edges.append((product, ingredient, quantity))
+            for ingredient, quantity in new_edges.items():
+                if old_edges.get(ingredient) != quantity:
+                    for node in (product, ingredient):
+                        if node not in graph:
+                            graph.add_node(node)
+                            added_nodes.append(node)
+                    graph.add_edge(product, ingredient, quantity=quantity)
+                    added_edges.append((product, ingredient, quantity))
+
+            if product in graph:
+                if new_recipes[product]:
+                    graph.nodes[product]["label"] = product
+                else:
+                    graph.nodes[product].pop("label", None)
+
+            for recipe in old_recipes[product]:
+                for ingredient in recipe:
+                    self.ingredients[ingredient] -= 1
+            for recipe in new_recipes[product]:
+                for ingredient in recipe:
+                    self.ingredients[ingredient] = self.ingredients.get(ingredient, 0) + 1
+
+            if new_recipes[product]:
+                self.products.add(product)
+                self.dependencies[product] = list(new_recipes[product][-1])
+                index_recipes[product] = new_recipes[product][-1]
+            else:
+                self.products.discard(product)
+                self.dependencies.pop(product, None)
+                index_recipes[product] = None
+
+        # items that are no longer in any recipe
+        for ingredient in {ingredient for recipes in old_recipes.values() for recipe in recipes for ingredient in recipe}:
+            if self.ingredients.get(ingredient) == 0:
+                del self.ingredients[ingredient]
+        for node in {*changed, *(ingredient for _, ingredient, _ in removed_edges)}:
+            if node in graph and node not in table.name_ids:
+                removed_nodes.append((node, graph.nodes[node].get("group")))
+                graph.remove_node(node)
+
+        moves = 0
+        if refiner is not None:
+            refiner.apply_edits(removed_edges, added_edges, added_nodes, removed_nodes)
+            moves = refiner.refine([*changed, *(v for _, v, _ in removed_edges), *(v for _, v, _ in added_edges)], centres=changed)
+            # new nodes start alone and moves can empty a community, group ids stay 0..k-1 without gaps
+            refiner.compact()
+            self.communities = [community for community in refiner.communities if community]
+
+        changed_counts = self.ingredient_index.update_products(index_recipes)
+        self._common_ingredients_map = None
+        self._update_requirement_solver(index_recipes)
+        self.recipe_table = table
+        self.source_key = source_key
+
+        self._logger(
+            LogLevel.INFO,
+            f"Applied {len(changed)} product changes (+{len(added_edges)}/-{len(removed_edges)} edges, "
+            f"+{len(added_nodes)}/-{len(removed_nodes)} nodes, {moves} community moves) in {time.perf_counter() - start:.3f}s",
+        )
+
+        if render:
+            self.build_pyviz_graph()
+            self.partition_into_common_ingredient_clusters(common_counts=changed_counts)
+        self.save_snapshot()
+        return changed
+
+    def _community_refiner(self) -> LocalMoveRefiner | None:
+        # created from the current 'group' attributes the first time it is needed after a partition
+        if self._refiner is None and self.communities:
+            self._refiner = LocalMoveRefiner(self.nx_graph, weight="quantity", resolution=CLUSTER_RESOLUTION)
+        return self._refiner
+
+    def _update_requirement_solver(self, recipes: dict[str, dict[str, int] | None]) -> None:
+        # the solver has no way to take a recipe away, so a removal (or a new cycle) drops it and it is rebuilt on demand
+        solver = self._requirement_solver
+        if solver is None:
+            return
+        if any(ingredients is None for ingredients in recipes.values()):
+            self._requirement_solver = None
+            return
+        for product in recipes:
+            try:
+                solver.update_recipe(product, recipes[product])
+            except ValueError as e:
+                self._logger(LogLevel.WARNING, f"Dropping requirement solver after update of {product}: {e}")
+                self._requirement_solver = None
+                return
+
+    @instrumentation.stage("snapshot save")
+    def save_snapshot(self) -> None:
+        # recipe set and communities of the current graph, what the next incremental update diffs against
+        if self._cache is None or self.recipe_table is None:
+            return
+        nodes = self.nx_graph.nodes
+        groups = np.array([nodes[name].get("group", -1) if name in nodes else -1 for name in self.recipe_table.names], dtype=np.int32)
+        self._cache.save_snapshot(self.graph_name, self.recipe_table, groups, self.source_key)
+
+    @instrumentation.stage("store write")
+    def save_recipe_store(self, path: Path) -> RecipeStore:
+        # the recipe table as a memory mapped recipe store (recipe_network.recipe_store), for lazy queries and for
+        # workers that only need part of the graph, opened read-only on the written file, close it when done
+        # (or use it as a context manager), the store returned by the previous call is closed here
+        if self.recipe_table is None:
+            raise ValueError("No recipe table to store, import a network first")
+        if self._recipe_store is not None:
+            self._recipe_store.close()
+        start = time.perf_counter()
+        store = RecipeStore(RecipeStore.write(path, self.recipe_table))
+        self._recipe_store = store
+        self._logger(LogLevel.INFO, f"Wrote recipe store of {store.n_items} items and {store.n_edges} edges to {path} in {time.perf_counter() - start:.3f}s")
+        return store
+
+    @instrumentation.stage("snapshot load")
+    def load_snapshot(self, *filenames: str) -> bool:
+        # rebuild the graph and its communities from the last snapshot, without reclustering or rendering
+        # with filenames (in data_dir), only a snapshot built from their current contents is used, one saved before
+        # they changed is ignored, without them the snapshot is taken as is (incremental updates diff against it)
+        if self._cache is None:
+            return False
+        source_key = None
+        if filenames:
+            source_key = self._cache.source_key([Path(self.data_dir) / filename for filename in filenames])
+            if source_key is None:
+                return False
+        snapshot = self._cache.load_snapshot(self.graph_name, source_key)
+        if snapshot is None:
+            return False
+        table, groups, snapshot_key = snapshot
+        self._build_graph_from_table(table)
+        self.source_key = snapshot_key
+
+        self.communities = []
+        if (groups >= 0).any():
+            self.communities = [set() for _ in range(int(groups.max()) + 1)]
+            for name, group in zip(table.names, groups.tolist()):
+                if group >= 0:
+                    self.nx_graph.nodes[name]["group"] = group
+                    self.communities[group].add(name)
+        return True
+
+    @instrumentation.stage("clustering")
+    def partition_into_clusters(self, backend: str = "networkx", resolution: float = CLUSTER_RESOLUTION) -> None:
+        # partition the graph into modular communities, backend is one of recipe_network.clustering.CLUSTERING_BACKENDS
+        # networkx runs the Clauset-Newman-Moore greedy modularity maximization on nx_graph itself, the other
+        # engines (igraph Louvain, Leiden, in-repo CNM) are fed the recipe table's integer edge arrays
+        start = time.perf_counter()
+        if backend == "networkx":
+            self.communities = nx.community.greedy_modularity_communities(self.nx_graph, weight='quantity', resolution=resolution)
+        else:
+            table = self.recipe_table
+            sources, targets, quantities = table.unique_edges()
+            labels = cluster(table.n_items, sources, targets, quantities, backend=backend, resolution=resolution)
+            self.communities = labels_to_communities(labels, table.names)
+        self._logger(LogLevel.INFO, f"Partitioned into {len(self.communities)} communities with {backend} in {time.perf_counter() - start:.3f}s")
+        self._assign_groups()
+
+    @instrumentation.stage("resolution sweep")
+    def sweep_cluster_resolutions(self, resolutions: list[float] = SWEEP_RESOLUTIONS, backend: str = "leiden", max_workers: int | None = None) -> PartitionHierarchy:
+        # cluster at every resolution to pick a district granularity, see recipe_network.resolution_sweep
+        # the graph itself is left alone, partition_from_sweep applies one of the levels
+        table = self.recipe_table
+        sources, targets, quantities = table.unique_edges()
+        start = time.perf_counter()
+        hierarchy = sweep_resolutions(table.n_items, sources, targets, quantities, resolutions=resolutions, backend=backend, max_workers=max_workers)
+        self._logger(LogLevel.INFO, f"Swept {len(hierarchy)} resolutions with {backend} in {time.perf_counter() - start:.3f}s")
+        for resolution, q, n_communities, stability in zip(hierarchy.resolutions, hierarchy.modularity, hierarchy.n_communities, hierarchy.stability):
+            self._logger(LogLevel.DEBUG, f"Resolution {resolution:.3f}: {n_communities} communities, Q {q:.4f}, NMI with previous {stability:.3f}")
+        return hierarchy
+
+    def partition_from_sweep(self, hierarchy: PartitionHierarchy, resolution: float) -> None:
+        # use the swept partition closest to resolution instead of clustering again
+        level = hierarchy.level(resolution)
+        self.communities = hierarchy.communities(level, self.recipe_table.names)
+        self._logger(LogLevel.INFO, f"Partitioned into {len(self.communities)} communities from the sweep at resolution {hierarchy.resolutions[level]:.3f}")
+        self._assign_groups()
+
+    def _assign_groups(self) -> None:
         for i, community in enumerate(self.communities):
             for node in community:
                 self.nx_graph.nodes[node]['group'] = i
+        self._refiner = None
+
+    @instrumentation.stage("common-ingredient pairing")
+    def common_ingredient_layers(self, max_pairs_per_layer: int | None = MAX_LAYER_PAIRS) -> dict[int, tuple[np.ndarray, np.ndarray]]:
+        # common ingredient count -> (first product ids, second product ids) of the pairs sharing exactly that many,
+        # all read off the one overlap matrix, highest count first and pairs in product order within a layer
+        # low counts grow quadratically (every pair of products using Iron Ingot shares one), so layers
+        # are cut to their first max_pairs_per_layer pairs, None keeps them all
+        first_ids, second_ids, common_counts = self.ingredient_index.common_pairs()
+        layers = {}
+        for common_count in np.unique(common_counts)[::-1].tolist():
+            in_layer = np.flatnonzero(common_counts == common_count)
+            if max_pairs_per_layer is not None and len(in_layer) > max_pairs_per_layer:
+                self._logger(LogLevel.WARNING, f"Layer with {common_count} common ingredients has {len(in_layer)} pairs, keeping the first {max_pairs_per_layer}")
+                in_layer = in_layer[:max_pairs_per_layer]
+            layers[common_count] = (first_ids[in_layer], second_ids[in_layer])
+        return layers
 
-    def partition_into_common_ingredient_clusters(self) -> None:
-        # partition the graph into clusters based on common ingredients between products
-
-        common_ingredient_map = self.find_products_with_common_ingredients()
-        # assign community groups based on common ingredient counts
-        for i, common_count in enumerate(sorted(common_ingredient_map.keys(), reverse=True)):
-            graph = nx.Graph()
-            for product1, product2, common_ingredients in common_ingredient_map[common_count]:
-                self.nx_graph.nodes[product1]['group'] = i
-                self.nx_graph.nodes[product2]['group'] = i
-                graph.add_edge(product1, product2, weight=len(common_ingredients))
-            pyviz_graph = Network(directed=False, height="1000px", width="100%")
-            pyviz_graph.from_nx(graph)
-            output_path = self.output_path / f"{self.graph_name}_common_ingredients_{common_count}.html"
-            self._save_graph(pyviz_graph, output_path)
-
-    def build_pyviz_graph(self) -> None:       
+    @instrumentation.stage("common-ingredient render")
+    def partition_into_common_ingredient_clusters(self, max_pairs_per_layer: int | None = MAX_LAYER_PAIRS, max_workers: int | None = None, common_counts: set[int] | None = None) -> list[Path]:
+        # one html graph per common ingredient count, linking products that share exactly that many ingredients
+        # the layers are rendered concurrently in a process pool, nothing on the builder (nx_graph included) is modified
+        # common_counts renders only those layers (and deletes the files of those that no longer have pairs)
+        layers = self.common_ingredient_layers(max_pairs_per_layer)
+        if common_counts is not None:
+            for common_count in common_counts - layers.keys():
+                (self.output_path / f"{self.graph_name}_common_ingredients_{common_count}.html").unlink(missing_ok=True)
+            layers = {common_count: pairs for common_count, pairs in layers.items() if common_count in common_counts}
+        products = self.ingredient_index.products
+        output_paths = [str(self.output_path / f"{self.graph_name}_common_ingredients_{common_count}.html") for common_count in layers]
+        if not layers:
+            return []
+
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        max_workers = max(1, min(max_workers, len(layers)))
+        self._logger(LogLevel.INFO, f"Rendering {len(layers)} common ingredient layers using {max_workers} workers")
+        start = time.perf_counter()
+
+        arguments = [
+            (output_path, products, first_ids, second_ids, common_count)
+            for output_path, (common_count, (first_ids, second_ids)) in zip(output_paths, layers.items())
+        ]
+        try:
+            if max_workers == 1:
+                for argument in arguments:
+                    _render_common_ingredient_layer(*argument)
+            else:
+                with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                    # largest layers first so one big layer does not start last
+                    by_size = sorted(arguments, key=lambda argument: len(argument[2]), reverse=True)
+                    list(executor.map(_render_common_ingredient_layer, *zip(*by_size)))
+        except Exception as e:
+            self._logger(LogLevel.ERROR, f"Failed to render common ingredient layers: {e}")
+            raise
+
+        self._logger(LogLevel.INFO, f"Rendered {len(layers)} common ingredient layers in {time.perf_counter() - start:.3f}s")
+        return [Path(output_path) for output_path in output_paths]
+
+    @instrumentation.stage("html write")
+    def _export_precomputed_html(self, output_path: Path, collapse_communities: bool, drill_down: bool) -> None:
+        table = self.recipe_table
+        if table.n_items == 0:
+            self._logger(LogLevel.ERROR, "Recipe table is empty - cannot export html")
+            return
+
+        # one edge per product/ingredient pair with the last quantity, the same edges as nx_graph
+        sources, targets, weights = table.unique_edges()
+
+        groups = self.community_labels()
+        if self.communities and groups is None:
+            self._logger(LogLevel.WARNING, "Communities are out of date with the graph, exporting without them")
+        if collapse_communities and groups is None:
+            self._logger(LogLevel.WARNING, "No communities to collapse, run partition_into_clusters first")
+            collapse_communities = False
+
+        self._logger(LogLevel.INFO, f"Exporting html with precomputed layout to {output_path}")
+        start = time.perf_counter()
+        size = export_graph_html(output_path, table.names, sources, targets, weights, groups=groups, collapse=collapse_communities, drill_down=drill_down, title=self.graph_name)
+        instrumentation.count("html bytes", size)
+        self._logger(LogLevel.INFO, f"Exported {table.n_items} nodes and {len(sources)} edges ({size / 1e6:.1f} MB) in {time.perf_counter() - start:.3f}s")
+
+    def build_pyviz_graph(self, precomputed_layout: bool = False, collapse_communities: bool = False, drill_down: bool = True) -> None:
+        # precomputed_layout skips pyvis and browser physics: the layout is computed in numpy and the nodes and
+        # edges are streamed straight into the html, which keeps graphs with tens of thousands of nodes usable
+        # collapse_communities (with precomputed_layout, after partition_into_clusters) shows every community as one
+        # super-node, with drill_down the members are in the page too and a double click expands a community
         self._logger(LogLevel.INFO, f"NetworkX graph has {self.nx_graph.number_of_nodes()} nodes and {self.nx_graph.number_of_edges()} edges")
+        if precomputed_layout:
+            self._export_precomputed_html(self.output_path / f"{self.graph_name}.html", collapse_communities, drill_down)
+            return
+
         self._logger(LogLevel.INFO, f"Building pyviz graph from networkx graph")
         if self.nx_graph.number_of_nodes() == 0:
             self._logger(LogLevel.ERROR, "NetworkX graph is empty - cannot build pyvis graph")
@@ -200,10 +643,13 @@ class GraphBuilder:
             
         # Reinitialize pyvis graph to ensure clean state
         self._logger(LogLevel.INFO, f"Reinitializing pyvis graph")
+        from pyvis.network import Network
+
         self.pyvis_graph = Network(directed=True, height="1000px", width="100%")
         
         try:
-            self.pyvis_graph.from_nx(self.nx_graph)
+            with instrumentation.span("pyvis render"):
+                self.pyvis_graph.from_nx(self.nx_graph)
             self._logger(LogLevel.INFO, f"Pyvis graph built successfully with {len(self.pyvis_graph.nodes)} nodes")
             
             # Verify pyvis graph is properly initialized
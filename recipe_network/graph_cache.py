@@ -0,0 +1,131 @@
+import hashlib
+from pathlib import Path
+
+import numpy as np
+
+from utils.logging import Logger, LogLevel
+from utils.recipe_table import RecipeTable
+
+CACHE_FORMAT_VERSION = 2
+# cached graphs kept in cache_dir, every edit to the json writes a new one, the least recently used go first
+CACHE_MAX_ENTRIES = 4
+
+class GraphCache:
+    # content-hash keyed .npz cache of the parsed recipe json, stored as the RecipeTable arrays
+    # the key covers the name and bytes of every source file in order, so any edit to the json
+    # (or a different set of files) misses the cache and the graph is rebuilt from json
+    def __init__(self, cache_dir: Path, logger: Logger) -> None:
+        self.cache_dir = Path(cache_dir)
+        self._logger = logger
+
+    def key(self, paths: list[Path]) -> str:
+        digest = hashlib.sha256(f"recipe-graph-v{CACHE_FORMAT_VERSION}".encode())
+        for path in paths:
+            digest.update(Path(path).name.encode("utf-8"))
+            with open(path, "rb") as source_file:
+                for block in iter(lambda: source_file.read(1 << 20), b""):
+                    digest.update(block)
+        return digest.hexdigest()
+
+    def source_key(self, paths: list[Path]) -> str | None:
+        # the key of the files, None (logged) when they can't be read
+        try:
+            return self.key(paths)
+        except OSError as e:
+            self._logger(LogLevel.ERROR, f"Failed to hash recipe files {[str(path) for path in paths]}. Error: {e}")
+            return None
+
+    def lookup(self, paths: list[Path]) -> tuple[str | None, RecipeTable | None]:
+        # (cache key, cached recipe table or None), the key is None when the files can't be read
+        key = self.source_key(paths)
+        return key, None if key is None else self.load(key)
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"recipe_graph_{key[:32]}.npz"
+
+    def load(self, key: str) -> RecipeTable | None:
+        path = self._path(key)
+        if not path.exists():
+            self._logger(LogLevel.INFO, f"No cached graph for key {key[:12]}")
+            return None
+
+        try:
+            with np.load(path, allow_pickle=False) as cached:
+                table = RecipeTable.from_arrays({name: cached[name] for name in cached.files})
+        except Exception as e:
+            self._logger(LogLevel.WARNING, f"Failed to read cached graph {path}, rebuilding. Error: {e}")
+            return None
+
+        try:
+            # marks it as recently used for _prune
+            path.touch()
+        except OSError:
+            pass
+        self._logger(LogLevel.INFO, f"Loaded cached graph from {path}")
+        return table
+
+    def _prune(self, keep: int = CACHE_MAX_ENTRIES) -> None:
+        # deletes all but the keep most recently used cached graphs, snapshots are not touched
+        entries = []
+        for path in self.cache_dir.glob("recipe_graph_*.npz"):
+            try:
+                entries.append((path.stat().st_mtime, path))
+            except OSError:
+                continue
+        for _, path in sorted(entries, reverse=True)[keep:]:
+            try:
+                path.unlink()
+            except OSError as e:
+                self._logger(LogLevel.WARNING, f"Failed to delete stale graph cache {path}. Error: {e}")
+                continue
+            self._logger(LogLevel.DEBUG, f"Deleted stale graph cache {path}")
+
+    def _snapshot_path(self, name: str) -> Path:
+        return self.cache_dir / f"{name}_snapshot.npz"
+
+    def load_snapshot(self, name: str, source_key: str | None = None) -> tuple[RecipeTable, np.ndarray, str | None] | None:
+        # (recipe table, community group per item id (-1 where there is none), key of the recipe files it was built
+        # from) of the last build of a graph, with source_key only a snapshot built from files with that key
+        path = self._snapshot_path(name)
+        if not path.exists():
+            return None
+
+        try:
+            with np.load(path, allow_pickle=False) as cached:
+                groups = cached["groups"]
+                snapshot_key = str(cached["source_key"]) if "source_key" in cached.files else ""
+                table = RecipeTable.from_arrays({name: cached[name] for name in cached.files if name not in ("groups", "source_key")})
+        except Exception as e:
+            self._logger(LogLevel.WARNING, f"Failed to read snapshot {path}. Error: {e}")
+            return None
+
+        if source_key is not None and snapshot_key != source_key:
+            self._logger(LogLevel.INFO, f"Ignoring snapshot {path}, the recipe files changed since it was saved")
+            return None
+        self._logger(LogLevel.INFO, f"Loaded snapshot from {path}")
+        return table, groups, snapshot_key or None
+
+    def save_snapshot(self, name: str, table: RecipeTable, groups: np.ndarray, source_key: str | None = None) -> None:
+        # the recipe set and communities a graph was last built and rendered from, incremental updates diff against it,
+        # source_key is the key of the recipe files the table came from, so a later run can tell they changed
+        path = self._snapshot_path(name)
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            np.savez(path, groups=groups, source_key=np.array(source_key or ""), **table.to_arrays())
+        except Exception as e:
+            self._logger(LogLevel.WARNING, f"Failed to write snapshot {path}. Error: {e}")
+            return
+
+        self._logger(LogLevel.DEBUG, f"Saved snapshot to {path}")
+
+    def save(self, key: str, table: RecipeTable) -> None:
+        path = self._path(key)
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            np.savez(path, **table.to_arrays())
+        except Exception as e:
+            self._logger(LogLevel.WARNING, f"Failed to write graph cache {path}. Error: {e}")
+            return
+
+        self._logger(LogLevel.INFO, f"Saved graph cache to {path}")
+        self._prune()
@@ -0,0 +1,237 @@
+import html
+import json
+from pathlib import Path
+
+import numpy as np
+import scipy.fft
+
+VIS_NETWORK_JS = "https://cdnjs.cloudflare.com/ajax/libs/vis-network/9.1.2/dist/vis-network.min.js"
+WRITE_BATCH = 50_000
+NODE_SPACING = 50
+
+_PAGE_SCRIPT = """
+const nodes = new vis.DataSet();
+const edges = new vis.DataSet();
+const expanded = new Set();
+
+function memberNode(i) {
+    const node = {id: i, label: labels[i], x: xs[i], y: ys[i]};
+    if (groups.length) node.group = groups[i];
+    if (values.length) {
+        node.value = values[i];
+        node.title = String(values[i]);
+    }
+    return node;
+}
+
+function endpoint(i) {
+    return !drillDown || expanded.has(groups[i]) ? i : "c" + groups[i];
+}
+
+function render() {
+    const visibleNodes = [];
+    if (drillDown) {
+        for (let c = 0; c < communitySizes.length; c++) {
+            if (communitySizes[c] && !expanded.has(c)) {
+                visibleNodes.push({
+                    id: "c" + c, label: "Community " + c + " (" + communitySizes[c] + " items)", x: communityXs[c], y: communityYs[c],
+                    group: c, value: communitySizes[c], title: "double click to expand",
+                });
+            }
+        }
+    }
+    for (let i = 0; i < labels.length; i++) {
+        if (!drillDown || expanded.has(groups[i])) visibleNodes.push(memberNode(i));
+    }
+
+    // edges between the visible endpoints, parallel edges into a collapsed community are summed
+    const visibleEdges = new Map();
+    for (let e = 0; e < edgeSources.length; e++) {
+        const from = endpoint(edgeSources[e]);
+        const to = endpoint(edgeTargets[e]);
+        if (from === to) continue;
+        const id = from + ">" + to;
+        const edge = visibleEdges.get(id);
+        if (edge) edge.value += edgeWeights[e];
+        else visibleEdges.set(id, {id: id, from: from, to: to, value: edgeWeights[e]});
+    }
+    for (const edge of visibleEdges.values()) edge.title = String(edge.value);
+
+    nodes.clear();
+    edges.clear();
+    nodes.add(visibleNodes);
+    edges.add(Array.from(visibleEdges.values()));
+}
+
+render();
+const network = new vis.Network(document.getElementById("network"), {nodes: nodes, edges: edges}, {
+    physics: false,
+    layout: {improvedLayout: false},
+    interaction: {hideEdgesOnDrag: true, tooltipDelay: 200},
+    nodes: {shape: "dot", size: 10, scaling: {min: 10, max: 60}},
+    edges: {arrows: directed ? "to" : "", smooth: false, scaling: {min: 1, max: 8}},
+});
+
+if (drillDown) {
+    network.on("doubleClick", function (params) {
+        if (!params.nodes.length) return;
+        const id = params.nodes[0];
+        if (typeof id === "string") expanded.add(Number(id.slice(1)));
+        else expanded.delete(groups[id]);
+        render();
+    });
+}
+"""
+
+def force_layout(n_nodes: int, sources: np.ndarray, targets: np.ndarray, weights: np.ndarray | None = None, iterations: int = 50, gravity: float = 1.0, seed: int = 0) -> np.ndarray:
+    # Fruchterman-Reingold layout with every step vectorized over all nodes and edges, returns (n_nodes, 2) positions
+    # the all-pairs repulsion k²/d is approximated on a grid (particle-mesh): nodes are binned onto a G x G grid,
+    # the cell counts are convolved with the repulsion kernel by FFT and every node reads the force of its cell,
+    # O(n + G² log G) per iteration with G ~ √n instead of O(n²), nodes sharing a cell don't push each other apart
+    # attraction d²/k acts along edges (scaled by the mean-normalized weights), a weak pull towards the centre
+    # (like ForceAtlas2 gravity) keeps disconnected components from drifting away
+    rng = np.random.default_rng(seed)
+    positions = rng.random((n_nodes, 2))
+    if n_nodes < 2:
+        return positions
+
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    weights = None if weights is None or len(weights) == 0 else np.asarray(weights, dtype=np.float64)
+    if weights is None or weights.mean() <= 0:
+        # no weights, or all zero (e.g. every quantity 0), every edge pulls the same
+        weights = np.ones(len(sources))
+    else:
+        weights = weights / weights.mean()
+
+    k = np.sqrt(1.0 / n_nodes)
+    grid = int(np.clip(np.sqrt(n_nodes), 16, 1024))
+
+    # kernel d/|d|² in cell units over every offset a pair on the grid can have, zero padded to at least 2G so
+    # the circular FFT convolution is the linear one, fftfreq gives offsets in the same wrapped order as the FFT
+    # float32 transforms are plenty for a layout and about twice as fast
+    padded = scipy.fft.next_fast_len(2 * grid, real=True)
+    offsets = np.fft.fftfreq(padded, 1.0 / padded).astype(np.float32)
+    dx, dy = np.meshgrid(offsets, offsets, indexing="ij")
+    distance2 = dx ** 2 + dy ** 2
+    distance2[0, 0] = np.inf
+    kernel_x = scipy.fft.rfft2(dx / distance2)
+    kernel_y = scipy.fft.rfft2(dy / distance2)
+
+    temperature = 0.1
+    cooling = temperature / (iterations + 1)
+    for _ in range(iterations):
+        # repulsion, the kernel is in cell units so the physical force is k²/h times the grid force
+        low = positions.min(axis=0)
+        cell_size = max(float((positions.max(axis=0) - low).max()), 1e-9) * (1 + 1e-9) / grid
+        cells = np.minimum(((positions - low) / cell_size).astype(np.int64), grid - 1)
+        flat_cells = cells[:, 0] * padded + cells[:, 1]
+        density = np.bincount(flat_cells, minlength=padded * padded).reshape(padded, padded).astype(np.float32)
+        density_hat = scipy.fft.rfft2(density)
+        scale = k * k / cell_size
+        displacement = np.column_stack((
+            scipy.fft.irfft2(density_hat * kernel_x, s=density.shape).ravel()[flat_cells],
+            scipy.fft.irfft2(density_hat * kernel_y, s=density.shape).ravel()[flat_cells],
+        )).astype(np.float64) * scale
+
+        # attraction along edges
+        delta = positions[targets] - positions[sources]
+        pull = delta * (np.sqrt((delta ** 2).sum(axis=1)) * weights / k)[:, None]
+        for axis in (0, 1):
+            displacement[:, axis] += np.bincount(sources, weights=pull[:, axis], minlength=n_nodes)
+            displacement[:, axis] -= np.bincount(targets, weights=pull[:, axis], minlength=n_nodes)
+
+        displacement += gravity * (positions.mean(axis=0) - positions)
+
+        # move every node at most `temperature` along its displacement
+        length = np.maximum(np.sqrt((displacement ** 2).sum(axis=1)), 1e-12)
+        positions += displacement * (np.minimum(length, temperature) / length)[:, None]
+        temperature -= cooling
+    return positions
+
+def collapse_communities(groups: np.ndarray, sources: np.ndarray, targets: np.ndarray, weights: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    # one super-node per community: (super sources, super targets, summed weights, community sizes)
+    # edges inside a community are dropped, parallel edges between two communities are summed into one
+    groups = np.asarray(groups, dtype=np.int64)
+    n_groups = int(groups.max()) + 1 if len(groups) else 0
+    group_sources = groups[sources]
+    group_targets = groups[targets]
+    external = group_sources != group_targets
+    codes, inverse = np.unique(group_sources[external] * n_groups + group_targets[external], return_inverse=True)
+    summed = np.bincount(inverse, weights=np.asarray(weights, dtype=np.float64)[external], minlength=len(codes))
+    return codes // n_groups, codes % n_groups, summed, np.bincount(groups, minlength=n_groups)
+
+def _write_array(html_file, name: str, values) -> None:
+    # const name = [...]; written in batches so the page text never has to exist in memory at once
+    html_file.write(f"const {name} = [")
+    for start in range(0, len(values), WRITE_BATCH):
+        batch = values[start:start + WRITE_BATCH]
+        if isinstance(batch, np.ndarray):
+            batch = batch.tolist()
+        # "</" inside a string would close the script tag
+        text = json.dumps(batch, ensure_ascii=False, separators=(",", ":"))[1:-1].replace("</", "<\\/")
+        html_file.write(("," if start else "") + text)
+    html_file.write("];\n")
+
+def write_html(output_path: Path, labels: list[str], positions: np.ndarray, sources: np.ndarray, targets: np.ndarray, weights: np.ndarray,
+               groups: np.ndarray | None = None, values: np.ndarray | None = None, directed: bool = True, drill_down: bool = False, title: str = "") -> int:
+    # stream a standalone vis-network page with fixed node positions (physics off), returns the file size in bytes
+    # nodes and edges go out as flat json arrays, the page builds its DataSets from them in one pass
+    # with drill_down, groups are shown collapsed into one super-node each at the centroid of its members
+    # and double clicking a super-node expands it (double clicking a member collapses it again)
+    output_path = Path(output_path)
+    positions = np.asarray(positions, dtype=np.float64)
+    if len(positions):
+        span = max(float(np.ptp(positions, axis=0).max()), 1e-9)
+        pixels = np.rint((positions - positions.mean(axis=0)) * (NODE_SPACING * np.sqrt(len(positions)) / span)).astype(np.int64)
+    else:
+        pixels = np.zeros((0, 2), dtype=np.int64)
+
+    with open(output_path, "w", encoding="utf-8") as html_file:
+        html_file.write(
+            "<!DOCTYPE html>\n<html>\n<head>\n<meta charset=\"utf-8\">\n"
+            f"<title>{html.escape(title)}</title>\n<script src=\"{VIS_NETWORK_JS}\"></script>\n"
+            "<style>html, body {margin: 0; height: 100%;} #network {width: 100%; height: 100%;}</style>\n"
+            "</head>\n<body>\n<div id=\"network\"></div>\n<script>\n"
+        )
+        _write_array(html_file, "labels", labels)
+        _write_array(html_file, "xs", pixels[:, 0])
+        _write_array(html_file, "ys", pixels[:, 1])
+        _write_array(html_file, "edgeSources", np.asarray(sources, dtype=np.int64))
+        _write_array(html_file, "edgeTargets", np.asarray(targets, dtype=np.int64))
+        _write_array(html_file, "edgeWeights", np.asarray(weights).tolist())
+        _write_array(html_file, "groups", [] if groups is None else np.asarray(groups, dtype=np.int64))
+        _write_array(html_file, "values", [] if values is None else np.asarray(values).tolist())
+
+        if drill_down:
+            groups = np.asarray(groups, dtype=np.int64)
+            sizes = np.bincount(groups, minlength=int(groups.max()) + 1 if len(groups) else 0)
+            centroids = [np.rint(np.bincount(groups, weights=pixels[:, axis], minlength=len(sizes)) / np.maximum(sizes, 1)).astype(np.int64) for axis in (0, 1)]
+            _write_array(html_file, "communitySizes", sizes)
+            _write_array(html_file, "communityXs", centroids[0])
+            _write_array(html_file, "communityYs", centroids[1])
+
+        html_file.write(f"const directed = {json.dumps(directed)};\nconst drillDown = {json.dumps(drill_down)};\n")
+        html_file.write(_PAGE_SCRIPT)
+        html_file.write("</script>\n</body>\n</html>\n")
+    return output_path.stat().st_size
+
+def export_graph_html(output_path: Path, labels: list[str], sources: np.ndarray, targets: np.ndarray, weights: np.ndarray | None = None,
+                      groups: np.ndarray | None = None, directed: bool = True, collapse: bool = False, drill_down: bool = True,
+                      iterations: int = 50, title: str = "") -> int:
+    # lay out the graph in numpy and write it as html without building pyvis objects, returns the file size in bytes
+    # collapse needs groups: with drill_down the whole graph is laid out and shipped, starting collapsed,
+    # without it only the community graph is laid out and written
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    weights = np.ones(len(sources)) if weights is None else np.asarray(weights)
+
+    if collapse and not drill_down:
+        super_sources, super_targets, super_weights, sizes = collapse_communities(groups, sources, targets, weights)
+        positions = force_layout(len(sizes), super_sources, super_targets, super_weights, iterations=iterations)
+        community_labels = [f"Community {i} ({size} items)" for i, size in enumerate(sizes.tolist())]
+        return write_html(output_path, community_labels, positions, super_sources, super_targets, super_weights,
+                          groups=np.arange(len(sizes)), values=sizes, directed=directed, title=title)
+
+    positions = force_layout(len(labels), sources, targets, weights, iterations=iterations)
+    return write_html(output_path, labels, positions, sources, targets, weights, groups=groups, directed=directed, drill_down=collapse, title=title)
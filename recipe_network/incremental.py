@@ -0,0 +1,207 @@
+from collections import deque
+
+import networkx as nx
+import numpy as np
+
+from utils.recipe_table import RecipeTable
+
+_MIX_MULTIPLIER = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_SEED = np.uint64(0x9E3779B97F4A7C15)
+
+def _mix(*columns: np.ndarray) -> np.ndarray:
+    # 64-bit hash of every row of the given integer columns (splitmix-style, wrapping arithmetic)
+    h = np.full(len(columns[0]), _MIX_SEED, dtype=np.uint64)
+    for column in columns:
+        h ^= column.astype(np.uint64)
+        h *= _MIX_MULTIPLIER
+        h ^= h >> np.uint64(31)
+    return h
+
+def _product_signatures(table: RecipeTable, item_ids: np.ndarray, n_items: int) -> np.ndarray:
+    # order-sensitive hash of every product's recipes (all alternates, ingredients and quantities),
+    # item_ids maps the table's ids into a shared id space, 0 for items without a recipe
+    with np.errstate(over="ignore"):
+        edge_hashes = _mix(item_ids[table.ingredients], table.quantities)
+        cumulative = np.concatenate((np.zeros(1, dtype=np.uint64), np.cumsum(edge_hashes, dtype=np.uint64)))
+        recipe_sums = cumulative[table.indptr[1:]] - cumulative[table.indptr[:-1]]
+
+        # position of every recipe among the recipes of its product, so reordering alternates is a change too
+        order = np.argsort(table.recipe_products, kind="stable")
+        sorted_products = table.recipe_products[order]
+        starts = np.flatnonzero(np.r_[True, sorted_products[1:] != sorted_products[:-1]])
+        ordinals = np.empty(table.n_recipes, dtype=np.int64)
+        ordinals[order] = np.arange(table.n_recipes) - np.repeat(starts, np.diff(np.r_[starts, table.n_recipes]))
+
+        recipe_hashes = _mix(ordinals, recipe_sums, np.diff(table.indptr))
+        signatures = np.zeros(n_items, dtype=np.uint64)
+        np.add.at(signatures, item_ids[table.recipe_products], recipe_hashes)
+    return signatures
+
+def changed_products(old: RecipeTable, new: RecipeTable) -> list[str]:
+    # names of the items whose recipes differ between two tables: edited, added or removed recipes
+    # both tables are hashed per product in one vectorized pass, so the diff is O(recipes) numpy work
+    # whatever the size of the edit, and the two tables don't have to share an id space
+    # pandas is only needed here, importing it with the module would slow down every graph_builder import
+    import pandas as pd
+
+    new_ids = pd.Index(old.names).get_indexer(new.names)
+    unseen = new_ids < 0
+    new_ids[unseen] = old.n_items + np.arange(int(unseen.sum()))
+    n_items = old.n_items + int(unseen.sum())
+
+    old_signatures = _product_signatures(old, np.arange(old.n_items), n_items)
+    new_signatures = _product_signatures(new, new_ids, n_items)
+    changed = np.flatnonzero(old_signatures != new_signatures)
+
+    names = old.names
+    unseen_names = [new.names[i] for i in np.flatnonzero(unseen).tolist()]
+    return [names[i] if i < old.n_items else unseen_names[i - old.n_items] for i in changed.tolist()]
+
+def product_recipes(table: RecipeTable, products: list[str]) -> dict[str, list[dict[str, int]]]:
+    # every recipe of the given products in table order, [] for products without a recipe
+    recipes = {product: [] for product in products}
+    product_ids = [table.name_ids[product] for product in products if product in table.name_ids]
+    names = table.names
+    for recipe in np.flatnonzero(np.isin(table.recipe_products, product_ids)).tolist():
+        start, end = table.indptr[recipe], table.indptr[recipe + 1]
+        recipes[names[table.recipe_products[recipe]]].append(
+            dict(zip((names[i] for i in table.ingredients[start:end].tolist()), table.quantities[start:end].tolist()))
+        )
+    return recipes
+
+class LocalMoveRefiner:
+    # warm-started local moving, the first phase of Louvain, over the communities in the 'group' node attribute
+    # it optimizes the same directed modularity networkx's greedy_modularity_communities uses on a DiGraph:
+    #   Q = ∑c [ Lc/m - resolution * outc * inc / m² ]
+    # where Lc is the edge weight inside c and outc, inc are the summed out and in degrees of its members
+    # the per-community degree totals are kept up to date through apply_edits, so after an edit only the
+    # nodes around it are revisited instead of reclustering the graph
+    def __init__(self, graph: nx.DiGraph, weight: str = "quantity", resolution: float = 2.0) -> None:
+        self.graph = graph
+        self.weight = weight
+        self.resolution = resolution
+
+        self.communities = []
+        self.out_totals = []
+        self.in_totals = []
+        groups = {}
+        for node, group in graph.nodes(data="group"):
+            if group is None:
+                group = self._new_group()
+                graph.nodes[node]["group"] = group
+            while group >= len(self.communities):
+                self._new_group()
+            self.communities[group].add(node)
+            groups[node] = group
+
+        # degree totals in one pass over the adjacency
+        self.m = 0.0
+        for u, neighbours in graph.adjacency():
+            for v, data in neighbours.items():
+                w = data.get(weight, 1)
+                self.out_totals[groups[u]] += w
+                self.in_totals[groups[v]] += w
+                self.m += w
+
+    def _new_group(self) -> int:
+        self.communities.append(set())
+        self.out_totals.append(0.0)
+        self.in_totals.append(0.0)
+        return len(self.communities) - 1
+
+    def apply_edits(self, removed_edges: list[tuple], added_edges: list[tuple], added_nodes: list, removed_nodes: list) -> None:
+        # bookkeeping for edits already made to the graph, edges are (u, v, weight), a weight change is a
+        # removal plus an addition, added nodes start alone, removed nodes come as (node, group) pairs since
+        # they are no longer in the graph and must have lost all their edges (which are in removed_edges)
+        for node in added_nodes:
+            group = self._new_group()
+            self.graph.nodes[node]["group"] = group
+            self.communities[group].add(node)
+        removed_groups = dict(removed_nodes)
+        for sign, edges in ((-1, removed_edges), (1, added_edges)):
+            for u, v, w in edges:
+                self.out_totals[removed_groups[u] if u in removed_groups else self._group(u)] += sign * w
+                self.in_totals[removed_groups[v] if v in removed_groups else self._group(v)] += sign * w
+                self.m += sign * w
+        for node, group in removed_nodes:
+            self.communities[group].discard(node)
+
+    def _group(self, node) -> int:
+        return self.graph.nodes[node]["group"]
+
+    def compact(self) -> int:
+        # drop the communities edits and moves have emptied and relabel the rest 0..k-1 in their current order,
+        # on the 'group' attributes as well, returns the number of communities dropped
+        kept = [group for group, community in enumerate(self.communities) if community]
+        if len(kept) == len(self.communities):
+            return 0
+        for new_group, group in enumerate(kept):
+            for node in self.communities[group]:
+                self.graph.nodes[node]["group"] = new_group
+        dropped = len(self.communities) - len(kept)
+        self.communities = [self.communities[group] for group in kept]
+        self.out_totals = [self.out_totals[group] for group in kept]
+        self.in_totals = [self.in_totals[group] for group in kept]
+        return dropped
+
+    def refine(self, seeds: list, centres: list = ()) -> int:
+        # move nodes to the neighbouring community with the best modularity gain until none improves, returns the moves
+        # only seeds and the direct neighbours of centres (the edited products) are ever moved, a node that moves
+        # requeues its neighbours inside that region, which keeps an edit from rippling through a partition that
+        # was not a local optimum to begin with (CNM results usually are not)
+        graph = self.graph
+        weight = self.weight
+        m = self.m
+        if m <= 0:
+            return 0
+        region = {node for node in seeds if node in graph}
+        for centre in centres:
+            if centre in graph:
+                region.update(nx.all_neighbors(graph, centre))
+        queue = deque(node for node in dict.fromkeys(seeds) if node in graph)
+        queued = set(queue)
+        moves = 0
+        while queue:
+            node = queue.popleft()
+            queued.discard(node)
+
+            # edge weight between node and every neighbouring community, both directions
+            links = {}
+            for _, neighbour, w in graph.out_edges(node, data=weight, default=1):
+                if neighbour != node:
+                    links[self._group(neighbour)] = links.get(self._group(neighbour), 0) + w
+            for neighbour, _, w in graph.in_edges(node, data=weight, default=1):
+                if neighbour != node:
+                    links[self._group(neighbour)] = links.get(self._group(neighbour), 0) + w
+            out_degree = graph.out_degree(node, weight=weight)
+            in_degree = graph.in_degree(node, weight=weight)
+
+            # take node out of its community, then put it back where the gain is largest
+            current = self._group(node)
+            self.out_totals[current] -= out_degree
+            self.in_totals[current] -= in_degree
+
+            def gain(group: int) -> float:
+                return links.get(group, 0) / m - self.resolution * (out_degree * self.in_totals[group] + in_degree * self.out_totals[group]) / (m * m)
+
+            best, best_gain = current, gain(current)
+            for group in links:
+                group_gain = gain(group)
+                if group_gain > best_gain + 1e-12:
+                    best, best_gain = group, group_gain
+            if best_gain < -1e-12 and len(self.communities[current]) > 1:
+                # worse off with anyone than alone
+                best = self._new_group()
+
+            self.out_totals[best] += out_degree
+            self.in_totals[best] += in_degree
+            if best != current:
+                self.communities[current].discard(node)
+                self.communities[best].add(node)
+                graph.nodes[node]["group"] = best
+                moves += 1
+                for neighbour in nx.all_neighbors(graph, node):
+                    if neighbour in region and neighbour not in queued:
+                        queue.append(neighbour)
+                        queued.add(neighbour)
+        return moves
@@ -0,0 +1,216 @@
+import numpy as np
+import scipy.sparse as sp
+
+from utils.recipe_table import RecipeTable
+
+
+class IngredientIndex:
+    # inverted index over product recipes
+    # - incidence is the sparse product x ingredient matrix P, P[p, i] = 1 if product p uses ingredient i
+    # - products_by_ingredient maps each ingredient to the products that use it (the columns of P)
+    # - overlap is the strictly upper triangular part of P·Pᵀ, overlap[p, q] = number of ingredients p and q share
+    # only pairs that actually share an ingredient ever show up in the overlap matrix,
+    # so the cost scales with the number of sharing pairs instead of products²
+    def __init__(self, products: list[str], ingredients: list[str], incidence: sp.csr_matrix) -> None:
+        self.products = products
+        self.product_ids = {product: i for i, product in enumerate(products)}
+        self.ingredients = ingredients
+        self.ingredient_ids = {ingredient: i for i, ingredient in enumerate(ingredients)}
+
+        # binary incidence, an ingredient listed twice in one recipe still counts once
+        incidence = sp.csr_matrix(incidence, dtype=np.int32)
+        incidence.sum_duplicates()
+        incidence.data[:] = 1
+        incidence.sort_indices()
+        self.incidence = incidence
+
+        self._overlap = None
+        self._products_by_ingredient = None
+
+    @classmethod
+    def from_dependencies(cls, dependencies: dict[str, list[str]]) -> "IngredientIndex":
+        ingredient_ids = {}
+        rows = []
+        cols = []
+        for product_id, ingredients in enumerate(dependencies.values()):
+            for ingredient in ingredients:
+                rows.append(product_id)
+                cols.append(ingredient_ids.setdefault(ingredient, len(ingredient_ids)))
+
+        incidence = sp.csr_matrix(
+            (np.ones(len(rows), dtype=np.int32), (np.asarray(rows, dtype=np.int32), np.asarray(cols, dtype=np.int32))),
+            shape=(len(dependencies), len(ingredient_ids)),
+        )
+        return cls(list(dependencies.keys()), list(ingredient_ids.keys()), incidence)
+
+    @classmethod
+    def from_table(cls, table: RecipeTable) -> "IngredientIndex":
+        # one row per product (its last recipe, like GraphBuilder.dependencies), one column per item id
+        product_ids = table.product_ids()
+        recipes = table.product_recipes()[product_ids]
+        starts = table.indptr[recipes].astype(np.int64)
+        lengths = table.indptr[recipes + 1] - starts
+
+        # gather the CSR rows of the chosen recipes
+        row_offsets = np.cumsum(lengths) - lengths
+        positions = np.repeat(starts - row_offsets, lengths) + np.arange(int(lengths.sum()))
+        incidence = sp.csr_matrix(
+            (np.ones(len(positions), dtype=np.int32), (np.repeat(np.arange(len(product_ids)), lengths), table.ingredients[positions])),
+            shape=(len(product_ids), table.n_items),
+        )
+        return cls([table.names[i] for i in product_ids.tolist()], list(table.names), incidence)
+
+    def update_products(self, recipes: dict[str, list[str] | dict[str, int] | None]) -> set[int] | None:
+        # replace or add the ingredients of products (None removes the product) without a rebuild
+        # the incidence rows are swapped in one vectorized pass, and if the overlap was already computed it is
+        # patched locally: entries touching the changed rows are dropped and recomputed from
+        # incidence[changed] @ incidenceᵀ, which only visits products sharing an ingredient with them
+        # returns the common ingredient counts whose pairs changed, None when there was no overlap to patch
+        for ingredients in recipes.values():
+            for ingredient in ingredients or ():
+                if ingredient not in self.ingredient_ids:
+                    self.ingredient_ids[ingredient] = len(self.ingredients)
+                    self.ingredients.append(ingredient)
+
+        old_products = self.products
+        n_old = len(old_products)
+        removed = np.array([self.product_ids[product] for product, ingredients in recipes.items() if ingredients is None and product in self.product_ids], dtype=np.int64)
+        replaced = np.array([self.product_ids[product] for product, ingredients in recipes.items() if ingredients is not None and product in self.product_ids], dtype=np.int64)
+        added = [product for product, ingredients in recipes.items() if ingredients is not None and product not in self.product_ids]
+
+        # old product id -> new product id, -1 for removed products, added products go at the end
+        keep = np.ones(n_old, dtype=bool)
+        keep[removed] = False
+        remap = np.full(n_old, -1, dtype=np.int64)
+        remap[keep] = np.arange(int(keep.sum()))
+        if removed.size:
+            self.products = [product for product, kept in zip(self.products, keep.tolist()) if kept]
+            self.product_ids = {product: i for i, product in enumerate(self.products)}
+        for product in added:
+            self.product_ids[product] = len(self.products)
+            self.products.append(product)
+        n_new = len(self.products)
+        changed = np.concatenate((remap[replaced], np.arange(n_new - len(added), n_new))).astype(np.int64)
+
+        # unchanged rows moved to their new ids, plus the new rows of every replaced or added product
+        touched = ~keep
+        touched[replaced] = True
+        incidence = self.incidence.tocoo()
+        unchanged = ~touched[incidence.row]
+        new_rows = [self.product_ids[product] for product, ingredients in recipes.items() if ingredients is not None for _ in ingredients]
+        new_cols = [self.ingredient_ids[ingredient] for ingredients in recipes.values() if ingredients is not None for ingredient in ingredients]
+        incidence = sp.csr_matrix(
+            (
+                np.ones(int(unchanged.sum()) + len(new_rows), dtype=np.int32),
+                (np.concatenate((remap[incidence.row[unchanged]], new_rows)).astype(np.int64), np.concatenate((incidence.col[unchanged], new_cols)).astype(np.int64)),
+            ),
+            shape=(n_new, len(self.ingredients)),
+        )
+        incidence.sum_duplicates()
+        incidence.data[:] = 1
+        incidence.sort_indices()
+        self.incidence = incidence
+        self._products_by_ingredient = None
+
+        if self._overlap is None:
+            return None
+
+        # drop every pair touching a changed or removed product, then add the recomputed pairs of the changed ones,
+        # both straight in the CSR arrays (positions deleted and inserted, no re-sort), the few touched rows are
+        # sliced out and touched columns are found with one boolean gather over the indices
+        overlap = self._overlap
+        indptr = overlap.indptr.astype(np.int64)
+        touched_rows = [np.arange(indptr[row], indptr[row + 1]) for row in np.flatnonzero(touched).tolist()]
+        dropped = np.unique(np.concatenate([np.flatnonzero(touched[overlap.indices]), *touched_rows]))
+        dropped_rows = np.searchsorted(indptr, dropped, side="right") - 1
+        dropped_cols = overlap.indices[dropped]
+        dropped_counts = overlap.data[dropped]
+
+        indices = np.delete(overlap.indices, dropped)
+        data = np.delete(overlap.data, dropped)
+        if removed.size:
+            indices = remap[indices]
+        row_lengths = np.zeros(n_new, dtype=np.int64)
+        row_lengths[:int(keep.sum())] = (np.diff(indptr) - np.bincount(dropped_rows, minlength=n_old))[keep]
+
+        shared = (incidence[changed] @ incidence.T).tocoo()
+        first = changed[shared.row]
+        second = shared.col.astype(np.int64)
+        is_changed = np.zeros(n_new, dtype=bool)
+        is_changed[changed] = True
+        # a pair of two changed products shows up in both of their rows, keep it once
+        pair = (first != second) & (shared.data != 0) & (~is_changed[second] | (first < second))
+        first, second, shared_counts = first[pair], second[pair], shared.data[pair]
+        new_first = np.minimum(first, second)
+        new_second = np.maximum(first, second)
+        order = np.lexsort((new_second, new_first))
+        new_first, new_second, shared_counts = new_first[order], new_second[order], shared_counts[order]
+
+        # insert position of every new pair inside its (sorted) row of the remaining entries
+        indptr = np.zeros(n_new + 1, dtype=np.int64)
+        np.cumsum(row_lengths, out=indptr[1:])
+        positions = np.empty(len(new_first), dtype=np.int64)
+        row_starts = np.flatnonzero(np.r_[True, new_first[1:] != new_first[:-1]]) if len(new_first) else np.empty(0, dtype=np.int64)
+        for start, end in zip(row_starts.tolist(), np.r_[row_starts[1:], len(new_first)].tolist()):
+            row = new_first[start]
+            positions[start:end] = indptr[row] + np.searchsorted(indices[indptr[row]:indptr[row + 1]], new_second[start:end])
+        indices = np.insert(indices, positions, new_second.astype(indices.dtype))
+        data = np.insert(data, positions, shared_counts.astype(data.dtype))
+        indptr[1:] += np.cumsum(np.bincount(new_first, minlength=n_new))
+
+        self._overlap = sp.csr_matrix((data, indices, indptr), shape=(n_new, n_new))
+        self._overlap.has_sorted_indices = True
+
+        # layers whose set of pairs changed, compared by product name since removals shift the ids
+        # (the id order of the remaining products is unchanged, so every pair keeps its orientation)
+        products = self.products
+        before = {
+            (old_products[first_id], old_products[second_id], count)
+            for first_id, second_id, count in zip(dropped_rows.tolist(), dropped_cols.tolist(), dropped_counts.tolist())
+        }
+        after = {
+            (products[first_id], products[second_id], count)
+            for first_id, second_id, count in zip(new_first.tolist(), new_second.tolist(), shared_counts.tolist())
+        }
+        return {count for _, _, count in before ^ after}
+
+    @property
+    def products_by_ingredient(self) -> dict[str, list[str]]:
+        if self._products_by_ingredient is None:
+            by_ingredient = self.incidence.tocsc()
+            by_ingredient.sort_indices()
+            used = np.flatnonzero(np.diff(by_ingredient.indptr))
+            self._products_by_ingredient = {
+                self.ingredients[i]: [self.products[p] for p in by_ingredient.indices[by_ingredient.indptr[i]:by_ingredient.indptr[i + 1]].tolist()]
+                for i in used.tolist()
+            }
+        return self._products_by_ingredient
+
+    @property
+    def overlap(self) -> sp.csr_matrix:
+        return self.compute_overlap()
+
+    def compute_overlap(self) -> sp.csr_matrix:
+        # the overlap, computed on first use and from then on patched by update_products instead of recomputed
+        if self._overlap is None:
+            shared = self.incidence @ self.incidence.T
+            self._overlap = sp.triu(shared, k=1, format="csr")
+            self._overlap.eliminate_zeros()
+            self._overlap.sort_indices()
+        return self._overlap
+
+    def common_pairs(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # (first product ids, second product ids, shared ingredient counts) for every unordered pair
+        # that shares at least one ingredient, ordered by first then second product id
+        overlap = self.overlap.tocoo()
+        order = np.lexsort((overlap.col, overlap.row))
+        return overlap.row[order], overlap.col[order], overlap.data[order]
+
+    def common_ingredients(self, product_id: int, other_product_id: int) -> set[str]:
+        incidence = self.incidence
+        ingredient_ids = np.intersect1d(
+            incidence.indices[incidence.indptr[product_id]:incidence.indptr[product_id + 1]],
+            incidence.indices[incidence.indptr[other_product_id]:incidence.indptr[other_product_id + 1]],
+            assume_unique=True,
+        )
+        return {self.ingredients[i] for i in ingredient_ids}
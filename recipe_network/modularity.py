@@ -1,73 +1,260 @@
+import heapq
+
 import networkx as nx
+import numpy as np
 
 
 # this class implements the algorithm from https://arxiv.org/pdf/cond-mat/0408187
 # "Finding community structure in very large networks" by Clauset, Newman, and Moore (2004)
+# directed graphs are treated as undirected, weights of u->v and v->u are summed into one edge
+# edge weights are read from the `weight` attribute (1 when missing or when weight is None)
+# resolution scales the null model term the same way networkx does: Q = ∑i (eii - resolution * ai^2)
 class GraphModularization:
-    def __init__(self, G: nx.Graph) -> None:
+    def __init__(self, G: nx.Graph, weight: str | None = "quantity", resolution: float = 1.0) -> None:
         self.graph = G
-        self.m = G.number_of_edges()
-        if self.m == 0:
-            raise ValueError("Graph must have at least one edge to compute modularity.")
+        self.weight = weight
+        self.resolution = resolution
+
+        # communities start out as single vertices, identified by contiguous integer ids
+        self._setup_adjacency(list(G.nodes()))
+        node_ids = self.node_ids
+        for u, v, data in G.edges(data=True):
+            w = data.get(weight, 1) if weight is not None else 1
+            self._add_edge(node_ids[u], node_ids[v], w)
 
         self._setup_data_structures()
 
+    @classmethod
+    def from_edges(cls, n_nodes: int, sources: np.ndarray, targets: np.ndarray, weights: np.ndarray | None = None, resolution: float = 1.0) -> "GraphModularization":
+        # straight from integer edge arrays over nodes 0..n_nodes-1 (e.g. RecipeTable.unique_edges), no networkx graph,
+        # the communities returned are sets of those node ids
+        engine = cls.__new__(cls)
+        engine.graph = None
+        engine.weight = None
+        engine.resolution = resolution
+
+        engine._setup_adjacency(range(n_nodes))
+        if weights is None:
+            weights = np.ones(len(sources))
+        for u, v, w in zip(np.asarray(sources).tolist(), np.asarray(targets).tolist(), np.asarray(weights).tolist()):
+            engine._add_edge(u, v, w)
+
+        engine._setup_data_structures()
+        return engine
+
+    def _setup_adjacency(self, nodes) -> None:
+        self.nodes = list(nodes)
+        self.node_ids = {node: i for i, node in enumerate(self.nodes)}
+        self.n = len(self.nodes)
+
+        # undirected weighted adjacency, adjacency[u][v] = total weight between u and v
+        self.adjacency = [dict() for _ in range(self.n)]
+        self.degrees = [0.0] * self.n
+        self.m = 0.0
+
+    def _add_edge(self, u: int, v: int, w: float) -> None:
+        self.adjacency[u][v] = self.adjacency[u].get(v, 0) + w
+        if u != v:
+            self.adjacency[v][u] = self.adjacency[v].get(u, 0) + w
+        # a self loop adds its weight to both ends of the edge, i.e. twice to the same vertex
+        self.degrees[u] += w
+        self.degrees[v] += w
+        self.m += w
+
     def _setup_data_structures(self):
+        if self.m == 0:
+            raise ValueError("Graph must have at least one edge to compute modularity.")
+
         # algorithm needs to maintain 3 data structures
         # 1. a sparse matrix of delta Q values for each pair of communities with at least one edge between them
-        #   - each row of the matrix is stored both as a balanced binary tree and as a max-heap so the largest can be found in constant time
+        #   - each row of the matrix is stored both as a dict (in place of the balanced binary tree) and as a
+        #     max-heap so the largest can be found in constant time
         # 2. a max-heap, H, of the largest delta Q value in each row of the matrix
         # 3. a vector array, a, where ai is the fraction of edges connected to vertices in community i
-        
-        self.dq_matrix = {}
+        # heapq is a min-heap so every heap stores negated delta Q values, stale heap entries are
+        # skipped lazily by checking them against the dict row
+
+        two_m = 2 * self.m
+        self.a_vector = [k / two_m for k in self.degrees]           # [Eq. 6] ai = ki/2m
+
+        self.dq_matrix = []
         self.dq_max_heap = []
+        for i in range(self.n):
+            # [Eq. 8] ΔQij = 2(eij - ai aj) for every connected pair, eij = Aij/2m
+            row = {
+                j: 2 * (w / two_m - self.resolution * self.a_vector[i] * self.a_vector[j])
+                for j, w in self.adjacency[i].items() if j != i
+            }
+            self.dq_matrix.append(row)
+            heap = [(-dq, j) for j, dq in row.items()]
+            heapq.heapify(heap)
+            self.dq_max_heap.append(heap)
+
         self.h_max_heap = []
-        self.a_vector = []
-        
-        # on top of the data structures, the degree of each vertex in the graph is also needed
-        self.degrees = dict(self.graph.degree())
-    
-    def _edge_fraction_comm_ij(self, i: int, j: int) -> float:
-        # Compute the fraction of edges between communities i and j
-
-        # [Eq. 5] eij = 1/2m ∑vw Avw δ(cv , i)δ(cw , j)
-        edges_ij = self.graph.subgraph(self.graph.neighbors(i)).edges(self.graph.neighbors(j))
-        edge_fraction_ij = len(edges_ij) / (2 * self.m)
-        return edge_fraction_ij
-
-    def _frac_edges_comm_i(self, i: int) -> float:
-        # Compute the fraction of end of edges connected to vertices in community i
-
-        # [Eq. 6] ai = 1/2m ∑v kv δ(cv , i)
-        degree_sum_i = sum(dict(self.graph.degree(self.graph.neighbors(i))).values())
-        frac_edges_i = degree_sum_i / (2 * self.m)
-        return frac_edges_i
-    
-    def compute_modularity(self, communities: list[set]):
-        # compute the modularity Q of the current graph partitioning
-        
+        self.h_entries = [None] * self.n
+        for i in range(self.n):
+            self._push_row_max(i)
+
+        self.alive = [True] * self.n
+        self.Q = self.compute_modularity([{node} for node in self.nodes])
+
+        # merge dendrogram, each entry is (merged community, surviving community, ΔQ, Q after the merge)
+        self.dendrogram = []
+        self.best_level = 0
+        self.best_Q = self.Q
+
+    def _row_max(self, i: int):
+        # largest (ΔQ, j) in row i, dropping heap entries that no longer match the row
+        row = self.dq_matrix[i]
+        heap = self.dq_max_heap[i]
+        while heap:
+            neg_dq, j = heap[0]
+            if row.get(j) == -neg_dq:
+                return -neg_dq, j
+            heapq.heappop(heap)
+        return None
+
+    def _push_row_max(self, i: int) -> None:
+        # H only needs a new entry when the row maximum actually changed,
+        # the previous one is still sitting in H otherwise
+        row_max = self._row_max(i)
+        if row_max is not None and row_max != self.h_entries[i]:
+            dq, j = row_max
+            heapq.heappush(self.h_max_heap, (-dq, i, j))
+        self.h_entries[i] = row_max
+
+    def _update_dq(self, k: int, old: int, new: int, dq: float) -> None:
+        # row k loses its entry for the merged community `old` and gets `new` set to dq
+        row = self.dq_matrix[k]
+        row.pop(old, None)
+        row[new] = dq
+        heap = self.dq_max_heap[k]
+        heapq.heappush(heap, (-dq, new))
+
+        # keep lazily deleted entries from piling up in long-lived rows
+        if len(heap) > 4 * len(row) + 16:
+            heap[:] = [(-value, j) for j, value in row.items()]
+            heapq.heapify(heap)
+
+        self._push_row_max(k)
+
+    def _merge(self, i: int, j: int, dq_ij: float) -> None:
+        # merge community i into community j, updating row j and every row that references i or j
+        row_i = self.dq_matrix[i]
+        row_j = self.dq_matrix[j]
+        a_i = self.a_vector[i]
+        a_j = self.a_vector[j]
+        gamma = self.resolution
+
+        row_i.pop(j, None)
+        row_j.pop(i, None)
+
+        new_row = {}
+        for k, dq_ik in row_i.items():
+            if k in row_j:
+                # [Eq. 10a] k connected to both i and j
+                new_row[k] = dq_ik + row_j[k]
+            else:
+                # [Eq. 10b] k connected to i but not to j
+                new_row[k] = dq_ik - 2 * gamma * a_j * self.a_vector[k]
+        for k, dq_jk in row_j.items():
+            if k not in row_i:
+                # [Eq. 10c] k connected to j but not to i
+                new_row[k] = dq_jk - 2 * gamma * a_i * self.a_vector[k]
+
+        # the delta Q matrix is symmetric, mirror the new row into the affected rows
+        for k, dq_jk in new_row.items():
+            self._update_dq(k, i, j, dq_jk)
+
+        self.dq_matrix[j] = new_row
+        heap = [(-dq, k) for k, dq in new_row.items()]
+        heapq.heapify(heap)
+        self.dq_max_heap[j] = heap
+        self._push_row_max(j)
+
+        self.dq_matrix[i] = {}
+        self.dq_max_heap[i] = []
+        self.h_entries[i] = None
+        self.alive[i] = False
+
+        # [Eq. 10] aj' = aj + ai
+        self.a_vector[j] = a_i + a_j
+        self.a_vector[i] = 0.0
+
+        self.Q += dq_ij
+        self.dendrogram.append((i, j, dq_ij, self.Q))
+        if self.Q > self.best_Q:
+            self.best_Q = self.Q
+            self.best_level = len(self.dendrogram)
+
+    def compute_modularity(self, communities: list[set]) -> float:
+        # compute the modularity Q of a partition of the graph into communities of node labels
+
+        community_of = {}
+        for c, community in enumerate(communities):
+            for node in community:
+                community_of[self.node_ids[node]] = c
+
+        internal = [0.0] * len(communities)
+        degree_sum = [0.0] * len(communities)
+        for u in range(self.n):
+            c = community_of[u]
+            degree_sum[c] += self.degrees[u]
+            for v, w in self.adjacency[u].items():
+                if v >= u and community_of[v] == c:
+                    internal[c] += w
+
         Q = 0.0
-        for i in range(len(communities)):
-            e_ii = self._edge_fraction_comm_ij(i, i)  # [Eq. 5]
-            a_i = self._frac_edges_comm_i(i)          # [Eq. 6]
-            Q += e_ii - (a_i ** 2)                    # [Eq. 4] Q = ∑i (eii - ai^2)
+        for c in range(len(communities)):
+            e_ii = internal[c] / self.m                 # [Eq. 5] eii, both directions of every internal edge
+            a_i = degree_sum[c] / (2 * self.m)          # [Eq. 6] ai = 1/2m ∑v kv δ(cv , i)
+            Q += e_ii - self.resolution * (a_i ** 2)    # [Eq. 4] Q = ∑i (eii - ai^2)
 
         return Q
 
-    def modularity_maximization(self):
+    def modularity_maximization(self, full_dendrogram: bool = True) -> list[frozenset]:
         # algorithm to maximize modularity by merging communities
         # 1. calculate initial delta Q values for all pairs of communities connected by at least one edge
         # 2. while there are pairs of communities with positive delta Q values:
         #    a. find the pair of communities with the largest delta Q value
-        # 3. repeat step 2 until only one community remains
-        
-        # calculate initial delta Q values
-        communities = []
-        for i in range(self.m):
-            for j in range(i + 1, self.m):
-                if self.graph.has_edge(i, j):
-                    delta_Q = self.compute_modularity(i, j)
-                    self.dq_matrix[(i, j)] = delta_Q
-                    self.dq_max_heap.append((delta_Q, i, j))
-
-        pass
\ No newline at end of file
+        #    b. merge them and update the delta Q matrix, the heaps and a
+        # 3. with full_dendrogram, keep merging (with negative delta Q) until every connected component
+        #    is a single community, so the whole merge tree is recorded
+        # returns the communities at the level of the dendrogram with the highest Q
+
+        while self.h_max_heap:
+            neg_dq, i, j = heapq.heappop(self.h_max_heap)
+            dq = -neg_dq
+            if self.h_entries[i] == (dq, j):
+                self.h_entries[i] = None
+            if not self.alive[i] or self.dq_matrix[i].get(j) != dq:
+                continue
+            if dq < 0 and not full_dendrogram:
+                break
+
+            # merge the smaller row into the larger one so updates touch as few entries as possible
+            if len(self.dq_matrix[i]) > len(self.dq_matrix[j]):
+                i, j = j, i
+            self._merge(i, j, dq)
+
+        return self.communities_at(self.best_level)
+
+    def communities_at(self, level: int) -> list[frozenset]:
+        # replay the first `level` merges of the dendrogram and return the resulting communities,
+        # largest first, the same shape nx.community.greedy_modularity_communities returns
+        parent = list(range(self.n))
+
+        def find(x: int) -> int:
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        for i, j, _, _ in self.dendrogram[:level]:
+            parent[find(i)] = find(j)
+
+        members = {}
+        for u in range(self.n):
+            members.setdefault(find(u), []).append(self.nodes[u])
+
+        return sorted((frozenset(nodes) for nodes in members.values()), key=len, reverse=True)
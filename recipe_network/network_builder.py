@@ -1,66 +1,102 @@
-import json
+import time
 from pathlib import Path
 
 import igraph
 import matplotlib.pyplot as plt
 
+from recipe_network.graph_cache import GraphCache
+from utils import instrumentation
 from utils.logging import Logger, LogLevel
+from utils.recipe_table import RecipeTable
+from utils.recipes import load_recipes
 
 class RecipeNetwork:
-    def __init__(self, data_dir: str|Path, logger: Logger) -> None:
+    def __init__(self, data_dir: str|Path, logger: Logger, cache_dir: str|Path|None = None) -> None:
         self.data_dir = data_dir
         self._logger = logger
         self.network = igraph.Graph(directed=True)
+        self._cache = GraphCache(cache_dir, logger) if cache_dir is not None else None
     
     def import_network_from_json(self, *filenames: str) -> None:
         # read json for recipes generated from data_manipulation module
         # converts json into graph structure using igraph module
-        # this graph can then be saved into a .gml file to skip the json parsing step later
+        # the parsed recipe table is cached as compact arrays keyed on the json contents,
+        # so later runs with unchanged json skip the parsing step entirely
         self._logger(LogLevel.INFO, "=" * 100, reset=True)        
+        start = time.perf_counter()
+
+        cache_key, table = self._cache.lookup([Path(self.data_dir) / filename for filename in filenames]) if self._cache is not None else (None, None)
+        if table is not None:
+            self._build_network_from_table(table)
+            self._logger(LogLevel.INFO, f"Network loaded from cache in {time.perf_counter() - start:.3f}s")
+            return
         
         file_data = []
-        for filename in filenames:
-            self._logger(LogLevel.INFO, f"Starting to parse json from file: {filename}")
-            try:
-                with open(f"{self.data_dir}/{filename}", "r") as network_file:
-                    file_data.append(json.load(network_file))
+        with instrumentation.span("json load", files=list(filenames)):
+            for filename in filenames:
+                self._logger(LogLevel.INFO, f"Starting to parse json from file: {filename}")
+                try:
+                    file_data.append(load_recipes(f"{self.data_dir}/{filename}"))
                     assert file_data[-1] is not None
-            except Exception as e:
-                self._logger(LogLevel.ERROR, f"Failed to parse json from file: {filename}. Error: {e}")
-                return
-            self._logger(LogLevel.INFO, f"Finished parsing json from file: {filename}")
+                except Exception as e:
+                    self._logger(LogLevel.ERROR, f"Failed to parse json from file: {filename}. Error: {e}")
+                    return
+                self._logger(LogLevel.INFO, f"Finished parsing json from file: {filename}")
         
         network_data = []
         for data in file_data:
             network_data.extend(data)
-            
-        self._logger(LogLevel.INFO, f"Converting json data into igraph network")
 
-        edges = []
-        edge_attributes = {
-            "quantity" : []
-        }
+        self._build_network(network_data)
+        self._logger(LogLevel.INFO, f"Network built from json in {time.perf_counter() - start:.3f}s")
 
-        for data in network_data:
-            name = data.get("product")
-            self.network.add_vertex(name, label=name)
-            self._logger(LogLevel.TRACE, f"Product added: {name}")
+        if cache_key is not None:
+            self._cache.save(cache_key, self.recipe_table)
 
-            dependencies = data.get("ingredients")
-            for ingredient, quantity in dependencies.items():
-                try:
-                    self.network.vs.find(name=ingredient)
-                    self._logger(LogLevel.TRACE, f"Ingredient already in network: {ingredient}")
-                except:
-                    self.network.add_vertex(ingredient, label=ingredient)
-                    self._logger(LogLevel.TRACE, f"Ingredient implicitly added: {ingredient}")
-
-                edges.append((name, ingredient))
-                edge_attributes["quantity"].append(quantity)
-        self.network.add_edges(edges, edge_attributes)
-        
+    def import_network_from_files(self, source: str | Path, max_workers: int | None = None) -> None:
+        # parallel alternative to import_network_from_json for many recipe files (base game plus mod packs)
+        # source is a directory, glob pattern or single file of .csv/.json/.ndjson recipes, the files are
+        # parsed concurrently in a process pool and merged in sorted path order
+        from data_manipulation.ingestion import find_recipe_files, ingest_recipe_files
+
+        self._logger(LogLevel.INFO, "=" * 100, reset=True)
+        start = time.perf_counter()
+
+        paths = find_recipe_files(source)
+        if not paths:
+            self._logger(LogLevel.ERROR, f"No recipe files found for: {source}")
+            return
+
+        cache_key, table = self._cache.lookup(paths) if self._cache is not None else (None, None)
+        if table is None:
+            try:
+                table = ingest_recipe_files(paths, self._logger, max_workers)
+            except Exception as e:
+                self._logger(LogLevel.ERROR, f"Failed to ingest recipe files from: {source}. Error: {e}")
+                return
+            if cache_key is not None:
+                self._cache.save(cache_key, table)
+
+        self._build_network_from_table(table)
+        self._logger(LogLevel.INFO, f"Network built from {len(paths)} files in {time.perf_counter() - start:.3f}s")
+
+    def _build_network(self, network_data: list[dict]) -> None:
+        self._logger(LogLevel.INFO, "Converting json data into recipe table")
+        self._build_network_from_table(RecipeTable.from_records(network_data))
+
+    @instrumentation.stage("graph build")
+    def _build_network_from_table(self, table: RecipeTable) -> None:
+        # build the whole igraph network in one call from the table's integer item ids,
+        # construction is linear in the number of recipes and ingredients
+        self._logger(LogLevel.INFO, "Converting recipe table into igraph network")
+        self.recipe_table = table
+        self.network = table.to_igraph()
+        self.vertex_ids = table.name_ids
+
+        self._logger(LogLevel.INFO, f"igraph network has {self.network.vcount()} vertices and {self.network.ecount()} edges")
         self._logger(LogLevel.INFO, "=" * 100)
 
+    @instrumentation.stage("plot")
     def plot_network(self):
         fig = plt.figure(0)
         fig.add_subplot()
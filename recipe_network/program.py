@@ -1,26 +1,46 @@
-# import the shared paths from config.py
 import sys
 from pathlib import Path
-sys.path.insert(0, str(Path(__file__).parent.parent))
-from config import FINAL_DATA_DIR, LOGGING_DIR, LOG_LEVELS, GRAPH_OUTPUT_DIR
+if __package__ in (None, ""):
+    # run as a script instead of through the dsp-network command (cli.py), import the shared paths from config.py
+    sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import FINAL_DATA_DIR, LOGGING_DIR, LOG_LEVELS, GRAPH_OUTPUT_DIR, CACHE_DIR, PROFILING_DIR
+from utils.instrumentation import recording
 from utils.logging import Logger
+from utils.recipes import recipe_filenames
 
-from network_builder import RecipeNetwork
-from graph_builder import GraphBuilder
+# the builders are imported by the functions using them: RecipeNetwork pulls in igraph and matplotlib,
+# GraphBuilder networkx and scipy, and neither program needs the other's
 
 def build_igraph_network():
-    recipe_network = RecipeNetwork(FINAL_DATA_DIR, logger=Logger(LOGGING_DIR, "igraph_network.log", LOG_LEVELS))
-    recipe_network.import_network_from_json("items.json", "buildings.json")
+    from recipe_network.network_builder import RecipeNetwork
+
+    recipe_network = RecipeNetwork(FINAL_DATA_DIR, logger=Logger(LOGGING_DIR, "igraph_network.log", LOG_LEVELS), cache_dir=CACHE_DIR)
+    recipe_network.import_network_from_json(*recipe_filenames(FINAL_DATA_DIR))
     recipe_network.plot_network()
-    
-def build_pyviz_network():
-    graph_builder = GraphBuilder(FINAL_DATA_DIR, GRAPH_OUTPUT_DIR, "pyviz_graph", logger=Logger(LOGGING_DIR, "pyvis_graph_builder.log", LOG_LEVELS))
-    graph_builder.import_network_from_json("items.json", "buildings.json")
-    graph_builder.partition_into_clusters()
-    graph_builder.build_pyviz_graph()
-    graph_builder.print_items_summary()
-    graph_builder.partition_into_common_ingredient_clusters()
+
+def pyviz_graph_builder():
+    # the builder every pyvis program (and the dsp-network subcommands) works on, nothing imported yet
+    from recipe_network.graph_builder import GraphBuilder
+
+    return GraphBuilder(FINAL_DATA_DIR, GRAPH_OUTPUT_DIR, "pyviz_graph", logger=Logger(LOGGING_DIR, "pyvis_graph_builder.log", LOG_LEVELS), cache_dir=CACHE_DIR)
+
+def build_pyviz_network(report: bool = False, profile: bool = False, trace_allocations: bool = False):
+    # report writes the per-stage timings and memory to profiles/pyviz_graph_trace.json (open it in ui.perfetto.dev),
+    # profile adds a cProfile dump next to it, trace_allocations the tracemalloc peak of every stage
+    with recording(PROFILING_DIR / "pyviz_graph_trace.json" if report or profile or trace_allocations else None, profile=profile, trace_allocations=trace_allocations):
+        graph_builder = pyviz_graph_builder()
+        graph_builder.import_network_from_json(*recipe_filenames(FINAL_DATA_DIR))
+        graph_builder.partition_into_clusters()
+        graph_builder.build_pyviz_graph()
+        graph_builder.print_items_summary()
+        graph_builder.partition_into_common_ingredient_clusters()
+        graph_builder.save_snapshot()
+
+def update_pyviz_network():
+    # after editing the recipe data, apply only the changes to the last build and re-render what changed
+    graph_builder = pyviz_graph_builder()
+    graph_builder.update_network_from_json(*recipe_filenames(FINAL_DATA_DIR))
 
 if __name__ == "__main__":
     # build_igraph_network()
-    build_pyviz_network()
\ No newline at end of file
+    build_pyviz_network()
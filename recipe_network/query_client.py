@@ -0,0 +1,95 @@
+# command line client of the recipe query server (recipe_network/query_server.py), standard library only so
+# that asking a question costs a connection rather than the numpy / networkx imports
+#   python recipe_network/query_client.py ingredients "Processor"
+#   python recipe_network/query_client.py shared "Processor" --min-common 2
+#   python recipe_network/query_client.py neighborhood "Iron Ingot" --hops 2 --direction upstream
+#   python recipe_network/query_client.py requirements "Universe Matrix" --rate 60
+
+import sys
+from pathlib import Path
+if __package__ in (None, ""):
+    # run as a script instead of through the dsp-network command (cli.py), import the shared paths from config.py
+    sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argparse
+import json
+import socket
+
+from config import QUERY_HOST, QUERY_PORT
+
+# seconds to wait for the server, the first (uncached) query of a big graph can take a while
+QUERY_TIMEOUT = 60.0
+
+class QueryClient:
+    # one connection to the server, reused for every query sent through it
+    def __init__(self, host: str = QUERY_HOST, port: int = QUERY_PORT, socket_path: Path | None = None, timeout: float = QUERY_TIMEOUT) -> None:
+        if socket_path is not None:
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.settimeout(timeout)
+            self._socket.connect(str(socket_path))
+        else:
+            self._socket = socket.create_connection((host, port), timeout=timeout)
+            self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._responses = self._socket.makefile("rb")
+
+    def __enter__(self) -> "QueryClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._responses.close()
+        self._socket.close()
+
+    def query(self, query: str, **fields):
+        # the result of one query, raises ValueError with the server's message when it fails
+        self._socket.sendall(json.dumps({"query": query, **fields}).encode("utf-8") + b"\n")
+        line = self._responses.readline()
+        if not line:
+            raise ConnectionError("Query server closed the connection")
+        response = json.loads(line)
+        if not response["ok"]:
+            raise ValueError(response["error"])
+        return response["result"]
+
+def main(argv: list[str] | None = None, prog: str | None = None) -> int:
+    parser = argparse.ArgumentParser(prog=prog, description="query the recipe graph server")
+    parser.add_argument("--host", default=QUERY_HOST)
+    parser.add_argument("--port", type=int, default=QUERY_PORT)
+    parser.add_argument("--socket", type=Path, default=None, help="connect to this Unix socket instead of TCP")
+    queries = parser.add_subparsers(dest="query", required=True)
+    queries.add_parser("ingredients", help="ingredients of an item").add_argument("item")
+    queries.add_parser("products_using", aliases=["users"], help="products made from an item").add_argument("item")
+    neighborhood = queries.add_parser("neighborhood", help="items within a number of recipe steps")
+    neighborhood.add_argument("item")
+    neighborhood.add_argument("--hops", type=int, default=1)
+    neighborhood.add_argument("--direction", choices=["downstream", "upstream", "both"], default="both")
+    shared = queries.add_parser("shared_ingredients", aliases=["shared"], help="products sharing ingredients with an item")
+    shared.add_argument("item")
+    shared.add_argument("--min-common", type=int, default=1)
+    queries.add_parser("community", aliases=["district"], help="the community an item is in").add_argument("item")
+    requirements = queries.add_parser("requirements", aliases=["bom"], help="raw materials to make an item")
+    requirements.add_argument("item")
+    requirements.add_argument("--rate", type=float, default=1.0)
+    queries.add_parser("stats", help="graph size and cache statistics")
+    args = vars(parser.parse_args(argv))
+
+    connection = {"host": args.pop("host"), "port": args.pop("port"), "socket_path": args.pop("socket")}
+    # aliases come through as typed, the query is named after the subparser's first name
+    query = {"users": "products_using", "shared": "shared_ingredients", "district": "community", "bom": "requirements"}.get(args["query"], args["query"])
+    del args["query"]
+    try:
+        with QueryClient(**connection) as client:
+            result = client.query(query, **args)
+    except OSError as e:
+        print(f"Cannot reach the query server: {e}", file=sys.stderr)
+        return 2
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+# long running query server over the recipe graph, loads the graph, communities, ingredient overlap and
+# requirement solver once and answers queries from memory instead of rerunning program.py for every question
+#   python recipe_network/query_server.py [--port N | --socket PATH] [--backend leiden] [--recluster]
+#   python recipe_network/query_client.py community "Processor"
+# protocol: one json object per line each way, over TCP on localhost or a Unix socket, connections stay open
+#   {"query": "shared_ingredients", "item": "Processor", "min_common": 2}
+#   {"ok": true, "result": ...} or {"ok": false, "error": "..."}
+# identical requests are answered from an LRU cache of encoded responses, so a warm query costs a dict lookup
+
+import sys
+from pathlib import Path
+if __package__ in (None, ""):
+    # run as a script instead of through the dsp-network command (cli.py), import the shared paths from config.py
+    sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argparse
+import asyncio
+import functools
+import json
+import math
+import time
+
+import networkx as nx
+import numpy as np
+
+from config import FINAL_DATA_DIR, LOGGING_DIR, LOG_LEVELS, GRAPH_OUTPUT_DIR, CACHE_DIR, QUERY_HOST, QUERY_PORT
+from recipe_network.graph_builder import GraphBuilder
+from utils.logging import Logger, LogLevel
+from utils.recipes import recipe_filenames
+
+QUERY_CACHE_SIZE = 4096
+# the largest neighborhood a query may ask for, whole closures of big recipe sets make for huge responses
+MAX_HOPS = 16
+# asyncio's default line limit is 64 KiB, requests are small but names are user supplied
+MAX_REQUEST_BYTES = 1 << 20
+# the json type every request field must have, checked before a query runs
+QUERY_FIELDS = {"item": str, "direction": str, "hops": int, "min_common": int, "rate": float}
+
+def _check_fields(fields: dict) -> dict:
+    # fields with numbers as the queries expect them, ValueError naming the field otherwise
+    # (json true/false would pass as python ints, and integers are fine where a float is expected)
+    checked = {}
+    for field, value in fields.items():
+        expected = QUERY_FIELDS.get(field)
+        if expected is None:
+            raise ValueError(f"Unknown field {field}, expected some of {', '.join(QUERY_FIELDS)}")
+        if expected is float and isinstance(value, int) and not isinstance(value, bool):
+            value = float(value)
+        if not isinstance(value, expected) or isinstance(value, bool):
+            raise ValueError(f"{field} must be {'a string' if expected is str else 'an integer' if expected is int else 'a number'}, got {json.dumps(value)}")
+        if expected is float and not math.isfinite(value):
+            raise ValueError(f"{field} must be finite, got {value}")
+        checked[field] = value
+    return checked
+
+class RecipeQueryService:
+    # the queries the server answers, on a builder whose graph (and ideally communities) are already loaded
+    # every query takes the request's fields as keyword arguments and returns json serializable data
+    # the cache is only valid while the builder does not change, build a new service after updating the graph
+    QUERIES = ("ingredients", "products_using", "neighborhood", "shared_ingredients", "community", "requirements", "stats")
+
+    def __init__(self, graph_builder: GraphBuilder, cache_size: int = QUERY_CACHE_SIZE) -> None:
+        self.graph_builder = graph_builder
+        self.graph = graph_builder.nx_graph
+        self.started = time.time()
+
+        # everything a query may need, computed up front so no query pays for it
+        index = graph_builder.ingredient_index
+        overlap = index.overlap
+        self.shared = (overlap + overlap.T).tocsr()
+        self.shared.sort_indices()
+        self.solver = graph_builder.requirement_solver()
+        self.communities = [sorted(community) for community in graph_builder.communities]
+        labels = graph_builder.community_labels()
+        self.community_ids = {} if labels is None else dict(zip(graph_builder.recipe_table.names, labels.tolist()))
+
+        self._cached_response = functools.lru_cache(maxsize=cache_size)(self._response)
+
+    def _node(self, item: str) -> str:
+        if item not in self.graph:
+            raise ValueError(f"Unknown item {item}")
+        return item
+
+    def ingredients(self, item: str) -> dict[str, int]:
+        return {ingredient: data["quantity"] for ingredient, data in self.graph[self._node(item)].items()}
+
+    def products_using(self, item: str) -> dict[str, int]:
+        return {product: data["quantity"] for product, data in self.graph.pred[self._node(item)].items()}
+
+    def neighborhood(self, item: str, hops: int = 1, direction: str = "both") -> dict[str, int]:
+        # items within hops recipe steps, item name -> steps, direction follows RequirementSolver:
+        # downstream is what item is made from, upstream what is made from it, both ignores the direction
+        if not 0 <= hops <= MAX_HOPS:
+            raise ValueError(f"hops must be between 0 and {MAX_HOPS}")
+        graphs = {"downstream": self.graph, "upstream": self.graph.reverse(copy=False), "both": self.graph.to_undirected(as_view=True)}
+        if direction not in graphs:
+            raise ValueError(f"Unknown direction {direction}, expected one of {', '.join(graphs)}")
+        return nx.single_source_shortest_path_length(graphs[direction], self._node(item), cutoff=hops)
+
+    def shared_ingredients(self, item: str, min_common: int = 1) -> list[dict]:
+        # products sharing at least min_common ingredients with item, most shared first
+        index = self.graph_builder.ingredient_index
+        product_id = index.product_ids.get(self._node(item))
+        if product_id is None:
+            return []
+        start, end = self.shared.indptr[product_id], self.shared.indptr[product_id + 1]
+        others, counts = self.shared.indices[start:end], self.shared.data[start:end]
+        keep = counts >= min_common
+        others, counts = others[keep], counts[keep]
+        order = np.lexsort((others, -counts))
+        return [
+            {"product": index.products[other], "common": sorted(index.common_ingredients(product_id, other))}
+            for other in others[order].tolist()
+        ]
+
+    def community(self, item: str) -> dict:
+        # the district of item and everything in it
+        community_id = self.community_ids.get(self._node(item))
+        if community_id is None:
+            raise ValueError("No communities loaded, run partition_into_clusters (or start the server with --recluster)")
+        return {"community": community_id, "members": self.communities[community_id]}
+
+    def requirements(self, item: str, rate: float = 1.0) -> dict[str, float]:
+        # raw materials per rate units of item, see RequirementSolver.requirements
+        return self.solver.requirements(self._node(item), rate)
+
+    def stats(self) -> dict:
+        cache = self._cached_response.cache_info()
+        return {
+            "items": self.graph.number_of_nodes(),
+            "edges": self.graph.number_of_edges(),
+            "communities": len(self.communities),
+            "uptime_s": time.time() - self.started,
+            "cache": {"hits": cache.hits, "misses": cache.misses, "size": cache.currsize, "max_size": cache.maxsize},
+        }
+
+    def _response(self, request: str) -> bytes:
+        # request is the canonical json of the request object, which makes it the cache key
+        fields = json.loads(request)
+        query = fields.pop("query", None)
+        if query not in self.QUERIES:
+            return _encode({"ok": False, "error": f"Unknown query {query}, expected one of {', '.join(self.QUERIES)}"})
+        try:
+            return _encode({"ok": True, "result": getattr(self, query)(**_check_fields(fields))})
+        except (ValueError, KeyError, TypeError) as e:
+            return _encode({"ok": False, "error": str(e)})
+
+    def respond(self, line: bytes) -> bytes:
+        # one encoded response line for one request line, stats are never cached
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            return _encode({"ok": False, "error": f"Invalid json: {e}"})
+        if not isinstance(request, dict):
+            return _encode({"ok": False, "error": "Expected a json object"})
+        if request.get("query") == "stats":
+            return self._response(json.dumps(request))
+        return self._cached_response(json.dumps(request, sort_keys=True))
+
+def _encode(response: dict) -> bytes:
+    return json.dumps(response, separators=(",", ":")).encode("utf-8") + b"\n"
+
+def load_service(backend: str = "leiden", recluster: bool = False, logger: Logger | None = None) -> RecipeQueryService:
+    # the graph and communities of the last build (its snapshot) when there is one of the current json,
+    # otherwise imported and clustered
+    logger = logger or Logger(LOGGING_DIR, "query_server.log", LOG_LEVELS)
+    graph_builder = GraphBuilder(FINAL_DATA_DIR, GRAPH_OUTPUT_DIR, "pyviz_graph", logger=logger, cache_dir=CACHE_DIR)
+    start = time.perf_counter()
+    filenames = recipe_filenames(FINAL_DATA_DIR)
+    if recluster or not graph_builder.load_snapshot(*filenames):
+        graph_builder.import_network_from_json(*filenames)
+        graph_builder.partition_into_clusters(backend=backend)
+    service = RecipeQueryService(graph_builder)
+    logger(LogLevel.INFO, f"Query service ready with {service.graph.number_of_nodes()} items and {len(service.communities)} communities in {time.perf_counter() - start:.3f}s")
+    return service
+
+async def _handle_connection(service: RecipeQueryService, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        while line := await reader.readline():
+            if line.strip():
+                writer.write(service.respond(line))
+                await writer.drain()
+    except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+        # ValueError is readline's way of saying a line went over MAX_REQUEST_BYTES
+        pass
+    finally:
+        writer.close()
+
+async def serve(service: RecipeQueryService, host: str = QUERY_HOST, port: int = QUERY_PORT, socket_path: Path | None = None) -> None:
+    # answer queries until cancelled, on the Unix socket when socket_path is given, else TCP on host:port
+    handler = functools.partial(_handle_connection, service)
+    if socket_path is not None:
+        socket_path = Path(socket_path)
+        socket_path.unlink(missing_ok=True)
+        server = await asyncio.start_unix_server(handler, path=str(socket_path), limit=MAX_REQUEST_BYTES)
+    else:
+        server = await asyncio.start_server(handler, host=host, port=port, limit=MAX_REQUEST_BYTES)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if socket_path is not None:
+            socket_path.unlink(missing_ok=True)
+
+def run_server(host: str = QUERY_HOST, port: int = QUERY_PORT, socket_path: Path | None = None, backend: str = "leiden", recluster: bool = False) -> None:
+    logger = Logger(LOGGING_DIR, "query_server.log", LOG_LEVELS)
+    service = load_service(backend, recluster, logger)
+    logger(LogLevel.INFO, f"Serving recipe queries on {socket_path or f'{host}:{port}'}")
+    logger.flush()
+    try:
+        asyncio.run(serve(service, host, port, socket_path))
+    except KeyboardInterrupt:
+        pass
+    logger(LogLevel.INFO, "Query server stopped")
+    logger.flush()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="recipe graph query server")
+    parser.add_argument("--host", default=QUERY_HOST)
+    parser.add_argument("--port", type=int, default=QUERY_PORT)
+    parser.add_argument("--socket", type=Path, default=None, help="serve on this Unix socket instead of TCP")
+    parser.add_argument("--backend", default="leiden", help="clustering backend when there is no snapshot to load")
+    parser.add_argument("--recluster", action="store_true", help="import and cluster the json instead of loading the last snapshot")
+    args = parser.parse_args()
+    run_server(args.host, args.port, args.socket, args.backend, args.recluster)
@@ -0,0 +1,223 @@
+import mmap
+import struct
+from pathlib import Path
+
+import numpy as np
+
+from utils.recipe_table import RecipeTable
+
+# on-disk recipe graph read through a memory map, for analyses that only touch part of a huge (mod merged) recipe set
+# and for worker processes sharing one copy of it in the page cache instead of each loading the graph
+# layout, little-endian:
+#   header    magic, version, item / recipe / edge counts, then (offset, length) of every section below
+#   sections  each starting on a SECTION_ALIGNMENT byte boundary, in STORE_SECTIONS order:
+#     name_offsets, name_bytes    string table, the utf-8 name of item i is name_bytes[name_offsets[i]:name_offsets[i + 1]]
+#     name_order                  item ids sorted by their utf-8 names, for binary search lookups
+#     recipe_*                    the RecipeTable arrays as they are, alternate recipes included
+#     forward_*                   CSR product -> ingredient with quantities, the edges of nx_graph (RecipeTable.unique_edges)
+#     reverse_*                   the same edges as CSR ingredient -> product
+# opening reads the header only, every query reads the pages of the rows it touches
+STORE_MAGIC = b"RCPSTORE"
+STORE_FORMAT_VERSION = 1
+SECTION_ALIGNMENT = 64
+STORE_SECTIONS = (
+    ("name_offsets", "<i8"),
+    ("name_bytes", "u1"),
+    ("name_order", "<i4"),
+    ("recipe_products", "<i4"),
+    ("recipe_indptr", "<i4"),
+    ("recipe_ingredients", "<i4"),
+    ("recipe_quantities", "<i4"),
+    ("forward_indptr", "<i8"),
+    ("forward_indices", "<i4"),
+    ("forward_quantities", "<i4"),
+    ("reverse_indptr", "<i8"),
+    ("reverse_indices", "<i4"),
+    ("reverse_quantities", "<i4"),
+)
+_HEADER = struct.Struct("<8sIIQQQ" + "QQ" * len(STORE_SECTIONS))
+
+def _csr(n_rows: int, rows: np.ndarray, columns: np.ndarray, values: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # (indptr, columns, values) with the entries of every row in their original order
+    order = np.argsort(rows, kind="stable")
+    indptr = np.zeros(n_rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n_rows), out=indptr[1:])
+    return indptr, columns[order], values[order]
+
+class RecipeStore:
+    # read-only view of a store written by RecipeStore.write, e.g.
+    #   RecipeStore.write(path, graph_builder.recipe_table)
+    #   with RecipeStore(path) as store:
+    #       store.ingredients("Processor"), store.products_using("Iron Ingot"), store.upstream(["Iron Ingot"], hops=2)
+    # downstream / upstream follow RequirementSolver: downstream of an item is everything it is made from,
+    # upstream everything made from it
+    # pickles as its path, so process pool workers map the same file rather than receiving a copy of the graph
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        with open(self.path, "rb") as store_file:
+            # mapping an empty file fails, anything shorter than the header is rejected below
+            self._map = mmap.mmap(store_file.fileno(), 0, access=mmap.ACCESS_READ) if self.path.stat().st_size else b""
+        if len(self._map) < _HEADER.size:
+            raise ValueError(f"{self.path} is not a recipe store")
+        header = _HEADER.unpack(self._map[:_HEADER.size])
+        magic, version, _, self.n_items, self.n_recipes, self.n_edges = header[:6]
+        if magic != STORE_MAGIC:
+            raise ValueError(f"{self.path} is not a recipe store")
+        if version != STORE_FORMAT_VERSION:
+            raise ValueError(f"{self.path} is a version {version} recipe store, expected version {STORE_FORMAT_VERSION}")
+
+        sections = header[6:]
+        for (name, dtype), offset, length in zip(STORE_SECTIONS, sections[0::2], sections[1::2]):
+            if offset + length * np.dtype(dtype).itemsize > len(self._map):
+                raise ValueError(f"{self.path} is truncated")
+            setattr(self, name, np.frombuffer(self._map, dtype=dtype, count=length, offset=offset))
+        # names are sliced straight off the map, which is much cheaper than slicing the array
+        self._names_offset = sections[2]
+
+    def __reduce__(self):
+        return (RecipeStore, (self.path,))
+
+    def __enter__(self) -> "RecipeStore":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        # unmaps the file (an open mapping keeps it from being rewritten on Windows), the section arrays go with it,
+        # arrays still referenced elsewhere keep the map alive and closing raises BufferError
+        for name, _ in STORE_SECTIONS:
+            self.__dict__.pop(name, None)
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+
+    @staticmethod
+    def write(path: str | Path, table: RecipeTable) -> Path:
+        path = Path(path)
+        encoded = [name.encode("utf-8") for name in table.names]
+        name_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(name) for name in encoded], out=name_offsets[1:])
+        name_order = np.array(sorted(range(len(encoded)), key=encoded.__getitem__), dtype=np.int32)
+
+        sources, targets, quantities = table.unique_edges()
+        forward = _csr(table.n_items, sources, targets, quantities)
+        reverse = _csr(table.n_items, targets, sources, quantities)
+        arrays = (
+            name_offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8), name_order,
+            table.recipe_products, table.indptr, table.ingredients, table.quantities,
+            *forward, *reverse,
+        )
+        arrays = [np.ascontiguousarray(array, dtype=dtype) for array, (_, dtype) in zip(arrays, STORE_SECTIONS)]
+
+        sections = []
+        offset = _HEADER.size
+        for array in arrays:
+            offset += -offset % SECTION_ALIGNMENT
+            sections += [offset, len(array)]
+            offset += array.nbytes
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as store_file:
+            store_file.write(_HEADER.pack(STORE_MAGIC, STORE_FORMAT_VERSION, 0, table.n_items, table.n_recipes, len(sources), *sections))
+            for array, section_offset in zip(arrays, sections[0::2]):
+                store_file.write(b"\0" * (section_offset - store_file.tell()))
+                store_file.write(array.tobytes())
+        return path
+
+    def _name_key(self, item_id: int) -> bytes:
+        return self._map[self._names_offset + int(self.name_offsets[item_id]):self._names_offset + int(self.name_offsets[item_id + 1])]
+
+    def name(self, item_id: int) -> str:
+        return self._name_key(item_id).decode("utf-8")
+
+    def names(self, item_ids: np.ndarray) -> list[str]:
+        item_ids = np.asarray(item_ids, dtype=np.int64)
+        names_map, base = self._map, self._names_offset
+        return [
+            names_map[base + start:base + end].decode("utf-8")
+            for start, end in zip(self.name_offsets[item_ids].tolist(), self.name_offsets[item_ids + 1].tolist())
+        ]
+
+    def find(self, name: str) -> int | None:
+        # item id of name, binary search over the sorted name index, None when there is no such item
+        key = name.encode("utf-8")
+        low, high = 0, self.n_items
+        while low < high:
+            middle = (low + high) // 2
+            item_id = int(self.name_order[middle])
+            middle_key = self._name_key(item_id)
+            if middle_key == key:
+                return item_id
+            if middle_key < key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def item_id(self, name: str) -> int:
+        item_id = self.find(name)
+        if item_id is None:
+            raise ValueError(f"Unknown item {name}")
+        return item_id
+
+    def __contains__(self, name: str) -> bool:
+        return self.find(name) is not None
+
+    def _row(self, indptr: np.ndarray, indices: np.ndarray, quantities: np.ndarray, name: str) -> dict[str, int]:
+        item_id = self.item_id(name)
+        start, end = int(indptr[item_id]), int(indptr[item_id + 1])
+        return dict(zip(self.names(indices[start:end]), quantities[start:end].tolist()))
+
+    def ingredients(self, product: str) -> dict[str, int]:
+        # ingredient -> quantity, the out edges of product in nx_graph, empty for raw materials
+        return self._row(self.forward_indptr, self.forward_indices, self.forward_quantities, product)
+
+    def products_using(self, ingredient: str) -> dict[str, int]:
+        # product -> quantity of ingredient it takes, the in edges of ingredient in nx_graph
+        return self._row(self.reverse_indptr, self.reverse_indices, self.reverse_quantities, ingredient)
+
+    def recipes(self, product: str) -> list[dict[str, int]]:
+        # every recipe of product in table order, the last one being the one nx_graph uses
+        # scans recipe_products, the one query that reads a whole section
+        product_id = self.item_id(product)
+        bounds = self.recipe_indptr
+        return [
+            dict(zip(self.names(self.recipe_ingredients[bounds[recipe]:bounds[recipe + 1]]), self.recipe_quantities[bounds[recipe]:bounds[recipe + 1]].tolist()))
+            for recipe in np.flatnonzero(self.recipe_products == product_id).tolist()
+        ]
+
+    def _closure(self, indptr: np.ndarray, indices: np.ndarray, names: list[str], hops: int | None) -> dict[str, int]:
+        # breadth first over the CSR rows, reading only the rows of every frontier, item name -> hop distance
+        start_ids = np.unique([self.item_id(name) for name in names]).astype(np.int64)
+        distances = np.full(self.n_items, -1, dtype=np.int32)
+        distances[start_ids] = 0
+        frontier = start_ids
+        hop = 0
+        while frontier.size and (hops is None or hop < hops):
+            hop += 1
+            starts = indptr[frontier]
+            lengths = indptr[frontier + 1] - starts
+            entries = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(int(lengths.sum()))
+            neighbours = indices[entries]
+            frontier = np.unique(neighbours[distances[neighbours] < 0])
+            distances[frontier] = hop
+        reached = np.flatnonzero(distances >= 0)
+        return dict(zip(self.names(reached), distances[reached].tolist()))
+
+    def downstream(self, names: list[str], hops: int | None = None) -> dict[str, int]:
+        # the items and everything they are made from within hops recipe steps (None: all of it), name -> steps
+        return self._closure(self.forward_indptr, self.forward_indices, names, hops)
+
+    def upstream(self, names: list[str], hops: int | None = None) -> dict[str, int]:
+        # the items and everything made from them within hops recipe steps (None: all of it), name -> steps
+        return self._closure(self.reverse_indptr, self.reverse_indices, names, hops)
+
+    def to_table(self) -> RecipeTable:
+        # the whole recipe table in memory, the same one the store was written from
+        names_blob = bytes(self.name_bytes).decode("utf-8")
+        offsets = self.name_offsets
+        if names_blob.isascii():
+            names = [names_blob[start:end] for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+        else:
+            names = self.names(np.arange(self.n_items))
+        return RecipeTable(names, self.recipe_products.copy(), self.recipe_indptr.copy(), self.recipe_ingredients.copy(), self.recipe_quantities.copy())
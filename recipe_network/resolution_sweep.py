@@ -0,0 +1,182 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import scipy.sparse as sp
+
+from recipe_network.clustering import igraph_membership, labels_to_communities, normalized_mutual_information, relabel_by_size
+
+# default grid, log spaced since the community count grows roughly with the resolution
+SWEEP_RESOLUTIONS = tuple(np.geomspace(0.25, 16.0, 50).tolist())
+SWEEP_BACKENDS = ("igraph", "leiden")
+# resolutions per chain: each chain clusters the full graph once, at its highest resolution, and the lower ones on
+# that partition's communities collapsed into nodes, longer chains are cheaper but give up more modularity
+# (synthetic recipes, 50 resolutions: 10 loses 0.5% on average against clustering every resolution from scratch)
+SWEEP_CHAIN_LENGTH = 10
+
+# per worker process state set up by _init_sweep_worker: the shared CSR and the igraph graph built from it
+_worker_state = None
+
+class PartitionHierarchy:
+    # the partitions of a resolution sweep, ordered by resolution, so from coarse to fine
+    # - labels[k] is the community of every node at resolutions[k], numbered by size, largest first
+    # - modularity[k] is the directed modularity at resolutions[k], the objective partition_into_clusters optimizes
+    # - stability[k] is the NMI between levels k - 1 and k, nan for the first level, long runs of values close
+    #   to 1 are the resolution ranges where the districts don't depend on the exact resolution
+    # every community of a chain's levels is a union of communities of its first (finest) level,
+    # parents() relates any two adjacent levels by majority overlap
+    def __init__(self, resolutions: np.ndarray, labels: np.ndarray, modularity: np.ndarray, stability: np.ndarray) -> None:
+        self.resolutions = resolutions
+        self.labels = labels
+        self.modularity = modularity
+        self.stability = stability
+        self.n_communities = labels.max(axis=1) + 1 if labels.size else np.zeros(len(resolutions), dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.resolutions)
+
+    def level(self, resolution: float) -> int:
+        # index of the level closest to resolution (on the log scale)
+        return int(np.argmin(np.abs(np.log(self.resolutions) - np.log(resolution))))
+
+    def parents(self, level: int) -> np.ndarray:
+        # community at level - 1 holding most of the members of every community at level
+        if level == 0:
+            raise ValueError("The first level has no parent level")
+        labels = self.labels[level]
+        parent_labels = self.labels[level - 1]
+        overlap = sp.csr_matrix((np.ones(len(labels), dtype=np.int64), (labels, parent_labels)))
+        return np.asarray(overlap.argmax(axis=1)).ravel()
+
+    def communities(self, level: int, names: list[str]) -> list[frozenset]:
+        return labels_to_communities(self.labels[level], names)
+
+def _share_arrays(*arrays: np.ndarray) -> tuple[SharedMemory, list[tuple[str, int]]]:
+    # copy the arrays into one shared memory block, returns it with the (dtype, length) layout to attach them by
+    layout = [(array.dtype.str, len(array)) for array in arrays]
+    block = SharedMemory(create=True, size=max(1, sum(array.nbytes for array in arrays)))
+    offset = 0
+    for array in arrays:
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf, offset=offset)[:] = array
+        offset += array.nbytes
+    return block, layout
+
+def _attach_arrays(block: SharedMemory, layout: list[tuple[str, int]]) -> list[np.ndarray]:
+    arrays = []
+    offset = 0
+    for dtype, length in layout:
+        array = np.ndarray((length,), dtype=dtype, buffer=block.buf, offset=offset)
+        array.flags.writeable = False
+        arrays.append(array)
+        offset += array.nbytes
+    return arrays
+
+def _init_sweep_worker(block_name: str, layout: list[tuple[str, int]]) -> None:
+    # the parent owns and unlinks the block, workers share its resource tracker so attaching needs no cleanup
+    block = SharedMemory(name=block_name)
+    _set_worker_state(*_attach_arrays(block, layout), block=block)
+
+def _set_worker_state(indptr: np.ndarray, indices: np.ndarray, weights: np.ndarray, block: SharedMemory | None = None) -> None:
+    # everything every chain needs, built once per worker instead of once per task
+    import igraph
+
+    global _worker_state
+    n_nodes = len(indptr) - 1
+    sources = np.repeat(np.arange(n_nodes), np.diff(indptr))
+    _worker_state = {
+        "block": block,
+        "adjacency": sp.csr_matrix((weights, indices, indptr), shape=(n_nodes, n_nodes)),
+        "graph": igraph.Graph(n=n_nodes, edges=np.column_stack((sources, indices)), directed=False),
+        "weight_list": weights.tolist(),
+    }
+
+def _clear_worker_state() -> None:
+    global _worker_state
+    _worker_state = None
+
+def _collapse(adjacency: sp.csr_matrix, labels: np.ndarray) -> sp.coo_matrix:
+    # directed community x community edge weights, the diagonal holds the weight inside every community
+    n_communities = int(labels.max()) + 1
+    adjacency = adjacency.tocoo()
+    return sp.csr_matrix((adjacency.data, (labels[adjacency.row], labels[adjacency.col])), shape=(n_communities, n_communities)).tocoo()
+
+def _collapsed_modularity(collapsed: sp.coo_matrix, resolution: float) -> float:
+    # clustering.modularity of the partition whose communities are the collapsed nodes, read off the small matrix
+    m = collapsed.data.sum()
+    internal = collapsed.data[collapsed.row == collapsed.col].sum()
+    out_totals = np.bincount(collapsed.row, weights=collapsed.data, minlength=collapsed.shape[0])
+    in_totals = np.bincount(collapsed.col, weights=collapsed.data, minlength=collapsed.shape[0])
+    return float(internal / m - resolution * (out_totals * in_totals).sum() / m ** 2)
+
+def _sweep_chain(resolutions: list[float], backend: str, seed: int | None) -> list[tuple[np.ndarray, float]]:
+    # (labels, directed modularity) for every resolution of a chain, given from high to low
+    # the first resolution is clustered on the full graph, the others on the graph whose nodes are its communities
+    # (self-loops carrying their internal weight), which has the same modularity for every partition made of whole
+    # communities and is orders of magnitude smaller, each warm started from the partition of the previous level
+    import igraph
+
+    state = _worker_state
+    base_labels = relabel_by_size(igraph_membership(state["graph"], backend, state["weight_list"], resolutions[0], seed=seed))
+    base = _collapse(state["adjacency"], base_labels)
+    results = [(base_labels.astype(np.int32), _collapsed_modularity(base, resolutions[0]))]
+
+    # both directions between two communities folded into one undirected edge, which about halves the edges
+    n_communities = base.shape[0]
+    undirected = (sp.triu(base, k=1) + sp.tril(base, k=-1).T + sp.diags(base.diagonal())).tocoo()
+    graph = igraph.Graph(n=n_communities, edges=np.column_stack((undirected.row, undirected.col)), directed=False)
+    edge_weights = undirected.data.tolist()
+    strengths = (np.bincount(base.row, weights=base.data, minlength=n_communities) + np.bincount(base.col, weights=base.data, minlength=n_communities)).tolist()
+    community_labels = np.arange(n_communities)
+    for resolution in resolutions[1:]:
+        community_labels = relabel_by_size(igraph_membership(graph, backend, edge_weights, resolution, node_weights=strengths, initial_membership=community_labels.tolist(), seed=seed))
+        results.append((community_labels[base_labels].astype(np.int32), _collapsed_modularity(_collapse(base, community_labels), resolution)))
+    return results
+
+def sweep_resolutions(n_nodes: int, sources: np.ndarray, targets: np.ndarray, weights: np.ndarray | None = None,
+                      resolutions: list[float] = SWEEP_RESOLUTIONS, backend: str = "leiden", max_workers: int | None = None,
+                      chain_length: int = SWEEP_CHAIN_LENGTH, seed: int | None = 0) -> PartitionHierarchy:
+    # cluster the graph at every resolution, chains of chain_length resolutions run in parallel worker processes
+    # the graph goes to the workers once, as a read-only CSR in shared memory, not pickled with every task
+    # the chains are cut from the sorted resolutions independently of max_workers, so the result only depends on the inputs
+    if backend not in SWEEP_BACKENDS:
+        raise ValueError(f"Unknown sweep backend {backend}, expected one of {', '.join(SWEEP_BACKENDS)}")
+    if chain_length < 1:
+        raise ValueError(f"chain_length must be at least 1, got {chain_length}")
+    resolutions = np.unique(np.asarray(resolutions, dtype=np.float64))
+    if len(resolutions) == 0 or resolutions[0] <= 0:
+        raise ValueError("Resolutions must be positive and at least one is needed")
+    weights = np.ones(len(sources)) if weights is None else np.asarray(weights, dtype=np.float64)
+    if n_nodes == 0 or weights.sum() == 0:
+        raise ValueError("Cannot sweep resolutions on a graph without edges")
+
+    adjacency = sp.csr_matrix((weights, (np.asarray(sources, dtype=np.int64), np.asarray(targets, dtype=np.int64))), shape=(n_nodes, n_nodes))
+    adjacency.sum_duplicates()
+    csr = (adjacency.indptr.astype(np.int64), adjacency.indices.astype(np.int64), adjacency.data.astype(np.float64))
+
+    # chains from the highest resolution down, since collapsing only ever merges communities
+    descending = resolutions[::-1].tolist()
+    chains = [descending[start:start + chain_length] for start in range(0, len(descending), chain_length)]
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, len(chains)))
+
+    if max_workers == 1:
+        _set_worker_state(*csr)
+        try:
+            results = [_sweep_chain(chain, backend, seed) for chain in chains]
+        finally:
+            _clear_worker_state()
+    else:
+        block, layout = _share_arrays(*csr)
+        try:
+            with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_sweep_worker, initargs=(block.name, layout)) as executor:
+                results = list(executor.map(_sweep_chain, chains, [backend] * len(chains), [seed] * len(chains)))
+        finally:
+            block.close()
+            block.unlink()
+
+    levels = [level for chain in results for level in chain][::-1]
+    labels = np.stack([level_labels for level_labels, _ in levels])
+    stability = np.array([np.nan] + [normalized_mutual_information(labels[k - 1], labels[k]) for k in range(1, len(labels))])
+    return PartitionHierarchy(resolutions, labels, np.array([q for _, q in levels]), stability)
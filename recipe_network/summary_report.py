@@ -0,0 +1,198 @@
+import importlib.util
+import itertools
+import json
+import math
+from pathlib import Path
+
+import numpy as np
+import scipy.sparse as sp
+
+from config import SUMMARY_FORMATS, SUMMARY_TOP_K
+from recipe_network.ingredient_index import IngredientIndex
+from utils.recipe_table import RecipeTable
+
+# the recipe set summary GraphBuilder.print_items_summary writes, all computed on the product x ingredient
+# incidence matrix P of the IngredientIndex, the output size only depends on top_k and the largest counts:
+# - totals: item, product, raw material, recipe and edge counts
+# - out_degree / in_degree: products by number of ingredients, ingredients by number of products using them
+# - ingredient_usage: the top_k most used ingredients
+# - shared_pairs: the top_k product pairs sharing the most ingredients, with the ingredients they share
+# - overlap: number of product pairs sharing exactly c ingredients, for every c
+# pair statistics enumerate the pairs of P·Pᵀ, whose count grows with the square of the ingredient usage
+# (Σ_i C(usage_i, 2), every pair of products using ingredient i), above MAX_OVERLAP_WORK:
+# - shared_pairs matches products on the ingredient triples (or pairs, ...) they use instead of single
+#   ingredients, exact once top_k product pairs share that many (otherwise exact is false)
+# - overlap is estimated from the rows of a random sample of products, scaled up (exact is false)
+# the formats and default top_k are SUMMARY_FORMATS and SUMMARY_TOP_K in config.py
+MAX_OVERLAP_WORK = 10_000_000
+# engines pandas writes parquet with, pip install -e .[parquet] for pyarrow
+PARQUET_ENGINES = ("pyarrow", "fastparquet")
+
+def check_summary_format(output_format: str) -> None:
+    # ValueError for an unknown format or parquet without an engine, cheap enough to check before computing the report
+    if output_format not in SUMMARY_FORMATS:
+        raise ValueError(f"Unknown summary format {output_format}, expected one of {', '.join(SUMMARY_FORMATS)}")
+    if output_format == "parquet" and not any(importlib.util.find_spec(engine) for engine in PARQUET_ENGINES):
+        raise ValueError(f"Parquet summaries need one of {', '.join(PARQUET_ENGINES)}, install it with pip install -e .[parquet]")
+
+def _check_top_k(top_k: int) -> None:
+    if top_k < 1:
+        raise ValueError(f"top_k must be at least 1, got {top_k}")
+
+def _pair_work(incidence: sp.csr_matrix) -> int:
+    # number of (pair, shared ingredient) entries P·Pᵀ would enumerate
+    usage = np.bincount(incidence.indices, minlength=incidence.shape[1]).astype(np.int64)
+    return int((usage * (usage - 1) // 2).sum())
+
+def _top_pairs(first: np.ndarray, second: np.ndarray, counts: np.ndarray, top_k: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # most shared first, then by product ids
+    if len(counts) > top_k:
+        keep = np.argpartition(-counts, top_k - 1)[:top_k]
+        threshold = counts[keep].min()
+        keep = np.flatnonzero(counts >= threshold)
+        first, second, counts = first[keep], second[keep], counts[keep]
+    order = np.lexsort((second, first, -counts))[:top_k]
+    return first[order], second[order], counts[order]
+
+def _subset_incidence(incidence: sp.csr_matrix, size: int, max_work: int) -> sp.csr_matrix | None:
+    # products x ingredient subsets of the given size, entry (p, s) is 1 when product p uses every ingredient of s
+    # (Q·Qᵀ)[p, q] is then C(common ingredients of p and q, size), None when Q·Qᵀ would go over max_work
+    degrees = np.diff(incidence.indptr)
+    products, subsets = [], []
+    for degree in np.unique(degrees[degrees >= size]).tolist():
+        degree_products = np.flatnonzero(degrees == degree)
+        columns = np.sort(incidence.indices[incidence.indptr[degree_products][:, None] + np.arange(degree)], axis=1)
+        combinations = np.array(list(itertools.combinations(range(degree), size)))
+        subsets.append(columns[:, combinations].reshape(-1, size))
+        products.append(np.repeat(degree_products, len(combinations)))
+    if not subsets:
+        return sp.csr_matrix((incidence.shape[0], 0), dtype=np.int32)
+
+    # one integer id per subset, extending the ids of the first k ingredients with the next one keeps them in int64
+    subsets = np.concatenate(subsets).astype(np.int64)
+    subset_ids = subsets[:, 0]
+    for column in range(1, size):
+        _, subset_ids, usage = np.unique(subset_ids * incidence.shape[1] + subsets[:, column], return_inverse=True, return_counts=True)
+    usage = usage.astype(np.int64)
+    if (usage * (usage - 1) // 2).sum() > max_work:
+        return None
+    subset_ids = subset_ids.ravel()
+    return sp.csr_matrix((np.ones(len(subset_ids), dtype=np.int32), (np.concatenate(products), subset_ids)), shape=(incidence.shape[0], len(usage)))
+
+def top_shared_pairs(index: IngredientIndex, top_k: int = SUMMARY_TOP_K, max_work: int = MAX_OVERLAP_WORK) -> tuple[np.ndarray, np.ndarray, np.ndarray, bool]:
+    # (first product ids, second product ids, shared ingredient counts, exact) of the top_k pairs
+    # over budget, pairs sharing at least size ingredients are found through the ingredient subsets of that size
+    # they have in common, hub ingredients are used everywhere but few products use the same two or three,
+    # size goes down from the most ingredients of a product until top_k pairs are found (they then share the most)
+    _check_top_k(top_k)
+    incidence = index.incidence
+    if _pair_work(incidence) <= max_work:
+        overlap = index.overlap.tocoo()
+        return (*_top_pairs(overlap.row, overlap.col, overlap.data, top_k), True)
+
+    degree_counts = np.bincount(np.diff(incidence.indptr)).tolist()
+    empty = np.empty(0, dtype=np.int64)
+    found = (empty, empty, empty)
+    for size in range(len(degree_counts) - 1, 1, -1):
+        if sum(count * math.comb(degree, size) for degree, count in enumerate(degree_counts)) > max_work:
+            break
+        subsets = _subset_incidence(incidence, size, max_work)
+        if subsets is None:
+            break
+        overlap = sp.triu(subsets @ subsets.T, k=1).tocoo()
+        # C(c, size) back to c
+        counts = np.searchsorted([math.comb(c, size) for c in range(len(degree_counts))], overlap.data)
+        found = _top_pairs(overlap.row, overlap.col, counts, top_k)
+        if len(counts) >= top_k:
+            return (*found, True)
+    return (*found, False)
+
+def overlap_histogram(index: IngredientIndex, max_work: int = MAX_OVERLAP_WORK, seed: int = 0) -> tuple[np.ndarray, bool]:
+    # (histogram, exact), histogram[c] is the number of product pairs sharing exactly c ingredients (c ≥ 1)
+    # estimated from sampled rows of P·Pᵀ when the whole product is over budget: every pair is seen once
+    # for each of its two products in the sample, so the counts scale by n / (2 * sample size)
+    incidence = index.incidence
+    if _pair_work(incidence) <= max_work:
+        histogram = np.bincount(index.overlap.data)
+        histogram[:1] = 0
+        return histogram.astype(np.float64), True
+
+    n_products = incidence.shape[0]
+    usage = np.bincount(incidence.indices, minlength=incidence.shape[1]).astype(np.float64)
+    # a product's row of P·Pᵀ costs the summed usage of its ingredients, Σ_i usage_i² over all rows
+    sample_size = int(np.clip(max_work * n_products / (usage ** 2).sum(), 1, n_products))
+    sample = np.sort(np.random.default_rng(seed).choice(n_products, sample_size, replace=False))
+    rows = (incidence[sample] @ incidence.T).tocoo()
+    others = rows.col != sample[rows.row]
+    histogram = np.bincount(rows.data[others]).astype(np.float64) * n_products / (2 * sample_size)
+    histogram[:1] = 0
+    return histogram, False
+
+def _histogram_rows(counts: np.ndarray) -> list[dict]:
+    return [{"count": int(count), "n": float(n) if n % 1 else int(n)} for count, n in enumerate(counts.tolist()) if n]
+
+def summary_report(table: RecipeTable, index: IngredientIndex, top_k: int = SUMMARY_TOP_K, max_work: int = MAX_OVERLAP_WORK) -> dict:
+    # the report as plain json data, {"totals": {...}, "out_degree": [...], "in_degree": [...], ...}
+    _check_top_k(top_k)
+    incidence = index.incidence
+    out_degrees = np.diff(incidence.indptr)
+    in_degrees = np.bincount(incidence.indices, minlength=incidence.shape[1])
+
+    top_ingredients = np.lexsort((np.arange(len(in_degrees)), -in_degrees))[:top_k]
+    first, second, counts, pairs_exact = top_shared_pairs(index, top_k, max_work)
+    histogram, overlap_exact = overlap_histogram(index, max_work)
+    return {
+        "totals": {
+            "items": table.n_items,
+            "products": len(index.products),
+            "ingredients": int((in_degrees > 0).sum()),
+            "raw_materials": table.n_items - len(index.products),
+            "recipes": table.n_recipes,
+            "recipe_edges": table.n_edges,
+            "product_ingredient_pairs": int(incidence.nnz),
+            "pair_work": _pair_work(incidence),
+            "sharing_pairs": float(histogram.sum()) if not overlap_exact else int(histogram.sum()),
+            "shared_pairs_exact": pairs_exact,
+            "overlap_exact": overlap_exact,
+        },
+        "out_degree": _histogram_rows(np.bincount(out_degrees)),
+        "in_degree": _histogram_rows(np.bincount(in_degrees[in_degrees > 0])),
+        "ingredient_usage": [{"ingredient": index.ingredients[i], "products": int(in_degrees[i])} for i in top_ingredients.tolist() if in_degrees[i]],
+        "shared_pairs": [
+            {"product": index.products[p], "other_product": index.products[q], "common": int(count), "ingredients": sorted(index.common_ingredients(p, q))}
+            for p, q, count in zip(first.tolist(), second.tolist(), counts.tolist())
+        ],
+        "overlap": _histogram_rows(histogram),
+    }
+
+def report_rows(report: dict) -> list[dict]:
+    # the report as one long table for csv and parquet: section, key, other, value, detail
+    rows = [{"section": "totals", "key": key, "other": "", "value": float(value), "detail": ""} for key, value in report["totals"].items()]
+    for section in ("out_degree", "in_degree", "overlap"):
+        rows += [{"section": section, "key": str(row["count"]), "other": "", "value": float(row["n"]), "detail": ""} for row in report[section]]
+    rows += [{"section": "ingredient_usage", "key": row["ingredient"], "other": "", "value": float(row["products"]), "detail": ""} for row in report["ingredient_usage"]]
+    rows += [
+        {"section": "shared_pairs", "key": row["product"], "other": row["other_product"], "value": float(row["common"]), "detail": ";".join(row["ingredients"])}
+        for row in report["shared_pairs"]
+    ]
+    return rows
+
+def write_summary_report(report: dict, path: str | Path, output_format: str | None = None) -> Path:
+    # output_format defaults to the file suffix, parquet goes through pandas and needs one of PARQUET_ENGINES
+    path = Path(path)
+    output_format = output_format or path.suffix.lstrip(".")
+    check_summary_format(output_format)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if output_format == "json":
+        with open(path, "w", encoding="utf-8") as report_file:
+            json.dump(report, report_file, indent=2, ensure_ascii=False)
+        return path
+
+    import pandas as pd
+
+    rows = pd.DataFrame(report_rows(report), columns=["section", "key", "other", "value", "detail"])
+    if output_format == "csv":
+        rows.to_csv(path, index=False)
+    else:
+        rows.to_parquet(path, index=False)
+    return path
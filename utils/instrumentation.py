@@ -0,0 +1,271 @@
+import cProfile
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+# span and counter instrumentation for the pipeline stages, off unless a Recorder is enabled:
+#   with recording(PROFILING_DIR / "trace.json"):
+#       ...
+# every stage runs inside span("graph build"), span("clustering"), ... (or a function decorated with stage()),
+# which records wall time, the RSS before and after, the peak RSS inside the span and the net number of allocated
+# python blocks, count() adds to counters
+# the report is a Chrome trace (chrome://tracing, ui.perfetto.dev) with a per-stage summary added under "stages"
+# disabled, span() returns one shared no-op object and count() returns straight away, so the hooks can stay in
+# the code, they only wrap whole stages, never per-item work
+# spans run in the recording process only, work done in worker processes is covered by the span around the pool
+
+# writing 5 resets the peak RSS (VmHWM) of the process, Linux only
+CLEAR_REFS = Path("/proc/self/clear_refs")
+PROC_STATUS = Path("/proc/self/status")
+
+_recorder = None
+
+class _NullSpan:
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        return None
+
+_NULL_SPAN = _NullSpan()
+
+def _memory_kb() -> tuple[int, int]:
+    # (current RSS, peak RSS) in kB, the peak only covers the time since the last reset where resets work
+    try:
+        status = PROC_STATUS.read_text()
+    except OSError:
+        # resource is Unix only, without either the numbers are (0, 0)
+        try:
+            import resource
+        except ImportError:
+            return 0, 0
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak, peak
+    values = {}
+    for line in status.splitlines():
+        if line.startswith(("VmRSS:", "VmHWM:")):
+            key, value = line.split(":", 1)
+            values[key] = int(value.split()[0])
+    return values.get("VmRSS", 0), values.get("VmHWM", 0)
+
+class _Span:
+    # one timed stage, nested spans fold their peaks into the enclosing one since the peak RSS
+    # and the tracemalloc peak are reset on entry to measure every span on its own
+    def __init__(self, recorder: "Recorder", name: str, args: dict) -> None:
+        self.recorder = recorder
+        self.name = name
+        self.args = args
+
+    def __enter__(self) -> "_Span":
+        recorder = self.recorder
+        stack = recorder._stack()
+        if stack:
+            stack[-1]._fold_peaks()
+        stack.append(self)
+
+        self.rss_start, _ = _memory_kb()
+        self.peak = self.rss_start
+        recorder._reset_peak()
+        self.traced_peak = 0
+        if recorder.trace_allocations:
+            self.traced_start = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        self.blocks_start = sys.getallocatedblocks()
+        self.start = time.perf_counter()
+        return self
+
+    def _fold_peaks(self) -> None:
+        # called before a nested span resets the peaks, and with the nested span's peaks when it ends
+        self.peak = max(self.peak, _memory_kb()[1])
+        if self.recorder.trace_allocations:
+            self.traced_peak = max(self.traced_peak, tracemalloc.get_traced_memory()[1])
+
+    def __exit__(self, *exc_info) -> None:
+        end = time.perf_counter()
+        recorder = self.recorder
+        stack = recorder._stack()
+        stack.pop()
+
+        rss_end, peak = _memory_kb()
+        self.peak = max(self.peak, peak)
+        args = dict(self.args)
+        args.update(
+            rss_start_mb=self.rss_start / 1024,
+            rss_end_mb=rss_end / 1024,
+            peak_rss_mb=self.peak / 1024,
+            allocated_blocks=sys.getallocatedblocks() - self.blocks_start,
+        )
+        if recorder.trace_allocations:
+            current, traced_peak = tracemalloc.get_traced_memory()
+            self.traced_peak = max(self.traced_peak, traced_peak)
+            args.update(traced_peak_mb=(self.traced_peak - self.traced_start) / 1e6, traced_net_mb=(current - self.traced_start) / 1e6)
+        if exc_info[0] is not None:
+            args["error"] = repr(exc_info[1])
+
+        if stack:
+            parent = stack[-1]
+            parent.peak = max(parent.peak, self.peak)
+            parent.traced_peak = max(parent.traced_peak, self.traced_peak)
+        recorder._add_span(self.name, self.start, end, args)
+
+class Recorder:
+    # collects spans and counters, profile also runs cProfile over everything between start and stop
+    # (written next to the report as .prof, for snakeviz or pstats), trace_allocations adds the tracemalloc
+    # peak and net allocation per span, both slow the pipeline down noticeably, spans alone do not
+    def __init__(self, profile: bool = False, trace_allocations: bool = False) -> None:
+        self.profile = profile
+        self.trace_allocations = trace_allocations
+        self.events = []
+        self.counters = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._profiler = None
+        self._can_reset_peak = True
+        self._origin = time.perf_counter()
+
+    def _stack(self) -> list:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _reset_peak(self) -> None:
+        if self._can_reset_peak:
+            try:
+                CLEAR_REFS.write_text("5")
+            except OSError:
+                # the peak is then the process peak so far
+                self._can_reset_peak = False
+
+    def _timestamp(self, seconds: float) -> float:
+        # microseconds since the recorder started, the unit Chrome traces use
+        return (seconds - self._origin) * 1e6
+
+    def _add_span(self, name: str, start: float, end: float, args: dict) -> None:
+        event = {
+            "name": name,
+            "ph": "X",
+            "ts": self._timestamp(start),
+            "dur": (end - start) * 1e6,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": args,
+        }
+        with self._lock:
+            self.events.append(event)
+
+    def span(self, name: str, **args) -> _Span:
+        return _Span(self, name, args)
+
+    def count(self, name: str, value: int | float = 1) -> None:
+        with self._lock:
+            total = self.counters[name] = self.counters.get(name, 0) + value
+            self.events.append({"name": name, "ph": "C", "ts": self._timestamp(time.perf_counter()), "pid": os.getpid(), "args": {name: total}})
+
+    def start(self) -> None:
+        if self.trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if self.profile:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def stop(self) -> None:
+        if self._profiler is not None:
+            self._profiler.disable()
+        if self.trace_allocations and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def stages(self) -> dict[str, dict]:
+        # per span name: calls, total and longest wall time, highest peak RSS and the summed allocated blocks
+        stages = {}
+        for event in self.events:
+            if event["ph"] != "X":
+                continue
+            args = event["args"]
+            stage = stages.setdefault(event["name"], {"calls": 0, "total_s": 0.0, "max_s": 0.0, "peak_rss_mb": 0.0, "allocated_blocks": 0})
+            stage["calls"] += 1
+            stage["total_s"] += event["dur"] / 1e6
+            stage["max_s"] = max(stage["max_s"], event["dur"] / 1e6)
+            stage["peak_rss_mb"] = max(stage["peak_rss_mb"], args["peak_rss_mb"])
+            stage["allocated_blocks"] += args["allocated_blocks"]
+            if "traced_peak_mb" in args:
+                stage["traced_peak_mb"] = max(stage.get("traced_peak_mb", 0.0), args["traced_peak_mb"])
+        return stages
+
+    def report(self) -> dict:
+        # Chrome trace object format, extra top level keys are ignored by the trace viewers
+        return {
+            "traceEvents": self.events,
+            "displayTimeUnit": "ms",
+            "stages": self.stages(),
+            "counters": dict(self.counters),
+        }
+
+    def write(self, path: str | Path) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as report_file:
+            json.dump(self.report(), report_file, separators=(",", ":"))
+        if self._profiler is not None:
+            self._profiler.dump_stats(path.with_suffix(".prof"))
+        return path
+
+def enable(profile: bool = False, trace_allocations: bool = False) -> Recorder:
+    # start recording spans and counters process wide, replaces (and stops) any recorder already running
+    global _recorder
+    disable()
+    _recorder = Recorder(profile=profile, trace_allocations=trace_allocations)
+    _recorder.start()
+    return _recorder
+
+def disable() -> Recorder | None:
+    # stop recording, returns the recorder that was running so its report can still be written
+    global _recorder
+    recorder, _recorder = _recorder, None
+    if recorder is not None:
+        recorder.stop()
+    return recorder
+
+def enabled() -> bool:
+    return _recorder is not None
+
+def span(name: str, **args) -> _Span | _NullSpan:
+    # context manager timing one stage, args end up in the trace event
+    if _recorder is None:
+        return _NULL_SPAN
+    return _recorder.span(name, **args)
+
+def stage(name: str):
+    # decorator running every call of the function inside span(name)
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _recorder is None:
+                return function(*args, **kwargs)
+            with _recorder.span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def count(name: str, value: int | float = 1) -> None:
+    if _recorder is not None:
+        _recorder.count(name, value)
+
+@contextmanager
+def recording(path: str | Path | None, profile: bool = False, trace_allocations: bool = False):
+    # record everything inside the block and write the report to path, None records nothing
+    if path is None:
+        yield None
+        return
+    recorder = enable(profile=profile, trace_allocations=trace_allocations)
+    try:
+        yield recorder
+    finally:
+        disable()
+        recorder.write(path)
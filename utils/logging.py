@@ -1,5 +1,10 @@
+import atexit
 import enum
+import os
+import queue
+import threading
 import time
+from pathlib import Path
 
 class LogLevel(enum.Enum):
     TRACE = 1
@@ -16,27 +21,185 @@ class LogLevel(enum.Enum):
         return mask
 
 log_level = LogLevel.bitmask(
-    LogLevel.TRACE, 
-    LogLevel.DEBUG, 
+    LogLevel.TRACE,
+    LogLevel.DEBUG,
     LogLevel.INFO,
     LogLevel.WARNING,
     LogLevel.ERROR
 )
 
+# sentinel records understood by the writer thread
+_RESET = object()
+_FLUSH = object()
+_STOP = object()
+
+class _LogWriter(threading.Thread):
+    # background writer that owns a single append handle to one log file
+    # records are (timestamp, level, message, args) tuples, formatted and written in batches
+    # so the caller never touches the file or pays for time.asctime()
+
+    def __init__(self, path: Path, queue_size: int, batch_size: int) -> None:
+        super().__init__(name=f"log-writer-{path.name}", daemon=True)
+        self.path = path
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.batch_size = batch_size
+        self._file = open(path, "a", encoding="utf-8")
+
+    @staticmethod
+    def _format(record) -> str:
+        timestamp, level, message, args = record
+        if args:
+            try:
+                message = message % args
+            except (TypeError, ValueError) as e:
+                message = f"{message} {args} (log format error: {e})"
+        return f"{time.asctime(time.localtime(timestamp))}: [{level.name}] - {message}\n"
+
+    def run(self) -> None:
+        running = True
+        while running:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            lines = []
+            for record in batch:
+                if record is _RESET:
+                    # write whatever came before the reset, then truncate the file
+                    self._file.write("".join(lines))
+                    lines = []
+                    self._file.flush()
+                    self._file.truncate(0)
+                elif record is _FLUSH:
+                    continue
+                elif record is _STOP:
+                    running = False
+                else:
+                    lines.append(self._format(record))
+
+            if lines:
+                self._file.write("".join(lines))
+            self._file.flush()
+
+            for _ in batch:
+                self.queue.task_done()
+
+        self._file.close()
+
+    def put(self, record) -> None:
+        # blocks when the queue is full, which bounds memory if the disk falls behind
+        self.queue.put(record)
+
+    def flush(self) -> None:
+        # block until every record queued so far has been written
+        self.queue.put(_FLUSH)
+        self.queue.join()
+
+    def stop(self) -> None:
+        self.queue.put(_STOP)
+        self.join()
+
+
+class _SyncWriter:
+    # writer of a forked child (process pool workers), which inherits the parent's writers without their threads:
+    # every record is formatted and written straight away, pool workers exit without running atexit handlers
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+
+    def is_alive(self) -> bool:
+        return not self._file.closed
+
+    def put(self, record) -> None:
+        if record is _RESET:
+            self._file.truncate(0)
+        elif record is not _FLUSH and record is not _STOP:
+            self._file.write(_LogWriter._format(record))
+        self._file.flush()
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def stop(self) -> None:
+        self._file.close()
+
+
+# one writer per log file, shared by every logger that points at it
+_writers: dict[Path, _LogWriter | _SyncWriter] = {}
+_writers_lock = threading.Lock()
+# bumped in every forked child, loggers compare it to notice their writer belongs to the parent
+_fork_generation = 0
+
+def _get_writer(path: Path, queue_size: int, batch_size: int) -> _LogWriter | _SyncWriter:
+    with _writers_lock:
+        writer = _writers.get(path)
+        if writer is None or not writer.is_alive():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if _fork_generation:
+                writer = _SyncWriter(path)
+            else:
+                writer = _LogWriter(path, queue_size, batch_size)
+                writer.start()
+            _writers[path] = writer
+        return writer
+
+def _after_fork_in_child() -> None:
+    # the parent's writer threads don't exist here and their queues may be mid-operation, start over
+    global _writers, _writers_lock, _fork_generation
+    _writers = {}
+    _writers_lock = threading.Lock()
+    _fork_generation += 1
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+@atexit.register
+def shutdown_logging() -> None:
+    # drain and close every open log file, called automatically on interpreter exit
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        if writer.is_alive():
+            writer.stop()
+
+
 class Logger:
-    def __init__(self, log_path, log_name, log_levels=log_level):
+    # messages may be passed pre-formatted or as a %-style format string with args,
+    # the latter is only formatted (on the writer thread) if the level is enabled:
+    #   logger(LogLevel.TRACE, "Added node: %s", name)
+    def __init__(self, log_path, log_name, log_levels=log_level, queue_size: int = 10_000, batch_size: int = 512):
         self.log_path = log_path
         self.log_name = log_name
-        self.log_levels = log_level
-    
-    def __call__(self, level: LogLevel, message: str, reset: bool = False) -> None:
+        self.log_levels = log_levels
+        self._queue_size = queue_size
+        self._batch_size = batch_size
+        self._writer = _get_writer(Path(log_path) / log_name, queue_size, batch_size)
+        self._fork_generation = _fork_generation
+
+    def _current_writer(self) -> _LogWriter | _SyncWriter:
+        # a logger inherited through fork switches to the child's own writer on first use
+        if self._fork_generation != _fork_generation:
+            self._writer = _get_writer(Path(self.log_path) / self.log_name, self._queue_size, self._batch_size)
+            self._fork_generation = _fork_generation
+        return self._writer
+
+    def enabled(self, level: LogLevel) -> bool:
+        # lets callers skip building expensive messages entirely
+        return bool(level.value & self.log_levels)
+
+    def __call__(self, level: LogLevel, message: str, *args, reset: bool = False) -> None:
+        # a disabled level is a no-op, reset included
         if not level.value & self.log_levels:
             return
-        
-        now = time.asctime()
-        write_mode = "a"
+
+        writer = self._current_writer()
         if reset:
-            write_mode = "w"
+            writer.put(_RESET)
+        writer.put((time.time(), level, message, args))
 
-        with open(f"{self.log_path}/{self.log_name}", write_mode) as log_file:
-            log_file.write(f"{now}: [{level.name}] - {message}\n")
\ No newline at end of file
+    def flush(self) -> None:
+        self._current_writer().flush()
@@ -0,0 +1,219 @@
+import numpy as np
+import scipy.sparse as sp
+
+
+class RecipeTable:
+    # compact recipe model shared by GraphBuilder and RecipeNetwork
+    # item names are interned to int ids in first-seen order (product, then its ingredients), which is also
+    # the node order of the networkx and igraph graphs built from the table
+    # recipes are CSR rows: recipe r makes item recipe_products[r] from the items
+    # ingredients[indptr[r]:indptr[r + 1]] in the matching quantities, all int32
+    # a product can have several recipes (alternate recipes), where a single recipe per product is needed
+    # the last one wins, the same rule the json import always used
+    def __init__(self, names: list[str], recipe_products: np.ndarray, indptr: np.ndarray, ingredients: np.ndarray, quantities: np.ndarray) -> None:
+        self.names = names
+        self.recipe_products = np.asarray(recipe_products, dtype=np.int32)
+        self.indptr = np.asarray(indptr, dtype=np.int32)
+        self.ingredients = np.asarray(ingredients, dtype=np.int32)
+        self.quantities = np.asarray(quantities, dtype=np.int32)
+        self._name_ids = None
+
+    @classmethod
+    def from_records(cls, records: list[dict]) -> "RecipeTable":
+        # from the [{"product": str, "ingredients": {str: int}}, ...] records the data_manipulation program writes
+        name_ids = {}
+        names = []
+        recipe_products = []
+        indptr = [0]
+        ingredients = []
+        quantities = []
+
+        def intern(name: str) -> int:
+            name_id = name_ids.get(name)
+            if name_id is None:
+                name_id = name_ids[name] = len(names)
+                names.append(name)
+            return name_id
+
+        for data in records:
+            recipe_products.append(intern(data.get("product")))
+            for ingredient, quantity in data.get("ingredients").items():
+                ingredients.append(intern(ingredient))
+                quantities.append(quantity)
+            indptr.append(len(ingredients))
+
+        table = cls(names, recipe_products, indptr, ingredients, quantities)
+        table._name_ids = name_ids
+        return table
+
+    @classmethod
+    def from_arrays(cls, arrays: dict[str, np.ndarray]) -> "RecipeTable":
+        # inverse of to_arrays
+        names_blob = arrays["names"]
+        names = names_blob.tobytes().decode("utf-8").split("\0") if names_blob.size else []
+        return cls(names, arrays["recipe_products"], arrays["indptr"], arrays["ingredients"], arrays["quantities"])
+
+    def to_arrays(self) -> dict[str, np.ndarray]:
+        # flat numpy arrays only, names joined with "\0" and utf-8 encoded, for .npz files and process pools
+        return {
+            "names": np.frombuffer("\0".join(self.names).encode("utf-8"), dtype=np.uint8),
+            "recipe_products": self.recipe_products,
+            "indptr": self.indptr,
+            "ingredients": self.ingredients,
+            "quantities": self.quantities,
+        }
+
+    def __reduce__(self):
+        # pickle as the compact arrays rather than a list of python strings
+        return (RecipeTable.from_arrays, (self.to_arrays(),))
+
+    def to_records(self) -> list[dict]:
+        ingredient_names = [self.names[i] for i in self.ingredients.tolist()]
+        quantities = self.quantities.tolist()
+        bounds = self.indptr.tolist()
+        return [
+            {
+                "product": self.names[product_id],
+                "ingredients": dict(zip(ingredient_names[bounds[recipe]:bounds[recipe + 1]], quantities[bounds[recipe]:bounds[recipe + 1]])),
+            }
+            for recipe, product_id in enumerate(self.recipe_products.tolist())
+        ]
+
+    @staticmethod
+    def concat(tables: list["RecipeTable"]) -> "RecipeTable":
+        # all recipes of all tables in order, re-interned into one id space
+        name_ids = {}
+        names = []
+        recipe_products = []
+        indptr = [np.zeros(1, dtype=np.int32)]
+        ingredients = []
+        quantities = []
+        offset = 0
+
+        for table in tables:
+            remap = np.empty(len(table.names), dtype=np.int32)
+            for local_id, name in enumerate(table.names):
+                name_id = name_ids.get(name)
+                if name_id is None:
+                    name_id = name_ids[name] = len(names)
+                    names.append(name)
+                remap[local_id] = name_id
+
+            recipe_products.append(remap[table.recipe_products])
+            ingredients.append(remap[table.ingredients])
+            quantities.append(table.quantities)
+            indptr.append(table.indptr[1:] + offset)
+            offset += table.n_edges
+
+        empty = np.empty(0, dtype=np.int32)
+        merged = RecipeTable(
+            names,
+            np.concatenate(recipe_products) if recipe_products else empty,
+            np.concatenate(indptr),
+            np.concatenate(ingredients) if ingredients else empty,
+            np.concatenate(quantities) if quantities else empty,
+        )
+        merged._name_ids = name_ids
+        return merged
+
+    @property
+    def name_ids(self) -> dict[str, int]:
+        if self._name_ids is None:
+            self._name_ids = {name: i for i, name in enumerate(self.names)}
+        return self._name_ids
+
+    @property
+    def n_items(self) -> int:
+        return len(self.names)
+
+    @property
+    def n_recipes(self) -> int:
+        return len(self.recipe_products)
+
+    @property
+    def n_edges(self) -> int:
+        return len(self.ingredients)
+
+    def edge_sources(self) -> np.ndarray:
+        # product id of every (recipe, ingredient) entry, parallel to ingredients and quantities
+        return np.repeat(self.recipe_products, np.diff(self.indptr))
+
+    def product_ids(self) -> np.ndarray:
+        # every item with at least one recipe, in first-seen order
+        unique, first = np.unique(self.recipe_products, return_index=True)
+        return unique[np.argsort(first)]
+
+    def product_recipes(self) -> np.ndarray:
+        # recipe index used for every item (the last recipe defining it), -1 for raw materials
+        chosen = np.full(self.n_items, -1, dtype=np.int32)
+        np.maximum.at(chosen, self.recipe_products, np.arange(self.n_recipes, dtype=np.int32))
+        return chosen
+
+    def ingredient_counts(self) -> np.ndarray:
+        # number of recipes every item is used in
+        return np.bincount(self.ingredients, minlength=self.n_items)
+
+    def unique_edges(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # (product ids, ingredient ids, quantities) with one edge per product/ingredient pair and the quantity of
+        # the last recipe using it, the edges of to_networkx, in first-seen order
+        sources = self.edge_sources()
+        codes = sources.astype(np.int64) * self.n_items + self.ingredients
+        _, last = np.unique(codes[::-1], return_index=True)
+        keep = np.sort(len(codes) - 1 - last)
+        return sources[keep], self.ingredients[keep], self.quantities[keep]
+
+    def dependencies(self) -> dict[str, list[str]]:
+        # product -> ingredient names of its (last) recipe, keyed in first-seen product order
+        product_ids = self.product_ids()
+        recipes = self.product_recipes()[product_ids]
+        ingredient_names = [self.names[i] for i in self.ingredients.tolist()]
+        bounds = self.indptr.tolist()
+        return {
+            self.names[product_id]: ingredient_names[bounds[recipe]:bounds[recipe + 1]]
+            for product_id, recipe in zip(product_ids.tolist(), recipes.tolist())
+        }
+
+    def recipe_matrix(self) -> sp.csr_matrix:
+        # recipes x items quantity matrix, shares the table's arrays without copying
+        return sp.csr_matrix((self.quantities, self.ingredients, self.indptr), shape=(self.n_recipes, self.n_items), copy=False)
+
+    def to_sparse(self) -> sp.csr_matrix:
+        # items x items quantity matrix, row p holds the ingredients of p's recipe, raw materials have empty rows
+        chosen = self.product_recipes()
+        has_recipe = chosen >= 0
+        selection = sp.csr_matrix(
+            (np.ones(int(has_recipe.sum()), dtype=np.int32), (np.flatnonzero(has_recipe), chosen[has_recipe])),
+            shape=(self.n_items, self.n_recipes),
+        )
+        matrix = (selection @ self.recipe_matrix()).tocsr()
+        matrix.sort_indices()
+        return matrix
+
+    def to_networkx(self):
+        # product =[quantity]=> ingredient, products carry a label
+        # duplicate recipes collapse onto one edge per pair with the last quantity, like nx.DiGraph.add_edge
+        import networkx as nx
+
+        names = self.names
+        graph = nx.DiGraph()
+        graph.add_nodes_from(names)
+        for product_id in self.product_ids().tolist():
+            graph.nodes[names[product_id]]["label"] = names[product_id]
+        graph.add_edges_from(
+            (names[source], names[target], {"quantity": quantity})
+            for source, target, quantity in zip(self.edge_sources().tolist(), self.ingredients.tolist(), self.quantities.tolist())
+        )
+        return graph
+
+    def to_igraph(self):
+        # one edge per recipe ingredient, every vertex carries its name as name and label
+        import igraph
+
+        edges = np.column_stack((self.edge_sources(), self.ingredients))
+        return igraph.Graph(
+            n=self.n_items,
+            edges=edges.tolist(),
+            directed=True,
+            vertex_attrs={"name": self.names, "label": self.names},
+            edge_attrs={"quantity": self.quantities.tolist()},
+        )
@@ -0,0 +1,25 @@
+import json
+from pathlib import Path
+
+NDJSON_SUFFIXES = (".ndjson", ".jsonl")
+# the recipe files the data_manipulation program writes, as <name>.json or <name>.ndjson
+RECIPE_NAMES = ("items", "buildings")
+RECIPE_FILE_SUFFIXES = (".json", ".ndjson")
+
+def recipe_filenames(data_dir: str | Path, names: tuple[str, ...] = RECIPE_NAMES) -> list[str]:
+    # the file of every name in data_dir in whichever format was written last, <name>.json when there is none
+    filenames = []
+    for name in names:
+        paths = [Path(data_dir) / f"{name}{suffix}" for suffix in RECIPE_FILE_SUFFIXES]
+        written = [path for path in paths if path.is_file()]
+        filenames.append(max(written, key=lambda path: path.stat().st_mtime).name if written else paths[0].name)
+    return filenames
+
+def load_recipes(path: str | Path) -> list[dict]:
+    # read a recipe file written by the data_manipulation program
+    # .json files hold one array of records, .ndjson/.jsonl files hold one record per line
+    path = Path(path)
+    with open(path, "r") as recipe_file:
+        if path.suffix in NDJSON_SUFFIXES:
+            return [json.loads(line) for line in recipe_file if line.strip()]
+        return json.load(recipe_file)